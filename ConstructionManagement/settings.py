@@ -54,6 +54,7 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'backend.User'
 
 MIDDLEWARE = [
+    "backend.middleware.RequestMetricsMiddleware",  # First, so it times the whole stack
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -66,6 +67,9 @@ MIDDLEWARE = [
 
 ]
 
+# Requests slower than this are logged to 'backend.slow_requests' with their SQL; None turns the log off.
+SLOW_REQUEST_THRESHOLD_MS = 1000
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",  # React development server
     "http://localhost:8000",  # Django development server
@@ -77,7 +81,8 @@ CORS_ALLOW_CREDENTIALS = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication with a short-lived user cache, see backend/authentication.py
+        'backend.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',  # Add this temporarily for testing
 
     ),
@@ -91,6 +96,21 @@ REST_FRAMEWORK = {
     ),
 }
 
+# Works, items, payments and comments use keyset pagination (backend/pagination.py).
+# Clients opt in with ?page_size= / ?cursor=; set to True to paginate every list request.
+KEYSET_PAGINATION_REQUIRED = False
+# Plain (unpaginated) lists stop after this many rows, with a Link header to the rest
+KEYSET_UNPAGINATED_LIMIT = 1000
+
+# Tombstones for the /works/sync/ endpoint are kept this long (prune_deleted_records);
+# clients syncing from further back get a full sync.
+SYNC_TOMBSTONE_RETENTION_DAYS = 90
+
+# Background jobs (manage.py run_jobs): identical report/export requests within the TTL
+# reuse the finished result; finished jobs and their files are pruned after the retention.
+JOB_RESULT_TTL_SECONDS = 600
+JOB_RETENTION_DAYS = 7
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=10),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
@@ -195,6 +215,28 @@ DATABASES = {
     }
 }
 
+# The role/dropdown caches (backend/caching.py) use BACKEND_CACHE_ALIAS. Local memory is
+# per process: with several workers point it at a shared backend (Redis, Memcached) so
+# a version bump reaches all of them.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+BACKEND_CACHE_ALIAS = "default"
+BACKEND_CACHE_TIMEOUT = 3600
+# Seconds a token's user (id, role, idNum, flags) is served from the per-process auth cache
+BACKEND_AUTH_CACHE_TTL = 30
+
+# SQLite under several workers (backend/db.py): every connection gets WAL, a busy timeout,
+# synchronous=NORMAL and larger caches (override a pragma here, None skips it), and the API's
+# saves run in queued BEGIN IMMEDIATE transactions, retried this many times while the
+# database is locked (BACKEND_SERIALIZE_WRITES = False makes them plain atomic blocks).
+BACKEND_SQLITE_PRAGMAS = {}
+BACKEND_SERIALIZE_WRITES = True
+BACKEND_WRITE_RETRIES = 3
+BACKEND_WRITE_RETRY_DELAY = 0.05  # seconds, doubled per retry
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -239,6 +281,10 @@ ACCOUNT_USERNAME_REQUIRED = False
 
 STATIC_URL = "static/"
 
+# Job results (backend/jobs.py) are stored here
+MEDIA_URL = "media/"
+MEDIA_ROOT = BASE_DIR / "media"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
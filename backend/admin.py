@@ -35,8 +35,10 @@ class CustomUserAdmin(UserAdmin):
 @admin.register(Work)
 class WorkAdmin(admin.ModelAdmin):
     list_display = (
-        'work_number', 'classification', 'status', 'contractor', 'manager', 'facility', 'start_date', 'due_end_date')
+        'work_number', 'classification', 'status', 'contractor', 'manager', 'facility', 'start_date', 'due_end_date',
+        'item_count', 'contract_total')
     list_filter = ('classification', 'status', 'contractor', 'manager', 'facility')
+    readonly_fields = Work.ITEM_TOTAL_FIELDS
     search_fields = ('work_number', 'contractor__username', 'manager__username', 'facility__name')
     date_hierarchy = 'start_date'
 
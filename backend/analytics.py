@@ -0,0 +1,173 @@
+"""
+Portfolio analytics behind ``reports?type=forecast``. The columns are read in one
+values_list query (the item totals come from the Work columns maintained by the
+rollups, so no item join) and every metric is computed on NumPy arrays instead of
+per-object properties like Work.days_in_work.
+"""
+from datetime import datetime
+
+from django.utils import timezone
+
+try:
+    import numpy as np
+except ImportError:  # the forecast report is optional
+    np = None
+
+# pk keeps the rows apart should the queryset be .distinct()
+WORK_COLUMNS = (
+    'pk', 'facility__name', 'classification', 'start_date', 'due_end_date', 'end_date', 'completion_percentage',
+    'contract_total', 'actual_total',
+)
+GROUP_COLUMNS = {'facility': 0, 'classification': 1}
+
+DAY = 86400.0
+# Edges of the overrun histogram, as (actual - contract) / contract
+OVERRUN_BINS = (-0.5, -0.2, -0.1, 0.0, 0.1, 0.2, 0.5)
+
+
+class AnalyticsUnavailable(RuntimeError):
+    pass
+
+
+def work_rows(queryset):
+    """The values_list query the analytics read; iterate it with the sync or the async ORM."""
+    return queryset.values_list(*WORK_COLUMNS).order_by()
+
+
+def timestamps(values):
+    return np.fromiter((value.timestamp() if value is not None else np.nan for value in values), dtype=float,
+                       count=len(values))
+
+
+def number(value, digits=2):
+    """A JSON-safe float (None for NaN / missing)."""
+    if value is None or not np.isfinite(value):
+        return None
+    return round(float(value), digits)
+
+
+def as_date(timestamp):
+    if not np.isfinite(timestamp):
+        return None
+    return datetime.fromtimestamp(float(timestamp), tz=timezone.get_current_timezone()).date()
+
+
+def distribution(values):
+    values = values[np.isfinite(values)]
+    if not values.size:
+        return {'count': 0, 'mean': None, 'p10': None, 'p50': None, 'p90': None}
+    p10, p50, p90 = np.percentile(values, [10, 50, 90])
+    return {'count': int(values.size), 'mean': number(values.mean(), 3), 'p10': number(p10, 3),
+            'p50': number(p50, 3), 'p90': number(p90, 3)}
+
+
+def columns(rows, now):
+    """Per-work arrays of the inputs and the derived metrics, indexed alike."""
+    _, facility, classification, start, due, end, completion, contract, actual = zip(*rows)
+    start, due, end = timestamps(start), timestamps(due), timestamps(end)
+    completion = np.array(completion, dtype=float)
+    contract = np.array(contract, dtype=float)
+    actual = np.array(actual, dtype=float)
+    finished = np.isfinite(end)
+    is_open = ~finished & (completion < 100)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        overrun = np.where(contract > 0, (actual - contract) / contract, np.nan)
+        # Work.days_in_work and the planned duration on the same scale
+        days = np.where(finished, np.floor((end - start) / DAY) + 1, np.nan)
+        planned = np.floor((due - start) / DAY) + 1
+        # Completion points per elapsed day, for works still running
+        elapsed = np.maximum((now - start) / DAY, 1.0)
+        burn_rate = np.where(is_open, completion / elapsed, np.nan)
+        # Open works finish at their burn rate, or as planned until they make progress
+        projected_end = np.where(
+            is_open & (burn_rate > 0), now + (100 - completion) / burn_rate * DAY, np.where(finished, end, due))
+        # Estimate at completion: cost so far scaled by progress; the contract until there is any
+        projected_cost = np.where(is_open & (completion > 0) & (actual > 0), actual * 100 / completion,
+                                  np.where(is_open, np.maximum(contract, actual), actual))
+
+    return {
+        'groups': (np.array(facility, dtype=object), np.array(classification, dtype=object)),
+        'due': due, 'finished': finished, 'open': is_open, 'contract': contract, 'actual': actual,
+        'overrun': overrun, 'days': days, 'planned': planned, 'burn_rate': burn_rate,
+        'projected_end': projected_end, 'projected_cost': projected_cost,
+        'projected_late': is_open & (projected_end > due),
+    }
+
+
+def summaries(data, inverse, size):
+    """Forecast figures per group, for group numbers ``inverse`` (0..size-1) of every work."""
+    is_open = data['open']
+
+    def total(values):
+        return np.bincount(inverse, weights=values, minlength=size)
+
+    works, open_works = total(np.ones(inverse.size)), total(is_open)
+    contract, projected_cost = total(data['contract']), total(data['projected_cost'])
+    burn_rate = total(np.where(is_open, data['burn_rate'], 0))
+    latest_end = np.full(size, -np.inf)
+    np.maximum.at(latest_end, inverse[is_open], data['projected_end'][is_open])
+    late = total(data['projected_late'])
+    actual = total(data['actual'])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_burn_rate = burn_rate / open_works
+    return [
+        {
+            'works': int(works[index]),
+            'open_works': int(open_works[index]),
+            'contract_total': number(contract[index]),
+            'actual_total': number(actual[index]),
+            'projected_final_cost': number(projected_cost[index]),
+            'projected_overrun': number(projected_cost[index] - contract[index]),
+            'projected_late_works': int(late[index]),
+            'latest_projected_end': as_date(latest_end[index]),
+            'mean_burn_rate': number(mean_burn_rate[index], 3),
+        }
+        for index in range(size)
+    ]
+
+
+def grouped(data, group):
+    labels, inverse = np.unique(data['groups'][GROUP_COLUMNS[group]].astype(str), return_inverse=True)
+    return [{group: str(label), **summary} for label, summary in zip(labels, summaries(data, inverse, len(labels)))]
+
+
+def forecast(rows, now=None):
+    """The forecast report for rows of WORK_COLUMNS."""
+    if np is None:
+        raise AnalyticsUnavailable('The forecast report needs numpy installed.')
+    rows = list(rows)
+    if not rows:
+        return {'portfolio': None, 'cost_overrun': None, 'duration': None, 'burn_rate': None,
+                'by_facility': [], 'by_classification': []}
+    data = columns(rows, (now or timezone.now()).timestamp())
+
+    overrun = data['overrun'][np.isfinite(data['overrun'])]
+    edges = np.array([-np.inf, *OVERRUN_BINS, np.inf])
+    counts, _ = np.histogram(overrun, bins=edges)
+    finished = data['finished']
+    ratio = data['days'][finished] / np.maximum(data['planned'][finished], 1)
+
+    return {
+        'portfolio': summaries(data, np.zeros(len(rows), dtype=int), 1)[0],
+        'cost_overrun': {
+            **distribution(overrun),
+            'over_budget_share': number((overrun > 0).mean(), 3) if overrun.size else None,
+            'histogram': [
+                {'from': number(low, 3), 'to': number(high, 3), 'works': int(count)}
+                for low, high, count in zip(edges[:-1], edges[1:], counts)
+            ],
+        },
+        'duration': {
+            'finished_works': int(finished.sum()),
+            'mean_days': number(data['days'][finished].mean()) if finished.any() else None,
+            'mean_planned_days': number(data['planned'][finished].mean()) if finished.any() else None,
+            'late_share': number((data['days'][finished] > data['planned'][finished]).mean(), 3)
+            if finished.any() else None,
+            'days_to_plan_ratio': distribution(ratio),
+        },
+        'burn_rate': distribution(data['burn_rate']),
+        'by_facility': grouped(data, 'facility'),
+        'by_classification': grouped(data, 'classification'),
+    }
@@ -0,0 +1,109 @@
+# Async-native versions of the hot read endpoints, served under async/. They return
+# the same payloads as the DRF views but read through the async ORM, so under an ASGI
+# server (ConstructionManagement/asgi.py) a request waiting on the database doesn't
+# hold a worker thread. DRF 3.14 views are synchronous, so these are plain Django
+# async views; authentication still goes through the configured DRF authenticators.
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .fieldsets import requested_fields
+from .models import Work, Comment
+from .pagination import WorkPagination, CommentPagination
+from .querysets import optimize_queryset, work_queryset
+from .reports import ReportError, afilter_report_queryset, acompute_report, use_scorecards
+from .representations import work_list_representation
+from .serializers import WorkSerializer, CommentSerializer
+
+renderer = JSONRenderer()
+
+
+def json_response(data, status_code=status.HTTP_200_OK, headers=None):
+    """Render like DRF's JSONRenderer so both paths return identical bytes."""
+    return HttpResponse(renderer.render(data), status=status_code, headers=headers,
+                        content_type='application/json')
+
+
+def error_response(detail, status_code):
+    return json_response({'detail': detail}, status_code)
+
+
+async def authenticate(request):
+    """
+    A DRF Request for ``request`` with the user resolved by the configured
+    authenticators, or raises AuthenticationFailed / NotAuthenticated.
+    """
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    user = await sync_to_async(lambda: drf_request.user)()
+    if not user or not user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    return drf_request
+
+
+def async_api_view(view):
+    """Authenticate, then map the exceptions the DRF views turn into 401/404/400 responses."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return error_response(f'Method "{request.method}" not allowed.', status.HTTP_405_METHOD_NOT_ALLOWED)
+        try:
+            drf_request = await authenticate(request)
+            return await view(drf_request, *args, **kwargs)
+        except exceptions.APIException as e:
+            headers = None
+            if isinstance(e, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                authenticator = api_settings.DEFAULT_AUTHENTICATION_CLASSES[0]()
+                headers = {'WWW-Authenticate': authenticator.authenticate_header(request)}
+            data = e.detail if isinstance(e.detail, (list, dict)) else {'detail': e.detail}
+            return json_response(data, e.status_code, headers=headers)
+        except Http404 as e:
+            return error_response(str(e) or 'Not found.', status.HTTP_404_NOT_FOUND)
+    return wrapper
+
+
+@async_api_view
+async def work_list(request):
+    fields = requested_fields(WorkSerializer, request.query_params, expandable=('items',))
+    representation = work_list_representation(fields)
+    rows = representation.values(work_queryset(request.user, request.query_params, WorkSerializer),
+                                 *WorkPagination.ordering_fields)
+    paginator = WorkPagination()
+    page = await paginator.apaginate_queryset(rows, request)
+    return json_response(paginator.get_paginated_data(await representation.arender(page)),
+                         headers=paginator.get_headers())
+
+
+@async_api_view
+async def work_detail(request, pk):
+    try:
+        work = await work_queryset(request.user, request.query_params, WorkSerializer).aget(pk=pk)
+    except Work.DoesNotExist:
+        raise Http404('No Work matches the given query.')
+    return json_response(WorkSerializer(work).data)
+
+
+@async_api_view
+async def work_reports(request):
+    try:
+        queryset = await afilter_report_queryset(work_queryset(request.user, request.query_params, WorkSerializer),
+                                                 request.query_params)
+        return json_response(await acompute_report(request.query_params.get('type'), queryset,
+                                                   request.query_params,
+                                                   scorecards=use_scorecards(request.user, request.query_params)))
+    except ReportError as e:
+        return json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+
+
+@async_api_view
+async def work_comments(request, work_pk):
+    queryset = optimize_queryset(Comment.objects.all(), CommentSerializer)
+    queryset = queryset.filter(work_id=work_pk).order_by('created_at')
+    paginator = CommentPagination()
+    page = await paginator.apaginate_queryset(queryset, request)
+    return json_response(paginator.get_paginated_data(CommentSerializer(page, many=True).data),
+                         headers=paginator.get_headers())
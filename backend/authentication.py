@@ -0,0 +1,89 @@
+"""
+JWT authentication without a users query per request. The token's user is
+resolved through a process-local cache holding only the columns the API reads
+on every request; any other attribute of request.user is a deferred field,
+loaded on first access. Entries live BACKEND_AUTH_CACHE_TTL seconds and are
+dropped by the User save / delete and token blacklist receivers in signals.py;
+changes those can't see (queryset.update(), other processes) are picked up when
+the entry expires.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+# In model field order, as Model.from_db() takes them
+AUTH_USER_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in ('id', 'role', 'idNum', 'is_active', 'is_superuser')
+)
+
+
+class UserCache:
+    """{user id: AUTH_USER_FIELDS values} with a per-entry TTL, safe across threads."""
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def ttl():
+        return getattr(settings, 'BACKEND_AUTH_CACHE_TTL', 30)
+
+    def get(self, user_id):
+        entry = self.entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, user_id, values):
+        with self.lock:
+            self.entries[user_id] = (time.monotonic() + self.ttl(), values)
+
+    def forget(self, user_id):
+        with self.lock:
+            self.entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache()
+
+
+def forget_user(user_id):
+    user_cache.forget(user_id)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication reading the token's user from ``user_cache``."""
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            return super().get_user(validated_token)  # needs the password hash
+        try:
+            user_id = str(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        values = user_cache.get(user_id)
+        if values is None:
+            values = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values_list(
+                *AUTH_USER_FIELDS).first()
+            if values is None:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            user_cache.set(user_id, values)
+
+        # A model instance with the other fields deferred, as from .only(*AUTH_USER_FIELDS)
+        user = User.from_db(DEFAULT_DB_ALIAS, AUTH_USER_FIELDS, values)
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
@@ -0,0 +1,115 @@
+import json
+import math
+import platform
+import statistics
+import time
+from contextlib import contextmanager
+
+import django
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def summarize(timings_ms):
+    return {
+        'p50_ms': round(percentile(timings_ms, 50), 3),
+        'p95_ms': round(percentile(timings_ms, 95), 3),
+        'mean_ms': round(statistics.fmean(timings_ms), 3),
+        'runs': len(timings_ms),
+    }
+
+
+def measure_request(client, url, repeat=20, warmup=2, method='get', data=None, **extra):
+    """
+    Drive ``url`` through the Django test client and return latency percentiles,
+    the query count of one request and the response size in bytes.
+    """
+    send = getattr(client, method)
+    for _ in range(warmup):
+        send(url, data, **extra)
+
+    # Each request resets the query log; start from an empty one so the capture lines up.
+    reset_queries()
+    with CaptureQueriesContext(connection) as ctx:
+        response = send(url, data, **extra)
+    content = b''.join(response.streaming_content) if response.streaming else response.content
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        send(url, data, **extra)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return {
+        **summarize(timings),
+        'status': response.status_code,
+        'queries': len(ctx.captured_queries),
+        'bytes': len(content),
+    }
+
+
+@contextmanager
+def benchmark_database(keep_current=False, verbosity=0, test_name=None):
+    """
+    Run the block against a throw-away test database (the configured database
+    is left untouched) unless ``keep_current`` is set. ``test_name`` names its
+    file where the default would be in memory (SQLite).
+    """
+    setup_test_environment()
+    old_name = None
+    old_test_name = connection.settings_dict['TEST'].get('NAME')
+    try:
+        if not keep_current:
+            old_name = connection.settings_dict['NAME']
+            if test_name is not None:
+                connection.settings_dict['TEST']['NAME'] = test_name
+            connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+        yield
+    finally:
+        if old_name is not None:
+            connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        connection.settings_dict['TEST']['NAME'] = old_test_name
+        teardown_test_environment()
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def save_results(path, results):
+    with open(path, 'w') as fp:
+        json.dump(results, fp, indent=2, sort_keys=True)
+
+
+def load_results(path):
+    with open(path) as fp:
+        return json.load(fp)
+
+
+def find_regressions(baseline, current, threshold=0.2, key='endpoints'):
+    """
+    Endpoints whose p95 grew by more than ``threshold`` (a fraction) or that
+    issue more queries than in ``baseline``, as human readable strings.
+    """
+    regressions = []
+    for name, result in current.get(key, {}).items():
+        previous = baseline.get(key, {}).get(name)
+        if previous is None:
+            continue
+        if result['queries'] > previous['queries']:
+            regressions.append(f'{name}: {previous["queries"]} -> {result["queries"]} queries')
+        if result['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+            regressions.append(f'{name}: p95 {previous["p95_ms"]} -> {result["p95_ms"]} ms')
+    return regressions
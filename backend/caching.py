@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.cache import caches
+
+# Namespaces with their own version counter. Choice lists only change with the
+# code, so their version is a constant; bump it when the choices change.
+CHOICES = 'choices'
+USERS = 'users'
+CHOICES_VERSION = 1
+
+# The User columns the dropdowns show; saves that touch none of them keep the cache.
+DROPDOWN_USER_FIELDS = ('username', 'first_name', 'last_name', 'idNum', 'role')
+
+KEY_PREFIX = 'backend'
+
+
+def get_cache():
+    """The cache configured by BACKEND_CACHE_ALIAS (a shared backend in multi-process deployments)."""
+    return caches[getattr(settings, 'BACKEND_CACHE_ALIAS', 'default')]
+
+
+def get_version(namespace):
+    if namespace == CHOICES:
+        return CHOICES_VERSION
+    cache = get_cache()
+    key = f'{KEY_PREFIX}:version:{namespace}'
+    version = cache.get(key)
+    if version is None:
+        # add() so two processes starting at once agree on the first version
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_version(namespace):
+    """Invalidate every entry of ``namespace``; old entries expire on their own."""
+    cache = get_cache()
+    key = f'{KEY_PREFIX}:version:{namespace}'
+    try:
+        cache.incr(key)
+    except ValueError:  # not set yet, or evicted
+        cache.set(key, 2, timeout=None)
+
+
+def role_key(user):
+    return f'{user.role}:{int(user.is_superuser)}'
+
+
+def cached(namespace, key, build):
+    """
+    ``build()``'s result for ``key`` under the current version of ``namespace``,
+    computed on a miss. ``key`` must include everything the result depends on,
+    e.g. the role for role-dependent lists.
+    """
+    cache = get_cache()
+    cache_key = f'{KEY_PREFIX}:{namespace}:{get_version(namespace)}:{key}'
+    value = cache.get(cache_key)
+    if value is None:
+        value = build()
+        cache.set(cache_key, value, timeout=getattr(settings, 'BACKEND_CACHE_TIMEOUT', 3600))
+    return value
@@ -0,0 +1,135 @@
+import hashlib
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db.models import Count, ExpressionWrapper, IntegerField, Max, Q
+from django.db.models.functions import ExtractHour, ExtractMinute, ExtractSecond
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified for the list and retrieve actions of a ViewSet whose
+    model has ``updated_at``. The validators come from one aggregate over the
+    caller's (role-scoped, filtered) queryset: Max(updated_at) and the row count,
+    so adds, edits and deletes all change the ETag. A matching If-None-Match
+    (or, for a single object, If-Modified-Since) is answered with 304 before the
+    queryset is evaluated or anything is serialized.
+
+    ``conditional_related`` names reverse relations embedded in the response
+    (e.g. a work's ``items``); their Max(updated_at) and count are part of the
+    validators too, as is Max(updated_at) of the forward relations in
+    ``conditional_joined`` (e.g. the facility whose name a work shows). Users
+    have no ``updated_at``: a renamed contractor or manager shows on a work once
+    the work itself changes.
+
+    ``days_since`` is (start field, end field) of a day count in the payload
+    computed as ((end or now) - start).days, like Work.days_in_work. Each open
+    row's count goes up at its start's time of day, so the last time any of
+    them did is part of the ETag and the floor of Last-Modified.
+
+    Lists only honour If-None-Match: a deleted row lowers the count but never
+    moves Max(updated_at), so If-Modified-Since alone can't prove a list unchanged.
+    """
+    conditional_related = ()
+    conditional_joined = ()
+    days_since = None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        etag, last_modified, _ = self.get_validators(queryset)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return self.set_validators(not_modified, etag, last_modified)
+        response = super().list(request, *args, **kwargs)
+        return self.set_validators(response, etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        etag, last_modified, count = self.get_validators(queryset)
+        if not count:
+            # No such row for this user; let get_object() produce the 404
+            return super().retrieve(request, *args, **kwargs)
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=int(last_modified.timestamp()) if last_modified else None)
+        if not_modified is not None:
+            return self.set_validators(not_modified, etag, last_modified)
+        response = super().retrieve(request, *args, **kwargs)
+        return self.set_validators(response, etag, last_modified)
+
+    def get_conditional_related(self):
+        return self.conditional_related
+
+    def get_validators(self, queryset):
+        """(etag, last_modified, row count) for ``queryset`` as seen by the current request."""
+        queryset = queryset.order_by()
+        now = timezone.now()
+        aggregates = {'last': Max('updated_at'), 'count': Count('pk')}
+        for relation in self.conditional_joined:
+            aggregates[f'last_{relation}'] = Max(f'{relation}__updated_at')
+        if self.days_since:
+            queryset, rollover_aggregates = self.rollover_aggregates(queryset, now)
+            aggregates.update(rollover_aggregates)
+        state = [queryset.aggregate(**aggregates)]
+        for relation in self.conditional_joined:
+            state[0]['last'] = max(filter(None, (state[0]['last'], state[0][f'last_{relation}'])), default=None)
+        rollover = self.last_rollover(state[0], now) if self.days_since else None
+        for relation in self.get_conditional_related():
+            field = queryset.model._meta.get_field(relation)
+            related = field.related_model.objects.filter(**{f'{field.field.name}__in': queryset.values('pk')})
+            state.append(related.order_by().aggregate(last=Max('updated_at'), count=Count('pk')))
+
+        last_modified = max((part['last'] for part in state if part['last'] is not None), default=None)
+        if rollover is not None and last_modified is not None:
+            last_modified = max(last_modified, rollover)
+        request = self.request
+        key = [
+            str(request.user.pk),
+            request.get_full_path(),
+            getattr(request, 'accepted_media_type', '') or '',
+            rollover.isoformat() if rollover else '',
+        ]
+        key += [f"{part['last'].isoformat() if part['last'] else ''}/{part['count']}" for part in state]
+        etag = quote_etag(hashlib.md5('|'.join(key).encode()).hexdigest())
+        return etag, last_modified, state[0]['count']
+
+    def rollover_aggregates(self, queryset, now):
+        """
+        ``queryset`` annotated with each row's rollover time (the second of the
+        UTC day its day count goes up, rounded up), and the aggregates
+        last_rollover() reads: the latest one already passed today, and the
+        latest one at all, over the open rows.
+        """
+        start, end = self.days_since
+        seconds = now.hour * 3600 + now.minute * 60 + now.second  # timezone.now() is in UTC
+        queryset = queryset.annotate(_rollover=ExpressionWrapper(
+            ExtractHour(start, tzinfo=dt_timezone.utc) * 3600 + ExtractMinute(start, tzinfo=dt_timezone.utc) * 60
+            + ExtractSecond(start, tzinfo=dt_timezone.utc) + 1,  # + 1: the microseconds aren't extracted
+            output_field=IntegerField(),
+        ))
+        open_rows = Q(**{f'{end}__isnull': True})
+        return queryset, {
+            'rollover_today': Max('_rollover', filter=open_rows & Q(_rollover__lte=seconds)),
+            'rollover_any': Max('_rollover', filter=open_rows),
+        }
+
+    @staticmethod
+    def last_rollover(aggregates, now):
+        """When an open row's day count last went up (None without open rows)."""
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        if aggregates['rollover_today'] is not None:
+            return midnight + timedelta(seconds=aggregates['rollover_today'])
+        if aggregates['rollover_any'] is not None:
+            return midnight - timedelta(days=1) + timedelta(seconds=aggregates['rollover_any'])
+        return None
+
+    @staticmethod
+    def set_validators(response, etag, last_modified):
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
@@ -0,0 +1,158 @@
+"""
+SQLite for several workers. Every connection gets the pragmas below (WAL so
+readers and the writer don't block each other, a busy timeout instead of an
+immediate "database is locked", and cheaper syncs and bigger caches), and the
+API's writes go through write_with_retry(): queued per process, one transaction
+that takes the write lock at BEGIN (BEGIN IMMEDIATE, so it can't fail half way
+when upgrading a read lock), re-run a few times if the lock still can't be had.
+Only the writes themselves (the saves of SerializedWriteMixin, bulk status
+changes, each import batch) hold the lock, not the whole request. Other
+databases are left alone.
+"""
+import functools
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Overridden key by key by settings.BACKEND_SQLITE_PRAGMAS; a None value skips the pragma
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,  # ms
+    'synchronous': 'NORMAL',  # safe with WAL: a power loss can drop the last commits, not corrupt
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -20000,  # KiB, per connection
+}
+write_queues = {}
+LOCKED_MESSAGES = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def sqlite_pragmas():
+    pragmas = {**SQLITE_PRAGMAS, **getattr(settings, 'BACKEND_SQLITE_PRAGMAS', {})}
+    return {name: value for name, value in pragmas.items() if value is not None}
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = sqlite_pragmas()
+    with connection.cursor() as cursor:
+        journal_mode = pragmas.pop('journal_mode', None)
+        # Stored in the database file: set it once, and leave it to a later
+        # connection if other processes have the file open meanwhile
+        if journal_mode is not None and cursor.execute('PRAGMA journal_mode').fetchone()[0] != journal_mode.lower():
+            try:
+                cursor.execute(f'PRAGMA journal_mode = {journal_mode}')
+            except OperationalError as e:
+                if not is_locked(e):
+                    raise
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_locked(error):
+    return isinstance(error, OperationalError) and any(message in str(error).lower() for message in LOCKED_MESSAGES)
+
+
+def write_queue(alias):
+    """
+    The lock a process's writers to ``alias`` queue on: SQLite takes one writer
+    at a time anyway, and threads waiting here are handed the turn at once
+    instead of polling in the busy handler. Other processes are still waited
+    for by busy_timeout.
+    """
+    return write_queues.setdefault(alias, threading.Lock())
+
+
+@contextmanager
+def immediate_atomic(using=None):
+    """
+    transaction.atomic() that, as the outermost block on SQLite, waits its turn
+    in write_queue() and begins with BEGIN IMMEDIATE. Nested in another block
+    it is a plain savepoint.
+    """
+    connection = transaction.get_connection(using)
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+    connection.ensure_connection()  # sets transaction_mode from OPTIONS
+    previous = connection.transaction_mode
+    with write_queue(connection.alias):
+        connection.transaction_mode = 'IMMEDIATE'
+        try:
+            with transaction.atomic(using=using):
+                connection.transaction_mode = previous  # BEGIN has been sent
+                yield
+        finally:
+            connection.transaction_mode = previous
+
+
+def write_with_retry(func, *args, using=None, retries=None, **kwargs):
+    """
+    ``func(*args, **kwargs)`` in an immediate_atomic() block, run again from the
+    start (after a short, growing, jittered pause) while SQLite reports the
+    database locked: at most ``retries`` (default BACKEND_WRITE_RETRIES) more
+    times. Inside an enclosing transaction it runs once, as only the outermost
+    block can be retried. With BACKEND_SERIALIZE_WRITES off it is a plain
+    transaction.atomic() block.
+    """
+    if not getattr(settings, 'BACKEND_SERIALIZE_WRITES', True):
+        with transaction.atomic(using=using):
+            return func(*args, **kwargs)
+    if retries is None:
+        retries = getattr(settings, 'BACKEND_WRITE_RETRIES', 3)
+    if transaction.get_connection(using).in_atomic_block:
+        retries = 0
+    delay = getattr(settings, 'BACKEND_WRITE_RETRY_DELAY', 0.05)
+    for attempt in range(retries + 1):
+        try:
+            with immediate_atomic(using):
+                return func(*args, **kwargs)
+        except OperationalError as e:
+            if attempt == retries or not is_locked(e):
+                raise
+            time.sleep(delay * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def serialized_write(func):
+    """Decorator running ``func`` through write_with_retry()."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return write_with_retry(func, *args, **kwargs)
+    return wrapper
+
+
+def save_serializer(serializer, **kwargs):
+    """serializer.save(**kwargs) through write_with_retry(), each attempt from the original instance."""
+    instance = serializer.instance
+
+    def save():
+        serializer.instance = instance
+        return serializer.save(**kwargs)
+
+    return write_with_retry(save)
+
+
+class SerializedWriteMixin:
+    """
+    ViewSet mixin saving and deleting through write_with_retry(): the row and
+    what its signals write (rollups, scorecards) commit together, and only for
+    as long as the writes take. Views overriding perform_*() call
+    save_serializer() themselves.
+    """
+
+    def perform_create(self, serializer):
+        save_serializer(serializer)
+
+    def perform_update(self, serializer):
+        save_serializer(serializer)
+
+    def perform_destroy(self, instance):
+        write_with_retry(instance.delete)
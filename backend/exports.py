@@ -0,0 +1,158 @@
+import csv
+import io
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Work, Payment
+from .permissions import scope_works
+from .reports import filter_report_queryset
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+CHUNK_SIZE = 2000
+# Rows are written out in blocks of about this many bytes
+FLUSH_BYTES = 64 * 1024
+
+# (column, ORM path) for the works export; one row per item, works without items get one row.
+WORK_EXPORT_FIELDS = (
+    ('work_id', 'id'),
+    ('work_number', 'work_number'),
+    ('project', 'project'),
+    ('classification', 'classification'),
+    ('status', 'status'),
+    ('facility', 'facility__name'),
+    ('contractor', 'contractor__username'),
+    ('manager', 'manager__username'),
+    ('location_name', 'location_name'),
+    ('start_date', 'start_date'),
+    ('due_end_date', 'due_end_date'),
+    ('end_date', 'end_date'),
+    ('completion_percentage', 'completion_percentage'),
+    ('quality_score', 'quality_score'),
+    ('time_score', 'time_score'),
+    ('cost_score', 'cost_score'),
+    ('item_id', 'items__id'),
+    ('section', 'items__section'),
+    ('description', 'items__description'),
+    ('work_type', 'items__work_type'),
+    ('item_status', 'items__status'),
+    ('contract_amount', 'items__contract_amount'),
+    ('actual_amount', 'items__actual_amount'),
+    ('unit_cost', 'items__unit_cost'),
+)
+WORK_COMPUTED_COLUMNS = ('average_score', 'days_in_work', 'total_section_cost')
+
+PAYMENT_EXPORT_FIELDS = (
+    ('payment_id', 'id'),
+    ('work_id', 'work_id'),
+    ('work_number', 'work__work_number'),
+    ('invoice_number', 'invoice_number'),
+    ('payment_date', 'payment_date'),
+    ('amount_paid', 'amount_paid'),
+    ('payment_manager', 'payment_manager__username'),
+    ('approval_manager', 'approval_manager__username'),
+    ('payment_account_details', 'payment_account_details'),
+    ('payment_terms', 'payment_terms'),
+)
+
+
+def average_score(quality_score, time_score, cost_score):
+    """Work.average_score for raw column values."""
+    valid_scores = [score for score in (quality_score, time_score, cost_score) if score is not None]
+    if valid_scores:
+        return round(sum(valid_scores) / len(valid_scores), 1)
+    return 0
+
+
+def days_in_work(start_date, end_date, now):
+    """Work.days_in_work for raw column values."""
+    return ((end_date or now) - start_date).days + 1
+
+
+def work_export_rows(works):
+    """(header, rows) for a Work queryset, read with one streamed values_list query."""
+    header = [column for column, _ in WORK_EXPORT_FIELDS] + list(WORK_COMPUTED_COLUMNS)
+    paths = [path for _, path in WORK_EXPORT_FIELDS]
+    index = {column: position for position, (column, _) in enumerate(WORK_EXPORT_FIELDS)}
+    queryset = works.prefetch_related(None).order_by('pk', 'items__section', 'items__id').values_list(*paths)
+
+    def rows():
+        now = timezone.now()
+        for row in queryset.iterator(chunk_size=CHUNK_SIZE):
+            actual, unit_cost = row[index['actual_amount']], row[index['unit_cost']]
+            yield row + (
+                average_score(row[index['quality_score']], row[index['time_score']], row[index['cost_score']]),
+                days_in_work(row[index['start_date']], row[index['end_date']], now),
+                actual * unit_cost if actual is not None and unit_cost is not None else None,
+            )
+
+    return header, rows()
+
+
+def payment_export_works(user, params):
+    """The works whose payments ``user`` may export, with the reports' filters and ?work_status=."""
+    works = scope_works(user, Work.objects.all())
+    work_status = params.get('work_status')
+    if work_status:
+        works = works.filter(status=work_status)
+    return filter_report_queryset(works, params)
+
+
+def payment_export_rows(works):
+    """(header, rows) for the payments of a Work queryset."""
+    header = [column for column, _ in PAYMENT_EXPORT_FIELDS]
+    queryset = Payment.objects.filter(work__in=works.values('pk')).order_by('payment_date', 'pk').values_list(
+        *[path for _, path in PAYMENT_EXPORT_FIELDS])
+    return header, queryset.iterator(chunk_size=CHUNK_SIZE)
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def stream_csv(header, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+        if buffer.tell() >= FLUSH_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_ndjson(header, rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    chunk = []
+    size = 0
+    for row in rows:
+        line = encoder.encode(dict(zip(header, row))) + '\n'
+        chunk.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield ''.join(chunk)
+            chunk, size = [], 0
+    yield ''.join(chunk)
+
+
+def export_stream(header, rows, file_format):
+    """The export as an iterator of text chunks."""
+    stream = stream_csv if file_format == 'csv' else stream_ndjson
+    return stream(header, rows)
+
+
+def export_response(header, rows, file_format, filename):
+    """A StreamingHttpResponse of ``rows``; memory use does not depend on the row count."""
+    response = StreamingHttpResponse(export_stream(header, rows, file_format), content_type=EXPORT_FORMATS[file_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{file_format}"'
+    return response
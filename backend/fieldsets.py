@@ -0,0 +1,74 @@
+from functools import lru_cache
+
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+EXPAND_PARAM = 'expand'
+
+
+@lru_cache(maxsize=None)
+def field_names(serializer_class):
+    return tuple(name for name, field in serializer_class().fields.items() if not field.write_only)
+
+
+def parse_names(params, name):
+    """Names from ``?name=a,b`` or repeated ``?name=`` parameters."""
+    names = []
+    for value in params.getlist(name):
+        names += [part.strip() for part in value.split(',') if part.strip()]
+    return names
+
+
+def requested_fields(serializer_class, params, expandable=()):
+    """
+    The output fields of ``serializer_class`` selected by ``?fields=`` (only
+    these), ``?omit=`` (all but these) and ``?expand=`` (add an embedded
+    relation to a ?fields= selection), in serializer order; None for all.
+    """
+    names = field_names(serializer_class)
+    fields, omit, expand = (parse_names(params, name) for name in (FIELDS_PARAM, OMIT_PARAM, EXPAND_PARAM))
+    for param, values, allowed in ((FIELDS_PARAM, fields, names), (OMIT_PARAM, omit, names),
+                                   (EXPAND_PARAM, expand, expandable)):
+        unknown = [value for value in values if value not in allowed]
+        if unknown:
+            raise ValidationError({param: f'Unknown field(s): {", ".join(unknown)}'})
+
+    selected = tuple(
+        name for name in names
+        if (not fields or name in fields or name in expand) and name not in omit
+    )
+    return None if selected == names else selected
+
+
+class DynamicFieldsMixin:
+    """Serializer mixin taking ``fields=``: the names to keep (None keeps all)."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class SparseFieldsMixin:
+    """
+    ViewSet mixin applying ?fields= / ?omit= / ?expand= to the serializer of read
+    requests. The queryset should be built with get_requested_fields() too, so
+    the SQL only loads (and prefetches) what is rendered.
+    """
+    expandable_fields = ()
+
+    def get_requested_fields(self):
+        if self.request.method not in ('GET', 'HEAD'):
+            return None
+        if not hasattr(self, '_requested_fields'):
+            self._requested_fields = requested_fields(
+                self.get_serializer_class(), self.request.query_params, self.expandable_fields)
+        return self._requested_fields
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
@@ -0,0 +1,114 @@
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from django_filters import rest_framework as filters
+from rest_framework.exceptions import ValidationError
+
+from .models import Work, WorkItem, Payment
+
+# Works still open; past their due_end_date they are overdue (as in the time report)
+OPEN_STATUSES = ['IN_PROGRESS', 'PENDING']
+WORK_SEARCH_FIELDS = ('work_number', 'project', 'location_name')
+
+
+def search_filter(fields):
+    """A ``method=`` for a case-insensitive substring match on any of ``fields``."""
+    def search(queryset, name, value):
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__icontains': value})
+        return queryset.filter(condition)
+    return search
+
+
+class WorkFilter(filters.FilterSet):
+    """
+    ?work_status=, ?item_status=, ?facility=, ?facility_name=, ?contractor=,
+    ?manager=, ?classification=, ?start_date_after= / ?start_date_before=,
+    ?due_end_date_after= / ?due_end_date_before=, ?overdue=, ?budget_min= /
+    ?budget_max=, ?search= (work number, project, location) and ?ordering=.
+    """
+    work_status = filters.CharFilter(field_name='status')
+    item_status = filters.CharFilter(method='filter_item_status')
+    facility = filters.NumberFilter(field_name='facility_id')
+    facility_name = filters.CharFilter(field_name='facility__name')
+    contractor = filters.NumberFilter(field_name='contractor_id')
+    manager = filters.NumberFilter(field_name='manager_id')
+    classification = filters.ChoiceFilter(choices=Work.CLASSIFICATION_CHOICES)
+    start_date = filters.DateFromToRangeFilter()
+    due_end_date = filters.DateFromToRangeFilter()
+    overdue = filters.BooleanFilter(method='filter_overdue')
+    budget_min = filters.NumberFilter(field_name='contract_total', lookup_expr='gte')
+    budget_max = filters.NumberFilter(field_name='contract_total', lookup_expr='lte')
+    search = filters.CharFilter(method=search_filter(WORK_SEARCH_FIELDS))
+    # The orderings backed by an index (the keyset pagination's, which wins on paginated requests)
+    ordering = filters.OrderingFilter(fields=('updated_at', 'start_date', 'contract_total'))
+
+    class Meta:
+        model = Work
+        fields = []
+
+    def filter_item_status(self, queryset, name, value):
+        # A semi-join: no row multiplication, so no .distinct() over the wide work rows
+        return queryset.filter(Exists(WorkItem.objects.filter(work=OuterRef('pk'), status=value)))
+
+    def filter_overdue(self, queryset, name, value):
+        overdue = Q(status__in=OPEN_STATUSES, due_end_date__lt=timezone.now())
+        return queryset.filter(overdue) if value else queryset.exclude(overdue)
+
+
+class WorkItemFilter(filters.FilterSet):
+    """?status=, ?work=, ?work_type=, ?facility=, ?contractor=, ?search= (description, work type) and ?ordering=."""
+    status = filters.ChoiceFilter(choices=WorkItem.STATUS_CHOICES)
+    work = filters.NumberFilter(field_name='work_id')
+    work_type = filters.CharFilter()
+    facility = filters.NumberFilter(field_name='work__facility_id')
+    contractor = filters.NumberFilter(field_name='work__contractor_id')
+    search = filters.CharFilter(method=search_filter(('description', 'work_type')))
+    ordering = filters.OrderingFilter(fields=('updated_at', 'created_at'))
+
+    class Meta:
+        model = WorkItem
+        fields = []
+
+
+class PaymentFilter(filters.FilterSet):
+    """
+    ?work=, ?payment_date_after= / ?payment_date_before=, ?amount_min= /
+    ?amount_max=, ?payment_manager=, ?approval_manager=, ?search= (invoice number)
+    and ?ordering=.
+    """
+    work = filters.NumberFilter(field_name='work_id')
+    payment_date = filters.DateFromToRangeFilter()
+    amount_min = filters.NumberFilter(field_name='amount_paid', lookup_expr='gte')
+    amount_max = filters.NumberFilter(field_name='amount_paid', lookup_expr='lte')
+    payment_manager = filters.NumberFilter(field_name='payment_manager_id')
+    approval_manager = filters.NumberFilter(field_name='approval_manager_id')
+    search = filters.CharFilter(method=search_filter(('invoice_number',)))
+    ordering = filters.OrderingFilter(fields=('payment_date',))
+
+    class Meta:
+        model = Payment
+        fields = []
+
+
+def filter_works(queryset, params, request=None):
+    """Apply WorkFilter outside a ViewSet (async views, jobs); invalid values raise ValidationError."""
+    filterset = WorkFilter(params, queryset, request=request)
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    return filterset.qs
+
+
+def narrows_works(params):
+    """True when ``params`` carry a WorkFilter condition, i.e. leave out some works (ordering aside)."""
+    filterset = WorkFilter(params, Work.objects.none())
+    if not filterset.is_valid():
+        return True
+    for name, value in filterset.form.cleaned_data.items():
+        if name == 'ordering':
+            continue
+        if isinstance(value, slice):
+            value = value.start or value.stop
+        if value not in (None, '', [], ()):
+            return True
+    return False
@@ -0,0 +1,305 @@
+import csv
+import io
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+from django.utils import timezone
+
+from .db import write_with_retry
+from .models import User, Work, WorkItem, Facility
+from .rollups import refresh_work_rollups
+from .scorecards import refresh_scorecards
+
+try:
+    import openpyxl
+except ImportError:  # XLSX import is optional
+    openpyxl = None
+
+# Spreadsheet column -> model field. One row per bill-of-quantities item; the
+# work columns are read from the first row of each work_number.
+WORK_COLUMNS = {
+    'work_number': 'work_number',
+    'project': 'project',
+    'classification': 'classification',
+    'start_date': 'start_date',
+    'due_end_date': 'due_end_date',
+    'end_date': 'end_date',
+    'status': 'status',
+    'location_name': 'location_name',
+    'remarks': 'remarks',
+    'completion_percentage': 'completion_percentage',
+}
+ITEM_COLUMNS = {
+    'section': 'section',
+    'description': 'description',
+    'contract_amount': 'contract_amount',
+    'actual_amount': 'actual_amount',
+    'unit_cost': 'unit_cost',
+    'item_status': 'status',
+    'work_type': 'work_type',
+}
+FACILITY_COLUMN = 'facility_number'
+CONTRACTOR_COLUMN = 'contractor_idNum'
+MANAGER_COLUMN = 'manager_idNum'
+
+MANAGER_ROLES = ['MANAGER', 'GENERAL_ENGINEER', 'SUPER_ADMIN']
+
+
+class ImportFormatError(ValueError):
+    """The file can't be read at all (as opposed to individual bad rows)."""
+
+
+def _choice_codes(choices):
+    # Accept either the stored code or its display label
+    codes = {code: code for code, _ in choices}
+    codes.update({label: code for code, label in choices})
+    return codes
+
+
+CHOICE_CODES = {
+    (Work, 'classification'): _choice_codes(Work.CLASSIFICATION_CHOICES),
+    (Work, 'status'): _choice_codes(Work.STATUS_CHOICES),
+    (WorkItem, 'status'): _choice_codes(WorkItem.STATUS_CHOICES),
+}
+
+
+def read_csv(fileobj):
+    text = fileobj if isinstance(fileobj, io.TextIOBase) else io.TextIOWrapper(fileobj, encoding='utf-8-sig')
+    yield from csv.DictReader(text)
+
+
+def read_xlsx(fileobj):
+    if openpyxl is None:
+        raise ImportFormatError('XLSX import needs openpyxl; upload a CSV file instead.')
+    workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else '' for cell in next(rows, [])]
+        for row in rows:
+            yield dict(zip(header, row))
+    finally:
+        workbook.close()
+
+
+def read_rows(fileobj, filename):
+    if filename.lower().endswith('.xlsx'):
+        return read_xlsx(fileobj)
+    if filename.lower().endswith('.csv'):
+        return read_csv(fileobj)
+    raise ImportFormatError('Unsupported file type; upload a .csv or .xlsx file.')
+
+
+def clean_fields(model, row, columns):
+    """Validate ``row`` against the model field constraints; returns (values, errors)."""
+    values, errors = {}, {}
+    for column, name in columns.items():
+        field = model._meta.get_field(name)
+        raw = row.get(column)
+        if isinstance(raw, str):
+            raw = raw.strip()
+        if raw in (None, ''):
+            raw = field.get_default() if field.has_default() else (None if field.null else '')
+        elif (model, name) in CHOICE_CODES:
+            raw = CHOICE_CODES[(model, name)].get(raw, raw)
+        try:
+            value = field.clean(raw, None)
+        except ValidationError as e:
+            errors[column] = e.messages
+            continue
+        if hasattr(value, 'tzinfo') and timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        values[name] = value
+    return values, errors
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.created_works = 0
+        self.created_items = 0
+        self.errors = []
+
+    def add_error(self, row_number, errors):
+        self.errors.append({'row': row_number, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created_works': self.created_works,
+            'created_items': self.created_items,
+            'failed_rows': len(self.errors),
+            'errors': self.errors,
+        }
+
+
+class WorkImporter:
+    """
+    Streams rows of works and their items, validates them in batches and inserts
+    each batch in its own transaction. Bad rows are reported and skipped; the
+    rest of the file is still imported.
+
+    ``work_scope`` is the queryset of existing works rows may add items to (the
+    caller's role scope); ``manager`` is used when a row has no manager_idNum.
+    """
+
+    def __init__(self, manager=None, work_scope=None, batch_size=1000, dry_run=False):
+        self.manager = manager
+        self.work_scope = work_scope if work_scope is not None else Work.objects.all()
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+
+        # Lookup maps, loaded once per import
+        self.facilities = dict(Facility.objects.values_list('facility_number', 'id'))
+        self.contractors = dict(User.objects.filter(role='CONTRACTOR').values_list('idNum', 'id'))
+        self.managers = dict(User.objects.filter(role__in=MANAGER_ROLES).values_list('idNum', 'id'))
+
+        # work_number -> id of works created or matched so far (None in a dry run)
+        self.works = {}
+        self.failed_works = set()
+
+    def import_file(self, fileobj, filename):
+        return self.import_rows(read_rows(fileobj, filename))
+
+    def import_rows(self, rows):
+        result = ImportResult()
+        rows = enumerate(rows, start=2)  # row 1 is the header
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            result.rows += len(batch)
+            self.import_batch(batch, result)
+        return result
+
+    def import_batch(self, batch, result):
+        numbers = {str(row.get('work_number') or '').strip() for _, row in batch} - set(self.works)
+        existing = dict(Work.objects.filter(work_number__in=numbers).values_list('work_number', 'id'))
+        allowed = set(self.work_scope.filter(work_number__in=existing).values_list('work_number', flat=True))
+
+        new_works = {}
+        items = []
+        pending = {}  # row number -> work number, for the rows this batch would save
+        for row_number, row in batch:
+            work_number = str(row.get('work_number') or '').strip()
+            if not work_number:
+                result.add_error(row_number, {'work_number': ['This field is required.']})
+                continue
+            if work_number in self.failed_works:
+                result.add_error(row_number, {'work_number': [f'Work {work_number} failed validation.']})
+                continue
+
+            if work_number in existing and work_number not in self.works:
+                if work_number not in allowed:
+                    self.failed_works.add(work_number)
+                    result.add_error(row_number, {'work_number': [f'Work {work_number} already exists and is '
+                                                                  f'not yours to change.']})
+                    continue
+                self.works[work_number] = existing[work_number]
+
+            if work_number not in self.works and work_number not in new_works:
+                work, errors = self.build_work(row)
+                if errors:
+                    self.failed_works.add(work_number)
+                    result.add_error(row_number, errors)
+                    continue
+                new_works[work_number] = work
+                pending[row_number] = work_number
+
+            if self.has_item(row):
+                values, errors = clean_fields(WorkItem, row, ITEM_COLUMNS)
+                if errors:
+                    result.add_error(row_number, errors)
+                    continue
+                items.append((work_number, WorkItem(**values)))
+                pending[row_number] = work_number
+
+        if self.dry_run:
+            self.works.update(dict.fromkeys(new_works))
+            result.created_works += len(new_works)
+            result.created_items += len(items)
+            return
+
+        # Each batch commits on its own, holding the write lock only while it is saved
+        error = self.save(new_works, items)
+        if error is not None:
+            # Most likely work numbers created since the batch was checked: report
+            # their rows and save the rest once more
+            taken = set(Work.objects.filter(work_number__in=new_works).values_list('work_number', flat=True))
+            self.reject_rows(pending, taken, result, lambda number: f'Work {number} already exists.')
+            new_works = {number: work for number, work in new_works.items() if number not in taken}
+            items = [(number, item) for number, item in items if number not in taken]
+            pending = {row: number for row, number in pending.items() if number not in taken}
+            if taken:
+                error = self.save(new_works, items)
+            if error is not None:
+                self.reject_rows(pending, pending.values(), result, lambda number: f'Not saved: {error}')
+                return
+        self.works.update({number: work.pk for number, work in new_works.items()})
+        result.created_works += len(new_works)
+        result.created_items += len(items)
+
+    def save(self, new_works, items):
+        """save_batch() in its own transaction; the IntegrityError that rolled it back, if any."""
+        try:
+            write_with_retry(self.save_batch, new_works, items)
+        except IntegrityError as e:
+            return e
+        return None
+
+    def reject_rows(self, pending, work_numbers, result, message):
+        """Report the pending rows of ``work_numbers`` as failed; later rows of new works among them fail too."""
+        work_numbers = set(work_numbers)
+        for row_number, work_number in pending.items():
+            if work_number in work_numbers:
+                result.add_error(row_number, {'work_number': [message(work_number)]})
+        self.failed_works.update(work_numbers - set(self.works))
+        result.errors.sort(key=lambda error: error['row'])
+
+    def save_batch(self, new_works, items):
+        works = dict(self.works)
+        for work in new_works.values():
+            work.pk = None  # a retried attempt inserts them again
+        Work.objects.bulk_create(new_works.values())
+        works.update({number: work.pk for number, work in new_works.items()})
+        for work_number, item in items:
+            item.pk = None
+            item.work_id = works[work_number]
+        WorkItem.objects.bulk_create([item for _, item in items], batch_size=self.batch_size)
+        # bulk_create sends no signals; bring the touched works' rollups up to date
+        refresh_work_rollups({work.pk for work in new_works.values()} | {item.work_id for _, item in items})
+        refresh_scorecards({work.contractor_id for work in new_works.values()})
+
+    @staticmethod
+    def has_item(row):
+        return any(str(row.get(column) or '').strip() for column in ITEM_COLUMNS)
+
+    def build_work(self, row):
+        values, errors = clean_fields(Work, row, WORK_COLUMNS)
+
+        facility_number = str(row.get(FACILITY_COLUMN) or '').strip()
+        try:
+            values['facility_id'] = self.facilities[int(float(facility_number))]
+        except (KeyError, ValueError, OverflowError):
+            errors[FACILITY_COLUMN] = [f'Unknown facility number "{facility_number}".']
+
+        contractor = str(row.get(CONTRACTOR_COLUMN) or '').strip()
+        if contractor in self.contractors:
+            values['contractor_id'] = self.contractors[contractor]
+        else:
+            errors[CONTRACTOR_COLUMN] = [f'No contractor with idNum "{contractor}".']
+
+        manager = str(row.get(MANAGER_COLUMN) or '').strip()
+        if manager:
+            if manager in self.managers:
+                values['manager_id'] = self.managers[manager]
+            else:
+                errors[MANAGER_COLUMN] = [f'No manager with idNum "{manager}".']
+        elif self.manager is not None:
+            values['manager_id'] = self.manager.pk
+        else:
+            errors[MANAGER_COLUMN] = ['This field is required.']
+
+        if errors:
+            return None, errors
+        return Work(**values), {}
@@ -0,0 +1,12 @@
+# Entry points for the run_jobs process pool. Kept free of model imports so a
+# freshly spawned worker process can import this module before Django is set up.
+
+
+def setup():
+    import django
+    django.setup()
+
+
+def run(job_id):
+    from .jobs import run_job
+    return run_job(job_id)
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import logging
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+from django.http import QueryDict
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .exports import EXPORT_FORMATS, work_export_rows, payment_export_rows, payment_export_works, export_stream
+from .models import Job
+from .permissions import scope_key
+from .querysets import work_queryset
+from .reports import (
+    REPORT_TYPES, ReportError, report_filters, filter_report_queryset, compute_report, compute_reports,
+    parse_report_types, use_scorecards,
+)
+from .serializers import WorkSerializer
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ['QUEUED', 'RUNNING']
+
+
+def result_ttl():
+    return timedelta(seconds=getattr(settings, 'JOB_RESULT_TTL_SECONDS', 600))
+
+
+def as_query_dict(params):
+    """A QueryDict from stored {name: [values]} params, as the report/export code expects."""
+    query = QueryDict(mutable=True)
+    for name, values in params.items():
+        query.setlist(name, values)
+    return query
+
+
+def normalize_params(params):
+    """{name: [str values]} from a QueryDict or a JSON object of values / lists of values."""
+    if isinstance(params, QueryDict):
+        return {name: params.getlist(name) for name in sorted(params)}
+    return {
+        str(name): [str(value) for value in (values if isinstance(values, list) else [values])]
+        for name, values in sorted(params.items())
+    }
+
+
+def validate(kind, params):
+    """Raise ReportError for parameters the job would fail on, so the client hears about it at submit time."""
+    if kind not in dict(Job.KIND_CHOICES):
+        raise ReportError(f'Invalid job kind. Use one of: {", ".join(dict(Job.KIND_CHOICES))}')
+    query = as_query_dict(params)
+    report_filters(query)
+    if kind == 'report':
+        report_types = parse_report_types(query) or [query.get('type')]
+        invalid = [report_type for report_type in report_types if report_type not in REPORT_TYPES]
+        if invalid:
+            raise ReportError('Invalid report type')
+    elif query.get('file_format', 'csv') not in EXPORT_FORMATS:
+        raise ReportError('Invalid file_format. Use csv or ndjson')
+
+
+def params_hash(user, kind, params):
+    """Same kind, same parameters and same visible works give the same result."""
+    key = json.dumps({'kind': kind, 'params': params, 'scope': scope_key(user)}, sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def submit_job(user, kind, params):
+    """
+    Queue a job, or reuse a result: a finished job with the same hash within
+    JOB_RESULT_TTL_SECONDS gives a new, already DONE job pointing at its file;
+    the user's own queued or running identical job is returned as is.
+    Returns (job, created).
+    """
+    params = normalize_params(params)
+    validate(kind, params)
+    digest = params_hash(user, kind, params)
+
+    pending = Job.objects.filter(user=user, params_hash=digest, status__in=ACTIVE_STATUSES).first()
+    if pending is not None:
+        return pending, False
+
+    now = timezone.now()
+    cached = Job.objects.filter(params_hash=digest, status='DONE', finished_at__gte=now - result_ttl()).exclude(
+        result='').order_by('-finished_at').first()
+    if cached is not None:
+        job = Job.objects.create(
+            user=user, kind=kind, params=params, params_hash=digest, status='DONE', cached=True,
+            result=cached.result.name, content_type=cached.content_type, started_at=now, finished_at=now,
+        )
+        return job, False
+
+    return Job.objects.create(user=user, kind=kind, params=params, params_hash=digest), True
+
+
+def claim_job():
+    """Mark the oldest queued job as running and return its id (None when the queue is empty)."""
+    for job_id in Job.objects.filter(status='QUEUED').order_by('created_at').values_list('pk', flat=True)[:10]:
+        # The status condition makes the claim safe with several workers
+        if Job.objects.filter(pk=job_id, status='QUEUED').update(status='RUNNING', started_at=timezone.now()):
+            return job_id
+    return None
+
+
+def requeue_stale(older_than):
+    """Put back jobs left RUNNING by a worker that died."""
+    return Job.objects.filter(status='RUNNING', started_at__lt=timezone.now() - older_than).update(
+        status='QUEUED', started_at=None)
+
+
+def prune_jobs(older_than):
+    """Delete finished jobs older than ``older_than`` and the result files nothing refers to any more."""
+    cutoff = timezone.now() - older_than
+    expired = Job.objects.filter(Q(finished_at__lt=cutoff) | Q(finished_at=None, created_at__lt=cutoff)).exclude(
+        status__in=ACTIVE_STATUSES)
+    names = set(expired.exclude(result='').values_list('result', flat=True))
+    deleted, _ = expired.delete()
+    storage = Job._meta.get_field('result').storage
+    for name in names - set(Job.objects.filter(result__in=names).values_list('result', flat=True)):
+        storage.delete(name)
+    return deleted
+
+
+def build_report(job, params):
+    works = filter_report_queryset(work_queryset(job.user, params, WorkSerializer), params)
+    report_types = parse_report_types(params)
+    scorecards = use_scorecards(job.user, params)
+    if report_types:
+        data = compute_reports(report_types, works, params, scorecards)
+    else:
+        data = compute_report(params.get('type'), works, params, scorecards)
+    return 'json', 'application/json', [JSONRenderer().render(data).decode()]
+
+
+def build_export(job, params):
+    file_format = params.get('file_format', 'csv')
+    if job.kind == 'export_works':
+        works = filter_report_queryset(work_queryset(job.user, params, WorkSerializer), params)
+        header, rows = work_export_rows(works)
+    else:
+        header, rows = payment_export_rows(payment_export_works(job.user, params))
+    return file_format, EXPORT_FORMATS[file_format], export_stream(header, rows, file_format)
+
+
+def run_job(job_id):
+    """Compute a claimed job and store its result file. Runs in a run_jobs worker process."""
+    job = Job.objects.select_related('user').get(pk=job_id)
+    params = as_query_dict(job.params)
+    try:
+        build = build_report if job.kind == 'report' else build_export
+        extension, content_type, chunks = build(job, params)
+        # Spooled to disk past 1 MB, so large exports don't sit in memory
+        with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as tmp:
+            for chunk in chunks:
+                tmp.write(chunk.encode())
+            tmp.seek(0)
+            with transaction.atomic():
+                job.result.save(f'{job.kind}-{job.pk}.{extension}', File(tmp), save=False)
+                job.content_type = content_type
+                job.status = 'DONE'
+                job.finished_at = timezone.now()
+                job.save(update_fields=['result', 'content_type', 'status', 'finished_at'])
+    except Exception as e:
+        logger.exception('Job %s failed', job_id)
+        Job.objects.filter(pk=job_id).update(status='FAILED', error=str(e) or e.__class__.__name__,
+                                             finished_at=timezone.now())
+    return job_id
@@ -0,0 +1,100 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from backend.benchmarks import (
+    benchmark_database, measure_request, environment, save_results, load_results, find_regressions,
+)
+from backend.management.commands.seed_data import add_scale_arguments, scale_from_options
+from backend.models import User, Work
+from backend.reports import REPORT_TYPES
+from backend.seeding import seed, EMAIL_DOMAIN
+
+DEFAULT_SCALE = {'works': 500, 'contractors': 20, 'managers': 10, 'facilities': 10}
+
+
+def endpoints(work):
+    """(name, role, url) for every benchmarked route in backend/urls.py."""
+    yield 'works list (super admin)', 'SUPER_ADMIN', '/works/'
+    yield 'works list (manager)', 'MANAGER', '/works/'
+    yield 'works list (contractor)', 'CONTRACTOR', '/works/'
+    yield 'works page (keyset, 50)', 'SUPER_ADMIN', '/works/?page_size=50'
+    yield 'work detail', 'SUPER_ADMIN', f'/works/{work.pk}/'
+    for report_type in REPORT_TYPES:
+        yield f'reports {report_type}', 'GENERAL_ENGINEER', f'/works/reports/?type={report_type}'
+    yield 'reports batch (all)', 'GENERAL_ENGINEER', f'/works/reports/batch/?types={",".join(REPORT_TYPES)}'
+    yield 'work_statuses', 'MANAGER', '/works/work_statuses/'
+    yield 'classifications', 'MANAGER', '/works/classifications/'
+    yield 'work_item_statuses', 'CONTRACTOR', '/work-items/work_item_statuses/'
+    yield 'work items list (contractor)', 'CONTRACTOR', '/work-items/'
+    yield 'comments (nested)', 'MANAGER', f'/works/{work.pk}/comments/'
+    yield 'payments list', 'PAYMENT_ADMIN', '/payments/'
+    yield 'dropdown contractors', 'MANAGER', '/user-roles/contractors_for_dropdown/'
+    yield 'dropdown managers', 'MANAGER', '/user-roles/managers_and_superadmins_for_dropdown/'
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the API routes through the Django test client: p50/p95 latency, query count and '
+            'response bytes per endpoint, written as JSON so runs can be compared.')
+
+    def add_arguments(self, parser):
+        add_scale_arguments(parser)
+        parser.set_defaults(**DEFAULT_SCALE)
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per endpoint.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--baseline', help='Compare against a previous results file and fail on regressions.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed p95 growth against the baseline, as a fraction.')
+        parser.add_argument('--only', help='Only run endpoints whose name contains this text.')
+        parser.add_argument('--use-current-db', action='store_true',
+                            help='Benchmark the configured (already seeded) database instead of a fresh test '
+                                 'database.')
+
+    def handle(self, *args, **options):
+        with benchmark_database(keep_current=options['use_current_db']):
+            if not options['use_current_db']:
+                self.stdout.write('Seeding a test database...')
+                seed(scale_from_options(options), seed=options['seed'])
+            results = self.run(options)
+
+        if options['output']:
+            save_results(options['output'], results)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+        if options['baseline']:
+            regressions = find_regressions(load_results(options['baseline']), results, options['threshold'])
+            if regressions:
+                raise CommandError('Regressions against the baseline:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    def run(self, options):
+        seeded = User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}')
+        users = {}
+        for role, _ in User.ROLES:
+            users[role] = seeded.filter(role=role).order_by('pk').first() or User.objects.filter(role=role).first()
+        work = Work.objects.order_by('pk').first()
+        if work is None:
+            raise CommandError('The database has no works; seed it first.')
+
+        clients = {}
+        results = {
+            'environment': environment(),
+            'scale': {key: options[key] for key in ('works', 'items_per_work', 'contractors', 'seed')},
+            'endpoints': {},
+        }
+        self.stdout.write(f'{"endpoint":40} {"p50 ms":>9} {"p95 ms":>9} {"queries":>8} {"bytes":>10}')
+        for name, role, url in endpoints(work):
+            if options['only'] and options['only'] not in name:
+                continue
+            if users.get(role) is None:
+                self.stderr.write(f'skipping {name}: no {role} user')
+                continue
+            if role not in clients:
+                clients[role] = Client()
+                clients[role].force_login(users[role])
+            result = measure_request(clients[role], url, repeat=options['repeat'])
+            results['endpoints'][name] = result
+            self.stdout.write(f'{name:40} {result["p50_ms"]:>9} {result["p95_ms"]:>9} '
+                              f'{result["queries"]:>8} {result["bytes"]:>10}')
+            if result['status'] != 200:
+                self.stderr.write(f'  {name} returned HTTP {result["status"]}')
+        return results
@@ -0,0 +1,179 @@
+import asyncio
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.benchmarks import benchmark_database, environment, percentile, save_results
+from backend.management.commands.benchmark_api import DEFAULT_SCALE
+from backend.management.commands.seed_data import add_scale_arguments, scale_from_options
+from backend.models import User, Work
+from backend.seeding import seed, EMAIL_DOMAIN
+
+# (name, sync path); the async path is the same under /async
+ENDPOINTS = (
+    ('works list', '/works/'),
+    ('works page', '/works/?page_size=50'),
+    ('work detail', '/works/{work}/'),
+    ('reports cost', '/works/reports/?type=cost'),
+    ('reports contractors', '/works/reports/?type=contractors'),
+    ('comments', '/works/{work}/comments/'),
+)
+
+# Which application serves the request, and whether it goes to the async views
+MODES = (
+    ('wsgi', False),
+    ('asgi', False),
+    ('asgi-async', True),
+)
+
+
+def split_path(url):
+    path, _, query = url.partition('?')
+    return path, query
+
+
+def wsgi_request(application, url, token):
+    """One GET through the WSGI application, as a WSGI server would issue it; returns (ms, status)."""
+    path, query = split_path(url)
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'testserver', 'HTTP_AUTHORIZATION': f'Bearer {token}',
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    status = []
+    started = time.perf_counter()
+    result = application(environ, lambda status_line, headers, exc_info=None: status.append(status_line))
+    try:
+        b''.join(result)
+    finally:
+        result.close()  # sends request_finished, which closes the thread's connection
+    return (time.perf_counter() - started) * 1000, int(status[0][:3])
+
+
+async def asgi_request(application, url, token):
+    """One GET through the ASGI application, as an ASGI server would issue it; returns (ms, status)."""
+    path, query = split_path(url)
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'authorization', f'Bearer {token}'.encode())],
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 0),
+    }
+    received = False
+    status = []
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The handler listens for a disconnect until the response is sent, then cancels this
+        await asyncio.Future()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    started = time.perf_counter()
+    await application(scope, receive, send)
+    return (time.perf_counter() - started) * 1000, status[0]
+
+
+def run_wsgi(application, url, token, requests, concurrency):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(lambda _: wsgi_request(application, url, token), range(requests)))
+
+
+async def run_asgi(application, url, token, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited():
+        async with semaphore:
+            return await asgi_request(application, url, token)
+
+    return await asyncio.gather(*(limited() for _ in range(requests)))
+
+
+class Command(BaseCommand):
+    help = ('Compare concurrent throughput of the hot read endpoints through wsgi.py (sync views), '
+            'asgi.py (sync views) and asgi.py with the async views under /async/. Requests are issued '
+            'in-process against the application objects, so the numbers exclude the network and server.')
+
+    def add_arguments(self, parser):
+        add_scale_arguments(parser)
+        parser.set_defaults(**DEFAULT_SCALE)
+        parser.add_argument('--concurrency', default='1,8,32',
+                            help='Comma-separated numbers of requests in flight at once.')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint and level.')
+        parser.add_argument('--role', default='MANAGER', help='Role of the user the requests are made as.')
+        parser.add_argument('--only', help='Only run endpoints whose name contains this text.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--use-current-db', action='store_true',
+                            help='Benchmark the configured (already seeded) database instead of a fresh test '
+                                 'database.')
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError('--concurrency takes comma-separated integers, e.g. 1,8,32')
+
+        with benchmark_database(keep_current=options['use_current_db']):
+            if not options['use_current_db']:
+                self.stdout.write('Seeding a test database...')
+                seed(scale_from_options(options), seed=options['seed'])
+            results = self.run(options, levels)
+
+        if options['output']:
+            save_results(options['output'], results)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+    def run(self, options, levels):
+        # Imported here so the applications are built after the test database is in place
+        from ConstructionManagement.asgi import application as asgi_application
+        from ConstructionManagement.wsgi import application as wsgi_application
+
+        users = User.objects.filter(role=options['role'])
+        user = users.filter(email__endswith=f'@{EMAIL_DOMAIN}').order_by('pk').first() or users.first()
+        if user is None:
+            raise CommandError(f'No {options["role"]} user to make the requests as.')
+        work = Work.objects.filter(manager=user).order_by('pk').first() or Work.objects.order_by('pk').first()
+        if work is None:
+            raise CommandError('The database has no works; seed it first.')
+        token = str(AccessToken.for_user(user))
+
+        results = {'environment': environment(), 'requests': options['requests'], 'runs': []}
+        self.stdout.write(f'{"endpoint":22} {"mode":11} {"conc":>5} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} '
+                          f'{"errors":>7}')
+        for name, url in ENDPOINTS:
+            if options['only'] and options['only'] not in name:
+                continue
+            url = url.format(work=work.pk)
+            for mode, use_async_views in MODES:
+                target = f'/async{url}' if use_async_views else url
+                for concurrency in levels:
+                    started = time.perf_counter()
+                    if mode == 'wsgi':
+                        samples = run_wsgi(wsgi_application, target, token, options['requests'], concurrency)
+                    else:
+                        samples = asyncio.run(run_asgi(asgi_application, target, token, options['requests'],
+                                                       concurrency))
+                    elapsed = time.perf_counter() - started
+                    timings = [ms for ms, _ in samples]
+                    run = {
+                        'endpoint': name, 'mode': mode, 'concurrency': concurrency,
+                        'throughput_rps': round(len(samples) / elapsed, 1),
+                        'p50_ms': round(percentile(timings, 50), 3),
+                        'p95_ms': round(percentile(timings, 95), 3),
+                        'errors': sum(1 for _, status in samples if status != 200),
+                    }
+                    results['runs'].append(run)
+                    self.stdout.write(f'{name:22} {mode:11} {concurrency:>5} {run["throughput_rps"]:>9} '
+                                      f'{run["p50_ms"]:>9} {run["p95_ms"]:>9} {run["errors"]:>7}')
+        return results
@@ -0,0 +1,105 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from backend.authentication import CachedJWTAuthentication, user_cache
+from backend.benchmarks import benchmark_database, environment, measure_request, save_results, summarize
+from backend.management.commands.seed_data import add_scale_arguments, scale_from_options
+from backend.models import User
+from backend.seeding import seed, EMAIL_DOMAIN, SEED_PASSWORD
+
+# Only the users matter here
+DEFAULT_SCALE = {'works': 20, 'contractors': 5, 'managers': 2, 'facilities': 2}
+AUTHENTICATORS = (('JWTAuthentication', JWTAuthentication), ('CachedJWTAuthentication', CachedJWTAuthentication))
+
+
+class Command(BaseCommand):
+    help = ('Benchmark authentication: the dj_rest_auth login and token refresh endpoints, an authenticated '
+            'API call, and JWTAuthentication against CachedJWTAuthentication on the same token.')
+
+    def add_arguments(self, parser):
+        add_scale_arguments(parser)
+        parser.set_defaults(**DEFAULT_SCALE)
+        parser.add_argument('--repeat', type=int, default=50, help='Timed requests per endpoint.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--use-current-db', action='store_true',
+                            help='Benchmark the configured (already seeded) database instead of a fresh test '
+                                 'database; --email / --password then name the user to log in as.')
+        parser.add_argument('--email', help='Log in as this user (default: the first seeded manager).')
+        parser.add_argument('--password', default=SEED_PASSWORD)
+
+    def handle(self, *args, **options):
+        with benchmark_database(keep_current=options['use_current_db']):
+            if not options['use_current_db']:
+                self.stdout.write('Seeding a test database...')
+                seed(scale_from_options(options), seed=options['seed'])
+            results = self.run(options)
+
+        if options['output']:
+            save_results(options['output'], results)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+    def run(self, options):
+        if options['email']:
+            user = User.objects.filter(email=options['email']).first()
+        else:
+            user = User.objects.filter(role='MANAGER', email__endswith=f'@{EMAIL_DOMAIN}').order_by('pk').first()
+        if user is None:
+            raise CommandError('No user to log in as; seed the database or pass --email.')
+
+        refresh = RefreshToken.for_user(user)
+        bearer = {'HTTP_AUTHORIZATION': f'Bearer {refresh.access_token}'}
+        endpoints = (
+            ('login', '/auth/login/', 'post', {'email': user.email, 'password': options['password']}, {}),
+            # Not rotated into a blacklist (BLACKLIST_AFTER_ROTATION is off), so the token stays usable
+            ('token refresh', '/auth/token/refresh/', 'post', {'refresh': str(refresh)}, {}),
+            ('authenticated GET', '/works/classifications/', 'get', None, bearer),
+        )
+        results = {'environment': environment(), 'endpoints': {}, 'authenticators': {}}
+
+        self.stdout.write(f'{"endpoint":28} {"p50 ms":>9} {"p95 ms":>9} {"queries":>8} {"req/s":>9}')
+        for name, url, method, data, headers in endpoints:
+            extra = {'content_type': 'application/json', **headers} if method == 'post' else headers
+            result = measure_request(Client(), url, repeat=options['repeat'], method=method, data=data, **extra)
+            result['requests_per_second'] = round(1000 / result['mean_ms'], 1) if result['mean_ms'] else None
+            results['endpoints'][name] = result
+            self.stdout.write(f'{name:28} {result["p50_ms"]:>9} {result["p95_ms"]:>9} {result["queries"]:>8} '
+                              f'{result["requests_per_second"]:>9}')
+            if result['status'] != 200:
+                self.stderr.write(f'  {name} returned HTTP {result["status"]}')
+
+        self.stdout.write(f'\n{"authenticator":28} {"p50 ms":>9} {"p95 ms":>9} {"queries":>8} {"auth/s":>9}')
+        for name, authenticator_class in AUTHENTICATORS:
+            result = self.measure_authenticator(authenticator_class(), bearer, options['repeat'])
+            results['authenticators'][name] = result
+            self.stdout.write(f'{name:28} {result["p50_ms"]:>9} {result["p95_ms"]:>9} {result["queries"]:>8} '
+                              f'{result["per_second"]:>9}')
+        return results
+
+    @staticmethod
+    def measure_authenticator(authenticator, headers, repeat):
+        """Time authenticate() alone; queries are those of a warm call (a cache hit for the cached one)."""
+        user_cache.clear()
+        factory = RequestFactory()
+
+        def authenticate():
+            return authenticator.authenticate(Request(factory.get('/', **headers)))
+
+        authenticate()
+        with CaptureQueriesContext(connection) as ctx:
+            authenticate()
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            authenticate()
+            timings.append((time.perf_counter() - started) * 1000)
+        summary = summarize(timings)
+        summary['queries'] = len(ctx.captured_queries)
+        summary['per_second'] = round(1000 / summary['mean_ms'], 1) if summary['mean_ms'] else None
+        return summary
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from backend.benchmarks import benchmark_database, environment, save_results, summarize
+from backend.management.commands.benchmark_api import DEFAULT_SCALE
+from backend.management.commands.seed_data import add_scale_arguments, scale_from_options
+from backend.models import User
+from backend.querysets import work_queryset
+from backend.representations import work_list_representation
+from backend.seeding import seed
+from backend.serializers import WorkSerializer
+
+
+def serializer_path(queryset):
+    return JSONRenderer().render(WorkSerializer(queryset, many=True).data)
+
+
+def values_path(queryset):
+    representation = work_list_representation()
+    return JSONRenderer().render(representation.render(representation.values(queryset)))
+
+
+class Command(BaseCommand):
+    help = ('Compare the works list rendered by WorkSerializer with the values() fast path '
+            '(representations.py): works per second for each, after checking both give the same bytes.')
+
+    def add_arguments(self, parser):
+        add_scale_arguments(parser)
+        parser.set_defaults(**DEFAULT_SCALE)
+        parser.add_argument('--repeat', type=int, default=5, help='Timed renders per path.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--use-current-db', action='store_true',
+                            help='Benchmark the configured (already seeded) database instead of a fresh test '
+                                 'database.')
+
+    def handle(self, *args, **options):
+        with benchmark_database(keep_current=options['use_current_db']):
+            if not options['use_current_db']:
+                self.stdout.write('Seeding a test database...')
+                seed(scale_from_options(options), seed=options['seed'])
+            results = self.run(options)
+
+        if options['output']:
+            save_results(options['output'], results)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+    def run(self, options):
+        user = User.objects.filter(role='SUPER_ADMIN').order_by('pk').first()
+        if user is None:
+            raise CommandError('No SUPER_ADMIN user to list the works as; seed the database first.')
+        queryset = work_queryset(user, {}, WorkSerializer).order_by('-updated_at', '-pk')
+        works = queryset.count()
+
+        expected = serializer_path(queryset)
+        if values_path(queryset) != expected:
+            raise CommandError('The values() path no longer matches WorkSerializer; see WorkListRepresentationTests.')
+
+        results = {'environment': environment(), 'works': works, 'bytes': len(expected), 'paths': {}}
+        for name, render in (('serializer', serializer_path), ('values', values_path)):
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                render(queryset)
+                timings.append((time.perf_counter() - started) * 1000)
+            summary = summarize(timings)
+            summary['works_per_second'] = round(works / (summary['mean_ms'] / 1000), 1) if summary['mean_ms'] else None
+            results['paths'][name] = summary
+            self.stdout.write(f'{name:12} {summary["mean_ms"]:>10} ms  {summary["works_per_second"]:>10} works/s')
+        return results
@@ -0,0 +1,153 @@
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.benchmarks import benchmark_database, environment, percentile, save_results
+from backend.management.commands.benchmark_api import DEFAULT_SCALE
+from backend.management.commands.seed_data import add_scale_arguments, scale_from_options
+from backend.models import User, Work
+from backend.seeding import seed, EMAIL_DOMAIN
+
+# (name, settings): SQLite as Django opens it (rollback journal, deferred
+# transactions) against backend/db.py's pragmas and serialized writes
+MODES = (
+    ('before', {
+        'BACKEND_SQLITE_PRAGMAS': {'journal_mode': 'DELETE', 'busy_timeout': None, 'synchronous': 'FULL',
+                                   'mmap_size': 0, 'cache_size': -2000},
+        'BACKEND_SERIALIZE_WRITES': False,
+    }),
+    ('after', {'BACKEND_SQLITE_PRAGMAS': {}, 'BACKEND_SERIALIZE_WRITES': True}),
+)
+
+
+def wsgi_request(application, method, path, token, body=b''):
+    """One request through the WSGI application, as a WSGI server would issue it; returns (ms, status)."""
+    path, _, query = path.partition('?')
+    environ = {
+        'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'testserver', 'HTTP_AUTHORIZATION': f'Bearer {token}',
+        'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(body), 'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    status = []
+    started = time.perf_counter()
+    result = application(environ, lambda status_line, headers, exc_info=None: status.append(status_line))
+    try:
+        b''.join(result)
+    finally:
+        result.close()  # sends request_finished, which closes the thread's connection
+    return (time.perf_counter() - started) * 1000, int(status[0][:3])
+
+
+def worker(kind, number, token, works, start_at, deadline):
+    """One reader or writer process: requests back to back from ``start_at`` until ``deadline``."""
+    # Imported here so the application is built after the test database is in place
+    from ConstructionManagement.wsgi import application
+
+    time.sleep(max(0, start_at - time.monotonic()))
+    samples = []
+    while time.monotonic() < deadline:
+        work = works[(number + len(samples)) % len(works)]
+        if kind == 'read':
+            path = '/works/?page_size=20' if len(samples) % 2 else f'/works/{work}/'
+            samples.append(wsgi_request(application, 'GET', path, token))
+        else:
+            body = json.dumps({'remarks': f'benchmark {number}-{len(samples)}'}).encode()
+            samples.append(wsgi_request(application, 'PATCH', f'/works/{work}/', token, body))
+    return samples
+
+
+class Command(BaseCommand):
+    help = ('Concurrent readers and writers, each a forked process as under a pre-forking WSGI server, '
+            'against a file-backed SQLite database, before (Django\'s defaults) and after backend/db.py\'s '
+            'pragmas and serialized writes: read and write requests per second, latencies and failed requests '
+            '("database is locked" surfaces as HTTP 500).')
+
+    def add_arguments(self, parser):
+        add_scale_arguments(parser)
+        parser.set_defaults(**DEFAULT_SCALE)
+        parser.add_argument('--readers', type=int, default=8, help='Worker processes issuing GETs.')
+        parser.add_argument('--writers', type=int, default=4, help='Worker processes issuing PATCHes.')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per mode.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('This benchmark is about SQLite; the default database is not.')
+        directory = tempfile.mkdtemp(prefix='benchmark_sqlite_')
+        try:
+            with benchmark_database(test_name=os.path.join(directory, 'benchmark.sqlite3')):
+                self.stdout.write('Seeding a test database...')
+                seed(scale_from_options(options), seed=options['seed'])
+                results = self.run(options)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        if options['output']:
+            save_results(options['output'], results)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+    def run(self, options):
+        user = User.objects.filter(role='MANAGER', email__endswith=f'@{EMAIL_DOMAIN}').order_by('pk').first()
+        if user is None:
+            raise CommandError('No MANAGER user to make the requests as.')
+        works = list(Work.objects.filter(manager=user).order_by('pk').values_list('pk', flat=True)[:50])
+        if not works:
+            raise CommandError('The seeded manager has no works.')
+        token = str(AccessToken.for_user(user))
+
+        results = {'environment': environment(), 'readers': options['readers'], 'writers': options['writers'],
+                   'duration_s': options['duration'], 'modes': {}}
+        self.stdout.write(f'{"mode":8} {"kind":6} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} {"requests":>9} '
+                          f'{"failed":>7}')
+        for mode, overrides in MODES:
+            with override_settings(**overrides):  # inherited by the forked workers
+                # A new connection applies the mode's pragmas, switching the journal while nothing else is open
+                connections.close_all()
+                connections['default'].ensure_connection()
+                connections.close_all()
+                samples = self.run_mode(token, works, options)
+            results['modes'][mode] = {}
+            for kind in ('read', 'write'):
+                run = self.summarize(samples[kind], options['duration'])
+                results['modes'][mode][kind] = run
+                self.stdout.write(f'{mode:8} {kind:6} {run["requests_per_second"]:>9} {run["p50_ms"]!s:>9} '
+                                  f'{run["p95_ms"]!s:>9} {run["requests"]:>9} {run["failed"]:>7}')
+        return results
+
+    @staticmethod
+    def run_mode(token, works, options):
+        """Run the readers and writers for ``duration`` seconds; {'read'/'write': [(ms, status), ...]}."""
+        jobs = [('read', n) for n in range(options['readers'])] + [('write', n) for n in range(options['writers'])]
+        start_at = time.monotonic() + 1  # once every worker is up
+        deadline = start_at + options['duration']
+        samples = {'read': [], 'write': []}
+        with multiprocessing.get_context('fork').Pool(len(jobs)) as pool:
+            collected = pool.starmap(worker, [(kind, number, token, works, start_at, deadline)
+                                              for kind, number in jobs])
+        for (kind, _), results in zip(jobs, collected):
+            samples[kind].extend(results)
+        return samples
+
+    @staticmethod
+    def summarize(samples, duration):
+        ok = [ms for ms, status in samples if status < 400]
+        return {
+            'requests': len(samples),
+            'failed': len(samples) - len(ok),
+            'requests_per_second': round(len(ok) / duration, 1),
+            'p50_ms': round(percentile(ok, 50), 3) if ok else None,
+            'p95_ms': round(percentile(ok, 95), 3) if ok else None,
+        }
@@ -0,0 +1,127 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from backend.filters import WorkFilter
+from backend.models import User, Work, WorkItem, Payment, Comment
+
+OPEN_STATUSES = ['IN_PROGRESS', 'PENDING']
+
+
+class Rollback(Exception):
+    pass
+
+
+def access_paths():
+    """The role-scoped queries the list and report endpoints issue, by name."""
+    contractor = User.objects.filter(role='CONTRACTOR').first()
+    manager = User.objects.filter(role='MANAGER').first()
+    work = Work.objects.order_by('pk').first()
+    if not (contractor and manager and work):
+        raise CommandError('Seed the database first: it needs a contractor, a manager and works.')
+    now = timezone.now()
+    return {
+        'works: contractor list': Work.objects.filter(contractor__idNum=contractor.idNum),
+        'works: contractor by status': Work.objects.filter(contractor__idNum=contractor.idNum,
+                                                           status='IN_PROGRESS'),
+        'works: manager by status': Work.objects.filter(manager=manager, status='IN_PROGRESS'),
+        'works: item_status filter': WorkFilter({'item_status': 'QUALITY_CONTROL'}, Work.objects.all()).qs,
+        'works: keyset page (updated_at)': Work.objects.order_by('-updated_at', '-id')[:51],
+        'reports: time delayed': Work.objects.filter(due_end_date__lt=now, status__in=OPEN_STATUSES),
+        'reports: start_date range': Work.objects.filter(start_date__range=(now.replace(year=now.year - 1), now)),
+        'items: contractor list': WorkItem.objects.filter(work__contractor__idNum=contractor.idNum),
+        'items: work by status': WorkItem.objects.filter(work=work, status='PENDING'),
+        'items: keyset page (updated_at)': WorkItem.objects.order_by('-updated_at', '-id')[:51],
+        'items: keyset page (created_at)': WorkItem.objects.order_by('-created_at', '-id')[:51],
+        'payments: work history': Payment.objects.filter(work=work).order_by('payment_date'),
+        'comments: work thread': Comment.objects.filter(work_id=work.pk).order_by('created_at'),
+    }
+
+
+def explain(queryset, label):
+    sql, params = queryset.query.sql_with_params()
+    prefix = 'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+    with connection.cursor() as cursor:
+        # The label keeps sqlite3's statement cache from replaying a plan compiled
+        # before the indexes were dropped.
+        cursor.execute(f'{prefix} {sql} /* {label} */', params)
+        rows = cursor.fetchall()
+    if connection.vendor == 'sqlite':
+        return [row[-1] for row in rows]
+    return [' '.join(str(column) for column in row) for row in rows]
+
+
+def time_query(queryset, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        list(queryset.all())
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def drop_model_indexes():
+    """Drop the indexes declared on the models (and User.idNum) inside the current transaction."""
+    names = [index.name for model in (Work, WorkItem, Payment, Comment) for index in model._meta.indexes]
+    column = User._meta.get_field('idNum').column
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, User._meta.db_table)
+        names += [
+            name for name, info in constraints.items()
+            if info['index'] and not info['unique'] and info['columns'] == [column]
+        ]
+        for name in names:
+            cursor.execute(f'DROP INDEX IF EXISTS {connection.ops.quote_name(name)}')
+
+
+class Command(BaseCommand):
+    help = ('Print query plans and timings for the role-scoped access paths. With --compare, also '
+            'run them with the model indexes dropped (inside a rolled-back transaction) to show '
+            'the before/after difference. Run it against a seeded database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--compare', action='store_true',
+                            help='Also explain and time every path without the model indexes.')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query (median is reported).')
+        parser.add_argument('--analyze', action='store_true', help='Run ANALYZE first so the planner has stats.')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this JSON file.')
+
+    def measure(self, label, repeat):
+        return {
+            name: {'plan': explain(queryset, label), 'median_ms': time_query(queryset, repeat)}
+            for name, queryset in access_paths().items()
+        }
+
+    def handle(self, *args, **options):
+        if options['analyze']:
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        results = {'with_indexes': self.measure('with_indexes', options['repeat'])}
+        if options['compare']:
+            try:
+                with transaction.atomic():
+                    drop_model_indexes()
+                    results['without_indexes'] = self.measure('without_indexes', options['repeat'])
+                    raise Rollback
+            except Rollback:
+                pass
+
+        for name, after in results['with_indexes'].items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            before = results.get('without_indexes', {}).get(name)
+            if before:
+                self.stdout.write(f'  without indexes: {before["median_ms"]} ms')
+                for line in before['plan']:
+                    self.stdout.write(f'    {line}')
+            self.stdout.write(f'  with indexes: {after["median_ms"]} ms')
+            for line in after['plan']:
+                self.stdout.write(f'    {line}')
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fp:
+                json.dump(results, fp, indent=2)
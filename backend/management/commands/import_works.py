@@ -0,0 +1,48 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.importers import WorkImporter, ImportFormatError
+from backend.models import User
+
+
+class Command(BaseCommand):
+    help = 'Import works and bill-of-quantities items from a CSV or XLSX file (one row per item).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--manager-idnum', help='Manager for rows without a manager_idNum column.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Validate only; nothing is written.')
+        parser.add_argument('--errors', help='Write the per-row error report to this JSON file.')
+
+    def handle(self, *args, **options):
+        manager = None
+        if options['manager_idnum']:
+            manager = User.objects.filter(idNum=options['manager_idnum'],
+                                          role__in=['MANAGER', 'GENERAL_ENGINEER', 'SUPER_ADMIN']).first()
+            if manager is None:
+                raise CommandError(f'No manager with idNum {options["manager_idnum"]}.')
+
+        importer = WorkImporter(manager=manager, batch_size=options['batch_size'], dry_run=options['dry_run'])
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                result = importer.import_file(fileobj, options['path'])
+        except ImportFormatError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        report = result.as_dict()
+        for error in report['errors'][:20]:
+            self.stderr.write(f'row {error["row"]}: {error["errors"]}')
+        if options['errors']:
+            with open(options['errors'], 'w') as fp:
+                json.dump(report, fp, indent=2, ensure_ascii=False)
+
+        rate = report['rows'] / elapsed if elapsed else report['rows']
+        self.stdout.write(self.style.SUCCESS(
+            f'{report["rows"]} rows in {elapsed:.2f}s ({rate:.0f} rows/s): {report["created_works"]} works and '
+            f'{report["created_items"]} items {"validated" if options["dry_run"] else "created"}, '
+            f'{report["failed_rows"]} rows failed.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from backend.models import DeletedRecord
+from backend.sync import tombstone_retention
+
+
+class Command(BaseCommand):
+    help = ('Delete sync tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS. Clients syncing from before '
+            'that point get a full sync instead of a delta.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - tombstone_retention()
+        deleted, _ = DeletedRecord.objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} tombstones older than {cutoff:%Y-%m-%d}.'))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from backend.models import Work, WorkCostRollup
+from backend.rollups import refresh_work_rollups, find_drift, cost_report, live_cost_report
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the per-work cost rollups and the item totals on Work, and verify them against the live '
+            'item aggregation.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify-only', action='store_true',
+                            help='Only compare the stored rollups with the live aggregation.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        work_ids = list(Work.objects.order_by('pk').values_list('pk', flat=True))
+
+        if not options['verify_only']:
+            with transaction.atomic():
+                WorkCostRollup.objects.exclude(work_id__in=Work.objects.values('pk')).delete()
+                for start in range(0, len(work_ids), batch_size):
+                    refresh_work_rollups(work_ids[start:start + batch_size])
+            self.stdout.write(f'Rebuilt rollups for {len(work_ids)} works.')
+
+        drift = {}
+        for start in range(0, len(work_ids), batch_size):
+            drift.update(find_drift(Work.objects.filter(pk__in=work_ids[start:start + batch_size])))
+        for work_id, reason in sorted(drift.items()):
+            self.stdout.write(f'work {work_id}: {reason}')
+
+        stored, live = cost_report(Work.objects.all()), live_cost_report(Work.objects.all())
+        mismatched = [key for key in stored if stored[key] != live[key]]
+        for key in mismatched:
+            self.stdout.write(f'{key}: rollup {stored[key]}, live {live[key]}')
+
+        if drift or mismatched:
+            raise CommandError(f'{len(drift)} works drifted from the live aggregation; '
+                               f'run without --verify-only to rebuild.')
+        self.stdout.write(self.style.SUCCESS('Cost rollups match the live aggregation.'))
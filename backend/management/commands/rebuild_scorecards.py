@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from backend.models import Work, ContractorScorecard
+from backend.scorecards import refresh_scorecards, find_drift
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the contractor scorecards from the works, and verify them against the live aggregation.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify-only', action='store_true',
+                            help='Only compare the stored scorecards with the live aggregation.')
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            with transaction.atomic():
+                contractor_ids = set(Work.objects.values_list('contractor_id', flat=True).distinct())
+                # Scorecards of contractors without works are dropped by the refresh
+                orphaned = set(ContractorScorecard.objects.exclude(pk__in=contractor_ids).values_list('pk', flat=True))
+                count = refresh_scorecards(contractor_ids | orphaned, rerank=True)
+            self.stdout.write(f'Rebuilt scorecards for {len(contractor_ids)} contractors ({count} rewritten).')
+
+        drift = find_drift()
+        for contractor_id, reason in sorted(drift.items()):
+            self.stdout.write(f'contractor {contractor_id}: {reason}')
+        if drift:
+            raise CommandError(f'{len(drift)} scorecards drifted from the live aggregation; '
+                               f'run without --verify-only to rebuild.')
+        self.stdout.write(self.style.SUCCESS('Scorecards match the live aggregation.'))
@@ -0,0 +1,76 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from backend import job_worker
+from backend.jobs import claim_job, requeue_stale, prune_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = ('Run queued report/export jobs in a pool of worker processes. The job table is the queue; '
+            'no broker is needed, and several workers can share it.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Size of the process pool.')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait for new jobs when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty.')
+        parser.add_argument('--inline', action='store_true',
+                            help='Run jobs in this process instead of a pool (for debugging).')
+        parser.add_argument('--stale-after', type=int, default=3600,
+                            help='Requeue jobs that have been RUNNING for this many seconds at startup.')
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale(timedelta(seconds=options['stale_after']))
+        pruned = prune_jobs(timedelta(days=getattr(settings, 'JOB_RETENTION_DAYS', 7)))
+        if requeued or pruned:
+            self.stdout.write(f'Requeued {requeued} stale jobs, pruned {pruned} old jobs.')
+
+        try:
+            if options['inline']:
+                self.run_inline(options)
+            else:
+                self.run_pool(options)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping.')
+
+    def run_inline(self, options):
+        while True:
+            job_id = claim_job()
+            if job_id is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+            run_job(job_id)
+            self.stdout.write(f'Job {job_id} finished.')
+
+    def run_pool(self, options):
+        # Connections must not be shared with the children
+        connections.close_all()
+        workers = max(1, options['workers'])
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=job_worker.setup)
+        with pool:
+            running = set()
+            while True:
+                while len(running) < workers:
+                    job_id = claim_job()
+                    if job_id is None:
+                        break
+                    running.add(pool.submit(job_worker.run, job_id))
+
+                if not running:
+                    if options['once']:
+                        return
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, running = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.stdout.write(f'Job {future.result()} finished.')
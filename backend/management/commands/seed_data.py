@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend.seeding import Scale, seed, clear_seed_data, SEED_PASSWORD
+
+
+def add_scale_arguments(parser):
+    defaults = Scale()
+    parser.add_argument('--works', type=int, default=defaults.works)
+    parser.add_argument('--items-per-work', type=int, default=defaults.items_per_work)
+    parser.add_argument('--payments-per-work', type=int, default=defaults.payments_per_work)
+    parser.add_argument('--comments-per-work', type=int, default=defaults.comments_per_work)
+    parser.add_argument('--contractors', type=int, default=defaults.contractors)
+    parser.add_argument('--managers', type=int, default=defaults.managers)
+    parser.add_argument('--facilities', type=int, default=defaults.facilities)
+    parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data.')
+
+
+def scale_from_options(options):
+    return Scale(
+        works=options['works'],
+        items_per_work=options['items_per_work'],
+        payments_per_work=options['payments_per_work'],
+        comments_per_work=options['comments_per_work'],
+        contractors=options['contractors'],
+        managers=options['managers'],
+        facilities=options['facilities'],
+    )
+
+
+class Command(BaseCommand):
+    help = 'Insert a deterministic synthetic dataset (users by role, facilities, works, items, payments, comments).'
+
+    def add_arguments(self, parser):
+        add_scale_arguments(parser)
+        parser.add_argument('--clear', action='store_true', help='Delete previously seeded rows first.')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            clear_seed_data()
+        scale = scale_from_options(options)
+        started = time.perf_counter()
+        users = seed(scale, seed=options['seed'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {scale.works} works with {scale.works * scale.items_per_work} items in {elapsed:.1f}s.'))
+        for role, members in users.items():
+            self.stdout.write(f'  {role}: {members[0].email} (password: {SEED_PASSWORD})')
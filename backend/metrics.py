@@ -0,0 +1,114 @@
+import threading
+from bisect import bisect_left
+
+# Upper bounds of the histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last slot is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip((*self.bounds, '+Inf'), self.counts):
+            total += count
+            yield bound, total
+
+
+class RouteMetrics:
+    __slots__ = ('duration', 'db_duration', 'queries', 'duplicate_queries', 'responses')
+
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.db_duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.duplicate_queries = 0
+        self.responses = {}
+
+
+class MetricsRegistry:
+    """
+    In-process aggregates per (route, method). Routes are URL pattern names, not
+    raw paths, so the number of series stays bounded.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, route, method, status_code, duration, db_duration, queries, duplicate_queries):
+        key = (route, method)
+        with self._lock:
+            metrics = self._routes.get(key)
+            if metrics is None:
+                metrics = self._routes[key] = RouteMetrics()
+            metrics.duration.observe(duration)
+            metrics.db_duration.observe(db_duration)
+            metrics.queries.observe(queries)
+            metrics.duplicate_queries += duplicate_queries
+            status_class = f'{status_code // 100}xx'
+            metrics.responses[status_class] = metrics.responses.get(status_class, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._routes = {}
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = []
+            self._render_histogram(lines, routes, 'duration', 'http_request_duration_seconds',
+                                   'Wall time per request.')
+            self._render_histogram(lines, routes, 'db_duration', 'http_request_db_duration_seconds',
+                                   'Time spent executing SQL per request.')
+            self._render_histogram(lines, routes, 'queries', 'http_request_queries',
+                                   'SQL statements issued per request.')
+
+            lines.append('# HELP http_request_duplicate_queries_total SQL statements repeated within a request.')
+            lines.append('# TYPE http_request_duplicate_queries_total counter')
+            for (route, method), metrics in routes:
+                lines.append(f'http_request_duplicate_queries_total{_labels(route, method)} '
+                             f'{metrics.duplicate_queries}')
+
+            lines.append('# HELP http_responses_total Responses by status class.')
+            lines.append('# TYPE http_responses_total counter')
+            for (route, method), metrics in routes:
+                for status_class, count in sorted(metrics.responses.items()):
+                    lines.append(f'http_responses_total{_labels(route, method, status=status_class)} {count}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histogram(lines, routes, attr, name, help_text):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (route, method), metrics in routes:
+            histogram = getattr(metrics, attr)
+            for bound, total in histogram.cumulative():
+                lines.append(f'{name}_bucket{_labels(route, method, le=bound)} {total}')
+            lines.append(f'{name}_sum{_labels(route, method)} {round(histogram.sum, 6)}')
+            lines.append(f'{name}_count{_labels(route, method)} {histogram.count}')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(route, method, **extra):
+    labels = {'route': route, 'method': method, **extra}
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+registry = MetricsRegistry()
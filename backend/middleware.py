@@ -0,0 +1,125 @@
+import contextvars
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .metrics import registry
+
+slow_request_logger = logging.getLogger('backend.slow_requests')
+
+# The recorder of the request being served. A context variable rather than a
+# per-connection wrapper so queries are attributed correctly under ASGI, where
+# the async ORM runs them on a different thread (and connection) than the middleware.
+current_recorder = contextvars.ContextVar('current_recorder', default=None)
+
+
+class QueryRecorder:
+    """connection.execute_wrapper hook that counts and times the SQL of one request."""
+
+    def __init__(self, keep_sql=False):
+        self.keep_sql = keep_sql
+        self.count = 0
+        self.duration = 0.0
+        self.statements = {}
+        self.log = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            self.statements[sql] = self.statements.get(sql, 0) + 1
+            if self.keep_sql:
+                self.log.append((elapsed, sql, params))
+
+    @property
+    def duplicates(self):
+        return self.count - len(self.statements)
+
+
+def record_queries(execute, sql, params, many, context):
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_queries)
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route or 'unmatched'
+
+
+class RequestMetricsMiddleware:
+    """
+    Records wall time, SQL time, query count and repeated statements per route and
+    method into backend.metrics.registry (served by MetricsView). Requests slower
+    than SLOW_REQUEST_THRESHOLD_MS are logged to ``backend.slow_requests`` with
+    their SQL.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', None)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder(keep_sql=self.slow_threshold is not None)
+        token = current_recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        self.record(request, response, time.perf_counter() - started, recorder)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder(keep_sql=self.slow_threshold is not None)
+        token = current_recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        self.record(request, response, time.perf_counter() - started, recorder)
+        return response
+
+    def record(self, request, response, duration, recorder):
+        route = route_name(request)
+        registry.record(route, request.method, response.status_code, duration, recorder.duration,
+                        recorder.count, recorder.duplicates)
+
+        if self.slow_threshold is not None and duration * 1000 >= self.slow_threshold:
+            self.log_slow_request(request, route, duration, recorder)
+
+    @staticmethod
+    def log_slow_request(request, route, duration, recorder):
+        slowest = sorted(recorder.log, key=lambda entry: entry[0], reverse=True)[:10]
+        statements = '\n'.join(f'  {elapsed * 1000:.1f} ms: {sql} {params!r}' for elapsed, sql, params in slowest)
+        slow_request_logger.warning(
+            'Slow request %s %s (%s): %.1f ms, %d queries (%d repeated), %.1f ms in SQL\n%s',
+            request.method, request.get_full_path(), route, duration * 1000, recorder.count,
+            recorder.duplicates, recorder.duration * 1000, statements,
+        )
+
@@ -24,13 +24,21 @@ class User(AbstractUser):
     # Override first_name and last_name to make them required:
     first_name = models.CharField(max_length=150)
     last_name = models.CharField(max_length=150)
-    idNum = models.CharField(max_length=150)
+    idNum = models.CharField(max_length=150, db_index=True)  # Contractor scoping joins on it
 
     # manager = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL)
 
     def __str__(self):
         return self.username  # Or self.email if you use email as the primary identifier
 
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # Reading one deferred field loads them all: request.user comes with only a few
+        # columns (authentication.CachedJWTAuthentication), and then needs one query, not one per field
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = deferred
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
 
 # class ContractorRating(models.Model):
 #     contractor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ratings')
@@ -46,6 +54,8 @@ class Facility(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField()
     facility_number = models.IntegerField(unique=True)
+    # Null for rows that predate the column; used for conditional GETs
+    updated_at = models.DateTimeField(auto_now=True, null=True)
 
 
 class Work(models.Model):
@@ -90,6 +100,49 @@ class Work(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Totals over the work's items, maintained by rollups.refresh_work_rollups whenever
+    # items change (signals, WorkSerializer, bulk paths); repair with rebuild_cost_rollups.
+    contract_total = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)
+    actual_total = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)
+    # Sum of the items' total_section_cost (actual_amount * unit_cost)
+    total_cost = models.DecimalField(max_digits=18, decimal_places=4, default=0, editable=False)
+    item_count = models.IntegerField(default=0, editable=False)
+    # {item status: count}, statuses without items left out
+    item_status_counts = models.JSONField(default=dict, editable=False)
+
+    ITEM_TOTAL_FIELDS = ('contract_total', 'actual_total', 'total_cost', 'item_count', 'item_status_counts')
+    # The columns ContractorScorecard is computed from (besides the item totals)
+    SCORECARD_FIELDS = ('contractor_id', 'quality_score', 'time_score', 'cost_score', 'end_date', 'due_end_date')
+
+    class Meta:
+        # Access paths of the role-scoped list/report queries and the keyset pagination orderings
+        indexes = [
+            models.Index(fields=['contractor', 'status'], name='work_contractor_status_idx'),
+            models.Index(fields=['manager', 'status'], name='work_manager_status_idx'),
+            models.Index(fields=['status', 'due_end_date'], name='work_status_due_idx'),
+            models.Index(fields=['start_date', 'id'], name='work_start_date_idx'),
+            models.Index(fields=['updated_at', 'id'], name='work_updated_at_idx'),
+            models.Index(fields=['contract_total', 'id'], name='work_contract_total_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The scorecard inputs as loaded, so a save can tell whether the contractor's scorecard
+        # (and, on a reassignment, the previous contractor's) needs a refresh
+        instance._loaded_scorecard_values = {name: instance.__dict__.get(name) for name in cls.SCORECARD_FIELDS}
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The item totals are written by refresh_work_rollups only; a plain save of an
+        # instance loaded earlier must not put back the totals it was loaded with.
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.ITEM_TOTAL_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     @property
     def average_score(self):
         scores = [self.quality_score, self.time_score, self.cost_score]
@@ -132,6 +185,21 @@ class WorkItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['work', 'status'], name='workitem_work_status_idx'),
+            models.Index(fields=['status'], name='workitem_status_idx'),
+            models.Index(fields=['updated_at', 'id'], name='workitem_updated_at_idx'),
+            models.Index(fields=['created_at', 'id'], name='workitem_created_at_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The work as loaded, so a save moving the item can refresh the work it left too
+        instance._loaded_work_id = instance.__dict__.get('work_id')
+        return instance
+
     @property
     def total_section_cost(self):
         return self.actual_amount * self.unit_cost
@@ -151,6 +219,15 @@ class Payment(models.Model):
     approval_manager = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='approved_payments', null=True,
                                          blank=True)
     payment_terms = models.TextField(blank=True, null=True)
+    # Null for rows that predate the column; read by the sync endpoint
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['work', 'payment_date'], name='payment_work_date_idx'),
+            models.Index(fields=['payment_date', 'id'], name='payment_date_idx'),
+            models.Index(fields=['updated_at'], name='payment_updated_at_idx'),
+        ]
 
     def __str__(self):
         return f"Payment for Work: {self.work.work_number}, Amount: {self.amount_paid}"
@@ -165,3 +242,153 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['work', 'created_at'], name='comment_work_created_idx'),
+            models.Index(fields=['updated_at'], name='comment_updated_at_idx'),
+        ]
+
+
+class WorkCostRollup(models.Model):
+    """
+    Precomputed item totals per work, read by the cost report.
+
+    Kept current by the signal receivers in backend/signals.py; rebuild with
+    ``manage.py rebuild_cost_rollups``. Status, facility and contractor are copied
+    from the work so the report can filter and group without touching items.
+    """
+    work = models.OneToOneField(Work, on_delete=models.CASCADE, primary_key=True, related_name='cost_rollup')
+    status = models.CharField(max_length=30, choices=Work.STATUS_CHOICES)
+    facility = models.ForeignKey(Facility, on_delete=models.CASCADE, related_name='+')
+    contractor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+
+    contract_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    actual_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Sum of (actual - contract) over items that went over their contract amount
+    overrun_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Sum of (contract - actual) over items still under their contract amount
+    free_budget = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class DeletedRecord(models.Model):
+    """
+    Tombstone for a deleted work, item, payment or comment, so the sync endpoint
+    can tell clients what to drop. Written by the post_delete receivers in
+    backend/signals.py. The work's contractor and manager are copied at delete
+    time so tombstones can be scoped like works (see policies.WORKS)
+    after the work itself is gone; they are not real constraints.
+    """
+    KIND_CHOICES = (
+        ('work', 'Work'),
+        ('item', 'Work item'),
+        ('payment', 'Payment'),
+        ('comment', 'Comment'),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    work_id = models.BigIntegerField()
+    contractor = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True,
+                                   related_name='+')
+    manager = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True,
+                                related_name='+')
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at'], name='deletedrecord_deleted_at_idx'),
+        ]
+
+
+class Job(models.Model):
+    """
+    A report or export computed by the ``run_jobs`` worker instead of inside the
+    request. ``params`` holds the query parameters as {name: [values]};
+    ``params_hash`` identifies kind, parameters and the works the user can see,
+    so finished results can be reused by identical requests (see backend/jobs.py).
+    """
+    KIND_CHOICES = (
+        ('report', 'Report'),
+        ('export_works', 'Works export'),
+        ('export_payments', 'Payments export'),
+    )
+    STATUS_CHOICES = (
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict)
+    params_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    # Served from an earlier job's result instead of being computed
+    cached = models.BooleanField(default=False)
+    result = models.FileField(upload_to='jobs/', blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='job_status_created_idx'),
+            models.Index(fields=['params_hash', 'status', 'finished_at'], name='job_params_hash_idx'),
+        ]
+
+
+class ContractorScorecard(models.Model):
+    """
+    Per-contractor statistics over all of the contractor's works, read by the
+    contractors/contractorsWorst reports and /scorecards/. Refreshed by
+    backend/scorecards.py when a work's scores, dates, contractor or item totals
+    change; rebuild with ``manage.py rebuild_scorecards``.
+
+    Scores follow Work.average_score: a work's score is the mean of the scores
+    it has, and works without any score are left out of the averages.
+    """
+    contractor = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='scorecard')
+    work_count = models.IntegerField(default=0)
+    scored_count = models.IntegerField(default=0)
+    avg_quality = models.FloatField(null=True)
+    avg_time = models.FloatField(null=True)
+    avg_cost = models.FloatField(null=True)
+    overall_avg = models.FloatField(null=True)
+    # Mean work score over the contractor's most recent scored works (scorecards.ROLLING_WINDOW)
+    rolling_avg = models.FloatField(null=True)
+    finished_count = models.IntegerField(default=0)
+    # Finished works with end_date <= due_end_date, over finished works
+    on_time_ratio = models.FloatField(null=True)
+    # Works whose items' actual total exceeds the contract total, over works with items
+    overrun_ratio = models.FloatField(null=True)
+    # Share of scored contractors with a lower overall_avg, 0-100
+    percentile_rank = models.FloatField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['overall_avg'], name='scorecard_overall_avg_idx'),
+        ]
+
+
+class ContractorScorecardSnapshot(models.Model):
+    """The scorecard as of its last change on ``date``: one row per contractor and day it changed."""
+    contractor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='scorecard_history')
+    date = models.DateField()
+    work_count = models.IntegerField()
+    overall_avg = models.FloatField(null=True)
+    rolling_avg = models.FloatField(null=True)
+    on_time_ratio = models.FloatField(null=True)
+    overrun_ratio = models.FloatField(null=True)
+    percentile_rank = models.FloatField(null=True)
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['contractor', 'date'], name='scorecard_snapshot_unique_day'),
+        ]
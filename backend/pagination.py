@@ -0,0 +1,208 @@
+import base64
+import binascii
+import datetime
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination ordered on ``(<sort field>, id)``.
+
+    Each page is fetched with ``WHERE (field, id) < (last_field, last_id)`` instead
+    of an OFFSET, so deep pages cost the same as the first one and rows inserted
+    while paging never shift the cursor.
+
+    The mode is opt-in per request (``?page_size=`` or ``?cursor=``) so existing
+    clients keep receiving a plain list. A plain list still stops after
+    ``KEYSET_UNPAGINATED_LIMIT`` rows (in the same order); a truncated one
+    carries a ``Link: <...>; rel="next"`` header to the paginated rest. Set
+    ``KEYSET_PAGINATION_REQUIRED = True`` to paginate every list request.
+    """
+    page_size = 50
+    max_page_size = 200
+    max_unpaginated_size = 1000
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    count_query_param = 'count'
+
+    # Sort fields clients may pick with ?ordering=; the id is always the tie-breaker.
+    ordering_fields = ('updated_at',)
+    default_ordering = '-updated_at'
+
+    invalid_cursor_message = 'Invalid cursor'
+
+    def is_requested(self, request):
+        if getattr(settings, 'KEYSET_PAGINATION_REQUIRED', False):
+            return True
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_unpaginated_size(self):
+        return getattr(settings, 'KEYSET_UNPAGINATED_LIMIT', self.max_unpaginated_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """One page, or a plain list of at most get_unpaginated_size() rows; never None."""
+        page_queryset = self.get_page_queryset(queryset, request)
+        self.count = queryset.count() if self.paginated and self.get_include_count(request) else None
+        return self.set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() with the async ORM, for backend/async_views.py."""
+        page_queryset = self.get_page_queryset(queryset, request)
+        self.count = await queryset.acount() if self.paginated and self.get_include_count(request) else None
+        return self.set_page([obj async for obj in page_queryset])
+
+    def get_page_queryset(self, queryset, request):
+        """The queryset of one page (plus one row to detect a following page)."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.paginated = self.is_requested(request)
+        self.page_size = self.get_page_size(request) if self.paginated else self.get_unpaginated_size()
+        self.field, self.descending = self.get_ordering(request)
+        self.model_field = queryset.model._meta.get_field(self.field)
+
+        self.reverse, position = self.decode_cursor(request)
+        self.has_position = position is not None
+        descending = self.descending != self.reverse
+        if position is not None:
+            value, pk = position
+            op = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{op}': value}) | Q(**{self.field: value, f'pk__{op}': pk})
+            )
+        prefix = '-' if descending else ''
+        return queryset.order_by(f'{prefix}{self.field}', f'{prefix}pk')[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+            self.has_next = self.has_position
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.has_position
+
+        self.page = results
+        return results
+
+    def get_paginated_data(self, data):
+        if not self.paginated:
+            return data
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'count': self.count,
+            'results': data,
+        }
+
+    def get_headers(self):
+        """The Link header of a truncated plain list."""
+        next_link = None if self.paginated else self.get_next_link()
+        return {'Link': f'<{next_link}>; rel="next"'} if next_link else {}
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data), headers=self.get_headers())
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {'type': 'integer', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(self.ordering_query_param) or self.default_ordering
+        field = ordering.lstrip('-')
+        if field not in self.ordering_fields:
+            ordering = self.default_ordering
+            field = ordering.lstrip('-')
+        return field, ordering.startswith('-')
+
+    def get_include_count(self, request):
+        value = request.query_params.get(self.count_query_param, 'true')
+        return value.lower() not in ('0', 'false', 'no', 'off')
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(reverse=False, obj=self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(reverse=True, obj=self.page[0])
+
+    def encode_cursor(self, reverse, obj):
+        # Pages are model instances, or values() rows on the fast list paths
+        if isinstance(obj, dict):
+            value, pk = obj[self.model_field.attname], obj['id']
+        else:
+            value, pk = getattr(obj, self.model_field.attname), obj.pk
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        payload = {'f': self.field, 'd': self.descending, 'r': reverse, 'p': [value, pk]}
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        url = replace_query_param(self.base_url, self.cursor_query_param, encoded)
+        return replace_query_param(url, self.page_size_query_param, min(self.page_size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            value, pk = payload['p']
+            reverse = bool(payload['r'])
+            # A cursor is only meaningful for the ordering it was issued with.
+            if payload['f'] != self.field or bool(payload['d']) != self.descending:
+                raise ValueError
+            return reverse, (self.model_field.to_python(value), int(pk))
+        except (TypeError, ValueError, KeyError, ValidationError, binascii.Error, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class WorkPagination(KeysetPagination):
+    ordering_fields = ('updated_at', 'start_date', 'contract_total')
+    default_ordering = '-updated_at'
+
+
+class WorkItemPagination(KeysetPagination):
+    ordering_fields = ('updated_at', 'created_at')
+    default_ordering = '-updated_at'
+
+
+class PaymentPagination(KeysetPagination):
+    ordering_fields = ('payment_date',)
+    default_ordering = '-payment_date'
+
+
+class CommentPagination(KeysetPagination):
+    ordering_fields = ('created_at',)
+    default_ordering = 'created_at'
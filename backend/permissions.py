@@ -1,20 +1,48 @@
-from rest_framework.permissions import BasePermission
+from rest_framework.permissions import BasePermission, SAFE_METHODS
 
+from .policies import CONTRACTOR_ROLES, FULL_ACCESS_ROLES, WORKS
 
-class ContractorPermission(BasePermission):
+
+class PolicyPermission(BasePermission):
     """
-    Custom permission to allow CONTRACTORs to only view and edit their work items.
+    Enforces the view's policy (policies.PolicyMixin): whether the role may
+    create, and for writes whether it may delete / change the object. The write
+    scope comes with the object from PolicyMixin.get_object(), so checking it
+    loads no relation.
     """
 
     def has_permission(self, request, view):
-        user = request.user
-        if user.is_authenticated and user.role == 'CONTRACTOR' and request.method == 'POST':
-            return False  # Prevent CONTRACTOR from adding new work items
+        if view.action == 'create':
+            return view.policy.create
         return True
 
     def has_object_permission(self, request, view, obj):
+        if request.method in SAFE_METHODS:
+            return True
+        if request.method == 'DELETE' and not view.policy.delete:
+            return False
+        return view.policy.can_write(obj)
+
+
+class IsSuperAdmin(BasePermission):
+    """
+    Allows access only to SUPER_ADMIN users and Django superusers.
+    """
+
+    def has_permission(self, request, view):
         user = request.user
-        if user.role == 'CONTRACTOR':
-            # CONTRACTOR can only access their own work items
-            return obj.work.contractor == user
-        return True
+        return bool(user and user.is_authenticated and (user.is_superuser or user.role == 'SUPER_ADMIN'))
+
+
+def scope_works(user, queryset):
+    """Restrict a Work queryset (or one with the same contractor / manager fields) to what ``user`` may see."""
+    return WORKS.compile(user).scope(queryset)
+
+
+def scope_key(user):
+    """Identifies the set of works ``user`` sees: users with the same key see the same works."""
+    if user.role in FULL_ACCESS_ROLES:
+        return 'all'
+    if user.role in CONTRACTOR_ROLES:
+        return f'contractor:{user.idNum}'
+    return f'user:{user.pk}'
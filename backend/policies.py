@@ -0,0 +1,213 @@
+"""
+Who may read and change what, by role. Each resource (works, work items,
+payments, scorecards) declares its rules per role once; for a user they compile
+to Q objects, so the read scope is a WHERE clause on the queryset and the write
+scope is evaluated by the same query that fetches the object (PolicyMixin), with
+no relation loaded in Python. Updates are further limited to a per-role
+allow-list of fields and values, and to the statuses the role may set.
+"""
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.generics import get_object_or_404
+from rest_framework.permissions import SAFE_METHODS
+
+from .models import User
+
+ALL = None
+CONTRACTOR_ROLES = ('CONTRACTOR', 'CONTRACTOR_VIEWER')
+# Roles that see every work (PAYMENT_ADMIN may only mark them paid)
+FULL_ACCESS_ROLES = ('GENERAL_ENGINEER', 'SUPER_ADMIN', 'PAYMENT_ADMIN')
+WRITABLE = '_policy_writable'
+
+
+# Scopes: ``user``'s rows of a resource as a Q; ``prefix`` leads from the
+# resource to its work ('' for works, 'work__' for items and payments).
+
+def everything(user, prefix):
+    return Q()
+
+
+def nothing(user, prefix):
+    return Q(pk__in=[])
+
+
+def company_works(user, prefix):
+    # Every account sharing the user's idNum (a contractor and its viewers): a
+    # subquery on the indexed idNum rather than a join to the users table
+    return Q(**{f'{prefix}contractor__in': User.objects.filter(idNum=user.idNum).values('pk')})
+
+
+def own_works(user, prefix):
+    return Q(**{f'{prefix}contractor': user})
+
+
+def managed_works(user, prefix):
+    return Q(**{f'{prefix}manager': user})
+
+
+class Rules:
+    """
+    One role's rights on a resource: the ``read`` and ``write`` scopes (write
+    defaults to read and is only checked on readable rows), whether it may
+    ``create`` and ``delete``, the custom detail ``actions`` it may run,
+    ``fields``, the update allow-list: {field: allowed values or ALL}, or ALL,
+    and the ``statuses`` it may set (the 'chosable' status choices, also what
+    the bulk status endpoints accept).
+    """
+
+    def __init__(self, read=nothing, write=None, create=False, delete=False, actions=(), fields=ALL, statuses=()):
+        self.read = read
+        self.write = read if write is None else write
+        self.create = create
+        self.delete = delete
+        self.actions = frozenset(actions)
+        self.fields = fields
+        self.statuses = statuses if statuses is ALL else frozenset(statuses)
+
+
+class Policy:
+    """A role's Rules compiled for one user."""
+
+    def __init__(self, rules, user, prefix):
+        self.rules = rules
+        self.read = rules.read(user, prefix)
+        self.write = rules.write(user, prefix)
+        self.create = rules.create
+        self.delete = rules.delete
+        self.actions = rules.actions
+        self.fields = rules.fields
+        # Superusers may set any status, whatever their role
+        self.statuses = ALL if getattr(user, 'is_superuser', False) else rules.statuses
+
+    @property
+    def writes(self):
+        """False when the role may change nothing at all."""
+        return self.rules.write is not nothing
+
+    def may_set_status(self, status):
+        return self.statuses is ALL or status in self.statuses
+
+    def scope(self, queryset):
+        return queryset.filter(self.read)
+
+    def writable(self, queryset):
+        """The rows of ``queryset`` the user may change."""
+        return queryset.filter(self.read).filter(self.write)
+
+    def annotate_writable(self, queryset):
+        """``queryset`` computing, per row, whether the user may write it (read by can_write())."""
+        if self.rules.write in (everything, nothing) or self.rules.write is self.rules.read:
+            return queryset
+        return queryset.annotate(**{WRITABLE: ExpressionWrapper(self.write, output_field=BooleanField())})
+
+    def can_write(self, obj):
+        """Whether the user may change ``obj``, one of their readable rows."""
+        if self.rules.write is nothing:
+            return False
+        if self.rules.write is everything or self.rules.write is self.rules.read:
+            return True
+        if not hasattr(obj, WRITABLE):
+            # Not fetched through annotate_writable()
+            setattr(obj, WRITABLE, type(obj)._default_manager.filter(self.write, pk=obj.pk).exists())
+        return bool(getattr(obj, WRITABLE))
+
+    def check_fields(self, data, role, instance=None):
+        """
+        Raise PermissionDenied if ``data`` (validated update data of ``instance``)
+        leaves the field allow-list or changes the status to one the role may not
+        set, the rule the bulk status endpoints apply too.
+        """
+        status = data.get('status')
+        if status is not None and status != getattr(instance, 'status', None) and not self.may_set_status(status):
+            allowed = ' or '.join(repr(choice) for choice in sorted(self.statuses)) or 'no status'
+            raise PermissionDenied(f'{role} can only set status to {allowed}.')
+        if self.fields is ALL:
+            return
+        for name, value in data.items():
+            if name not in self.fields or (self.fields[name] is not ALL and value not in self.fields[name]):
+                allowed = ', '.join(
+                    f"{field} to {' or '.join(repr(choice) for choice in sorted(values))}" if values else field
+                    for field, values in self.fields.items()
+                )
+                raise PermissionDenied(f'{role} can only update {allowed}.')
+
+
+class Resource:
+    """The Rules of every role for one model; roles not listed get none."""
+
+    def __init__(self, prefix, rules):
+        self.prefix = prefix
+        self.rules = rules
+
+    def compile(self, user, prefix=None):
+        """The user's Policy; ``prefix`` overrides the path to the work, e.g. '' to scope works themselves."""
+        return Policy(self.rules.get(getattr(user, 'role', None), Rules()), user,
+                      self.prefix if prefix is None else prefix)
+
+
+PAYMENT_STATUSES = ('WAITING_PAYMENT', 'PAID')
+
+WORKS = Resource('', {
+    'CONTRACTOR': Rules(read=company_works, write=own_works, actions={'complete_work'},
+                        statuses={'PENDING', 'IN_PROGRESS'}),
+    'CONTRACTOR_VIEWER': Rules(read=company_works, write=nothing),
+    'MANAGER': Rules(read=managed_works, create=True, delete=True, actions={'approve_work'},
+                     statuses={'PENDING', 'IN_PROGRESS'}),
+    'GENERAL_ENGINEER': Rules(read=everything, create=True, delete=True, actions={'approve_work'}, statuses=ALL),
+    'SUPER_ADMIN': Rules(read=everything, create=True, delete=True),
+    'PAYMENT_ADMIN': Rules(read=everything, actions={'change_payment_status'}, fields={'status': {'PAID'}},
+                           statuses=PAYMENT_STATUSES),
+})
+
+WORK_ITEMS = Resource('work__', {
+    'CONTRACTOR': Rules(read=company_works, write=own_works, delete=True,
+                        statuses={'IN_PROGRESS', 'COMPLETED_BY_CONTRACTOR'}),
+    'CONTRACTOR_VIEWER': Rules(read=company_works, write=nothing),
+    'MANAGER': Rules(read=managed_works, create=True, delete=True,
+                     statuses={'PENDING', 'IN_PROGRESS', 'COMPLETED_BY_CONTRACTOR', 'QUALITY_CONTROL', 'COMPLETED'}),
+    'GENERAL_ENGINEER': Rules(read=everything, create=True, delete=True, statuses=ALL),
+    'SUPER_ADMIN': Rules(read=everything, create=True, delete=True),
+    'PAYMENT_ADMIN': Rules(read=everything, create=True, delete=True, statuses=PAYMENT_STATUSES),
+})
+
+PAYMENTS = Resource('work__', {
+    'CONTRACTOR': Rules(read=company_works, write=nothing),
+    'CONTRACTOR_VIEWER': Rules(read=company_works, write=nothing),
+    'MANAGER': Rules(read=managed_works, create=True, delete=True),
+    'GENERAL_ENGINEER': Rules(read=everything, create=True, delete=True),
+    'SUPER_ADMIN': Rules(read=everything, create=True, delete=True),
+    'PAYMENT_ADMIN': Rules(read=everything, create=True, delete=True),
+})
+
+# Scorecards hang off the contractor directly; managers have none
+SCORECARDS = Resource('', {
+    'CONTRACTOR': Rules(read=company_works, write=nothing),
+    'CONTRACTOR_VIEWER': Rules(read=company_works, write=nothing),
+    **{role: Rules(read=everything, write=nothing) for role in FULL_ACCESS_ROLES},
+})
+
+
+class PolicyMixin:
+    """
+    ViewSet mixin for a policy ``resource``: ``self.policy`` is its Policy for
+    the request user, and get_object() fetches the object once per request,
+    together with whether the user may write it when the request is a write.
+    get_queryset() should apply ``self.policy.scope()`` (or an equivalent).
+    """
+    resource = None
+
+    @cached_property
+    def policy(self):
+        return self.resource.compile(self.request.user)
+
+    def get_object(self):
+        if not hasattr(self, '_object'):
+            queryset = self.filter_queryset(self.get_queryset())
+            if self.request.method not in SAFE_METHODS:
+                queryset = self.policy.annotate_writable(queryset)
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            obj = get_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            self.check_object_permissions(self.request, obj)
+            self._object = obj
+        return self._object
@@ -0,0 +1,124 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+from .filters import filter_works
+from .models import Work
+from .permissions import scope_works
+
+
+class QueryPlan:
+    """
+    The select_related / prefetch_related / only() set a serializer needs.
+
+    ``columns`` is None when some field reads an attribute we can't map to a
+    column (a property without a ``Meta.source_fields`` entry); in that case the
+    plan still joins and prefetches but loads every column.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.select = set()
+        self.columns = set()
+        self.prefetch = {}
+
+    def add_path(self, attrs):
+        """Resolve a list of attribute names (a DRF ``source_attrs``) against the model."""
+        model = self.model
+        prefix = []
+        for index, attr in enumerate(attrs):
+            if attr.startswith('get_') and attr.endswith('_display'):
+                attr = attr[len('get_'):-len('_display')]
+            try:
+                field = model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                if prefix:
+                    # Property on a related model: load the whole related row.
+                    self.select.add('__'.join(prefix))
+                    self.add_column('__'.join(prefix))
+                else:
+                    self.columns = None
+                return
+            if field.many_to_many or field.one_to_many:
+                return
+            prefix.append(attr)
+            last = index == len(attrs) - 1
+            if field.is_relation and not last:
+                self.select.add('__'.join(prefix))
+                model = field.related_model
+                continue
+            self.add_column('__'.join(prefix))
+            return
+
+    def add_column(self, path):
+        if self.columns is not None:
+            self.columns.add(path)
+
+    def apply(self, queryset):
+        if self.select:
+            queryset = queryset.select_related(*sorted(self.select))
+        for name, (child_plan, related_name) in sorted(self.prefetch.items()):
+            # In primary key order, so nested lists come out the same on every read path
+            child_queryset = child_plan.apply(child_plan.model._default_manager.order_by('pk'))
+            if child_plan.columns is not None:
+                # The reverse foreign key is needed to attach rows to their parent.
+                child_queryset = child_queryset.only(*sorted(child_plan.columns | {related_name}))
+            queryset = queryset.prefetch_related(Prefetch(name, queryset=child_queryset))
+        if self.columns is not None:
+            queryset = queryset.only(*sorted(self.columns))
+        return queryset
+
+
+@lru_cache(maxsize=None)
+def get_query_plan(serializer_class, extra_paths=(), fields=None):
+    serializer = serializer_class()
+    plan = QueryPlan(serializer.Meta.model)
+    source_fields = getattr(serializer.Meta, 'source_fields', {})
+
+    for name, field in serializer.fields.items():
+        if getattr(field, 'write_only', False) or (fields is not None and name not in fields):
+            continue
+        if name in source_fields:
+            for path in source_fields[name]:
+                plan.add_path(path.split('__'))
+            continue
+        if isinstance(field, serializers.ListSerializer):
+            relation = plan.model._meta.get_field(field.source)
+            child_plan = get_query_plan(type(field.child))
+            plan.prefetch[field.source] = (child_plan, relation.field.name)
+            continue
+        if isinstance(field, serializers.SerializerMethodField):
+            # Nothing to introspect; declare what it reads in Meta.source_fields.
+            plan.columns = None
+            continue
+        if field.source == '*':
+            continue
+        plan.add_path(field.source_attrs or field.source.split('.'))
+
+    for path in extra_paths:
+        plan.add_path(path.split('__'))
+    return plan
+
+
+def optimize_queryset(queryset, serializer_class, extra_paths=(), fields=None):
+    """
+    Add the joins, prefetches and column list ``serializer_class`` needs so that
+    serializing the queryset costs a fixed number of queries.
+
+    ``extra_paths`` lists ORM paths read outside the serializer, e.g. by a
+    permission class (``'work__contractor'``). ``fields`` limits the plan to the
+    serializer fields rendered (fieldsets.requested_fields()).
+    """
+    return get_query_plan(serializer_class, tuple(extra_paths), fields).apply(queryset)
+
+
+def visible_works(user, serializer_class, fields=None):
+    """The works ``user`` may see, prepared for serializer_class (and ``fields`` of it)."""
+    return scope_works(user, optimize_queryset(Work.objects.all(), serializer_class, fields=fields))
+
+
+def work_queryset(user, params, serializer_class, fields=None):
+    """visible_works() filtered by the filters.WorkFilter parameters in ``params``."""
+    return filter_works(visible_works(user, serializer_class, fields), params)
@@ -0,0 +1,254 @@
+from datetime import datetime
+
+from django.db.models import Count, Q, F, Avg
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from .analytics import AnalyticsUnavailable, forecast, work_rows
+from .filters import narrows_works
+from .models import User, Work, ContractorScorecard
+from .permissions import scope_key
+from .rollups import cost_report, acost_report, GROUP_BY_FIELDS
+from .scorecards import work_score_expression
+
+REPORT_TYPES = ('cost', 'time', 'facility_faults', 'contractors', 'contractorsWorst', 'works', 'forecast')
+
+FINISHED_STATUSES = ['FINISHED', 'PAID', 'WAITING_PAYMENT']
+OPEN_STATUSES = ['IN_PROGRESS', 'PENDING']
+TOP_CONTRACTORS = 10
+
+CONTRACTOR_REPORT_FIELDS = (
+    'contractor__username', 'contractor__first_name', 'contractor__last_name',
+    'avg_quality', 'avg_time', 'avg_cost', 'overall_avg',
+)
+# Report params that narrow the works a report covers (besides the WorkFilter ones); the
+# scorecards cover all works
+NARROWING_PARAMS = ('contractor_id', 'start_date', 'end_date', 'facility_name', 'classification')
+
+
+class ReportError(ValueError):
+    """A report request with invalid parameters; the message goes back to the client."""
+
+
+def report_filters(params):
+    """
+    (contractor_id, filter kwargs) for the contractor/date/facility/classification
+    params shared by every report.
+    """
+    contractor_id = params.get('contractor_id')
+    start_date = params.get('start_date')
+    end_date = params.get('end_date')
+    facility_name = params.get('facility_name')
+    classification = params.get('classification')
+    filters = {}
+
+    if contractor_id:
+        try:
+            contractor_id = int(contractor_id)
+        except (ValueError, TypeError):
+            raise ReportError('Invalid contractor ID')
+        filters['contractor_id'] = contractor_id
+
+    if start_date and end_date:
+        try:
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+        except ValueError:
+            raise ReportError('Invalid date format. Use YYYY-MM-DD')
+        filters['start_date__range'] = (start_date, end_date)
+
+    if facility_name:
+        filters['facility__name'] = facility_name
+
+    if classification:
+        filters['classification'] = classification
+
+    return contractor_id or None, filters
+
+
+def filter_report_queryset(queryset, params):
+    """Apply the filters shared by every report; 404 for an unknown contractor."""
+    contractor_id, filters = report_filters(params)
+    if contractor_id is not None:
+        get_object_or_404(User, id=contractor_id)
+    return queryset.filter(**filters)
+
+
+async def afilter_report_queryset(queryset, params):
+    """filter_report_queryset() with the async ORM."""
+    contractor_id, filters = report_filters(params)
+    if contractor_id is not None and not await User.objects.filter(id=contractor_id).aexists():
+        raise Http404('No User matches the given query.')
+    return queryset.filter(**filters)
+
+
+def time_aggregates():
+    now = timezone.now()
+    return {
+        'delayed': Count('pk', filter=Q(due_end_date__lt=now, status__in=OPEN_STATUSES)),
+        'in_time': Count('pk', filter=Q(due_end_date__gte=now, status__in=OPEN_STATUSES)),
+    }
+
+
+def time_report(queryset):
+    return queryset.aggregate(**time_aggregates())
+
+
+# Counts every work regardless of role or filters, as the dashboard expects.
+WORKS_AGGREGATES = {
+    'active_works': Count('pk', filter=~Q(status__in=FINISHED_STATUSES)),
+    'finished_works': Count('pk', filter=Q(status__in=FINISHED_STATUSES)),
+}
+
+
+def works_report(queryset):
+    return Work.objects.aggregate(**WORKS_AGGREGATES)
+
+
+def facility_faults(queryset):
+    return queryset.filter(classification='FAULT').values('facility__name').annotate(
+        fault_count=Count('id')
+    ).order_by()
+
+
+def facility_faults_report(queryset):
+    return list(facility_faults(queryset))
+
+
+def use_scorecards(user, params):
+    """True when the contractor reports for this request cover every work, so they can read the scorecards."""
+    return scope_key(user) == 'all' and not any(params.get(name) for name in NARROWING_PARAMS) and \
+        not narrows_works(params)
+
+
+def contractor_averages(queryset):
+    # overall_avg averages Work.average_score: missing scores are skipped, unscored works left out
+    return queryset.values('contractor__username', 'contractor__first_name', 'contractor__last_name').annotate(
+        avg_quality=Avg('quality_score'),
+        avg_time=Avg('time_score'),
+        avg_cost=Avg('cost_score'),
+        overall_avg=Avg(work_score_expression()),
+    )
+
+
+def contractor_rows(queryset, scorecards=False):
+    if scorecards:
+        return ContractorScorecard.objects.values(*CONTRACTOR_REPORT_FIELDS)
+    return contractor_averages(queryset)
+
+
+# Contractors without a scored work have no overall_avg and come last in both lists
+def best_contractors(queryset, scorecards=False):
+    return contractor_rows(queryset, scorecards).order_by(
+        F('overall_avg').desc(nulls_last=True), 'contractor__username')[:TOP_CONTRACTORS]
+
+
+def worst_contractors(queryset, scorecards=False):
+    return contractor_rows(queryset, scorecards).order_by(
+        F('overall_avg').asc(nulls_last=True), 'contractor__username')[:TOP_CONTRACTORS]
+
+
+def contractors_report(queryset, scorecards=False):
+    return list(best_contractors(queryset, scorecards))
+
+
+def contractors_worst_report(queryset, scorecards=False):
+    return list(worst_contractors(queryset, scorecards))
+
+
+def ranked_contractors(queryset, scorecards=False):
+    """Best and worst contractors; from a single grouped query unless read from the scorecards."""
+    if scorecards:
+        return contractors_report(queryset, True), contractors_worst_report(queryset, True)
+    rows = sorted(contractor_averages(queryset).order_by(), key=lambda row: row['contractor__username'])
+    scored = [row for row in rows if row['overall_avg'] is not None]
+    unscored = [row for row in rows if row['overall_avg'] is None]
+    best = sorted(scored, key=lambda row: -row['overall_avg']) + unscored
+    worst = sorted(scored, key=lambda row: row['overall_avg']) + unscored
+    return best[:TOP_CONTRACTORS], worst[:TOP_CONTRACTORS]
+
+
+def forecast_report(rows):
+    try:
+        return forecast(rows)
+    except AnalyticsUnavailable as e:
+        raise ReportError(str(e))
+
+
+def cost_group_by(params):
+    group_by = params.get('group_by')
+    if group_by and group_by not in GROUP_BY_FIELDS:
+        raise ReportError('Invalid group_by. Use facility or contractor')
+    return group_by or None
+
+
+def compute_report(report_type, queryset, params, scorecards=False):
+    """
+    The ``report_type`` report over ``queryset``. With ``scorecards`` the contractor
+    reports read the ContractorScorecard table instead; pass use_scorecards().
+    """
+    if report_type == 'cost':
+        # Read from the per-work rollups instead of re-aggregating every item
+        return cost_report(queryset, group_by=cost_group_by(params))
+    elif report_type == 'facility_faults':
+        return facility_faults_report(queryset)
+    elif report_type == 'time':
+        return time_report(queryset)
+    elif report_type == 'contractors':
+        return contractors_report(queryset, scorecards)
+    elif report_type == 'contractorsWorst':
+        return contractors_worst_report(queryset, scorecards)
+    elif report_type == 'works':
+        return works_report(queryset)
+    elif report_type == 'forecast':
+        return forecast_report(work_rows(queryset))
+    raise ReportError('Invalid report type')
+
+
+async def acompute_report(report_type, queryset, params, scorecards=False):
+    """compute_report() with the async ORM, for backend/async_views.py."""
+    if report_type == 'cost':
+        return await acost_report(queryset, group_by=cost_group_by(params))
+    elif report_type == 'facility_faults':
+        return [row async for row in facility_faults(queryset)]
+    elif report_type == 'time':
+        return await queryset.aaggregate(**time_aggregates())
+    elif report_type == 'contractors':
+        return [row async for row in best_contractors(queryset, scorecards)]
+    elif report_type == 'contractorsWorst':
+        return [row async for row in worst_contractors(queryset, scorecards)]
+    elif report_type == 'works':
+        return await Work.objects.aaggregate(**WORKS_AGGREGATES)
+    elif report_type == 'forecast':
+        return forecast_report([row async for row in work_rows(queryset)])
+    raise ReportError('Invalid report type')
+
+
+def compute_reports(report_types, queryset, params, scorecards=False):
+    """
+    Several reports over one filtered queryset. Each report is a single
+    conditional aggregate; contractors and contractorsWorst share one query.
+    """
+    invalid = [report_type for report_type in report_types if report_type not in REPORT_TYPES]
+    if invalid:
+        raise ReportError(f'Invalid report type: {", ".join(invalid)}')
+
+    results = {}
+    if 'contractors' in report_types and 'contractorsWorst' in report_types:
+        results['contractors'], results['contractorsWorst'] = ranked_contractors(queryset, scorecards)
+    for report_type in report_types:
+        if report_type not in results:
+            results[report_type] = compute_report(report_type, queryset, params, scorecards)
+    return results
+
+
+def parse_report_types(params):
+    """Report types from ``?types=cost,time`` or repeated ``?types=`` parameters."""
+    report_types = []
+    for value in params.getlist('types'):
+        for report_type in value.split(','):
+            report_type = report_type.strip()
+            if report_type and report_type not in report_types:
+                report_types.append(report_type)
+    return report_types
@@ -0,0 +1,186 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.utils import timezone
+from django.utils.encoding import force_str
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .exports import average_score, days_in_work
+from .serializers import WorkSerializer, NestedWorkItemSerializer
+
+
+def identity(value):
+    return value
+
+
+class ValuesRepresentation:
+    """
+    The read-only output of ``serializer_class`` built straight from values()
+    rows, for list endpoints. Each field is read from its column and formatted by
+    the serializer's own field (so dates, decimals etc. match to the byte), but
+    without instantiating the serializer per object or resolving attributes:
+    display labels come from dicts of the model choices and nested lists are one
+    extra query, grouped by their foreign key in a single pass.
+
+    Fields backed by properties are computed by ``computed[name](row, now)`` from
+    the columns in the serializer's ``Meta.source_fields``. ``fields`` limits the
+    output (and the columns read) to those names.
+    """
+
+    def __init__(self, serializer_class, computed=None, children=None, fields=None):
+        serializer = serializer_class()
+        self.model = serializer.Meta.model
+        source_fields = getattr(serializer.Meta, 'source_fields', {})
+        computed = computed or {}
+        children = children or {}
+        self.columns = []
+        self.plan = []
+        self.children = []
+
+        for name, field in serializer.fields.items():
+            if getattr(field, 'write_only', False) or (fields is not None and name not in fields):
+                continue
+            if name in computed:
+                self.add_columns(*source_fields.get(name, ()))
+                self.plan.append((name, None, computed[name], field.to_representation))
+            elif isinstance(field, serializers.ListSerializer):
+                relation = self.model._meta.get_field(field.source)
+                child = children.get(name) or ValuesRepresentation(type(field.child))
+                self.children.append((name, relation.related_model, relation.field.attname, child))
+                # Filled in from the grouped child rows
+                self.plan.append((name, None, None, identity))
+            else:
+                self.plan.append((name, *self.field_getter(name, field)))
+        self.add_columns(self.model._meta.pk.attname)
+
+    def add_columns(self, *paths):
+        for path in paths:
+            if path not in self.columns:
+                self.columns.append(path)
+
+    def field_getter(self, name, field):
+        """(column, value function, to_representation) for a plain serializer field."""
+        if isinstance(field, (serializers.SerializerMethodField, serializers.HyperlinkedRelatedField)) or \
+                field.source == '*':
+            raise ImproperlyConfigured(f'{self.model.__name__}.{name} needs an entry in computed=')
+        attrs = list(field.source_attrs)
+        display = attrs[-1].startswith('get_') and attrs[-1].endswith('_display')
+        if display:
+            attrs[-1] = attrs[-1][len('get_'):-len('_display')]
+        path = '__'.join(attrs)
+        try:
+            model_field = self.model._meta.get_field(attrs[0])
+            for attr in attrs[1:]:
+                model_field = model_field.related_model._meta.get_field(attr)
+        except (FieldDoesNotExist, AttributeError):
+            raise ImproperlyConfigured(f'{self.model.__name__}.{name} needs an entry in computed=')
+        self.add_columns(path)
+
+        if display:
+            labels = {value: force_str(label, strings_only=True) for value, label in model_field.flatchoices}
+            return path, lambda value: labels.get(value, value), field.to_representation
+        if isinstance(field, serializers.RelatedField):
+            # values() already gives the primary key a PrimaryKeyRelatedField renders
+            return path, None, identity
+        return path, None, field.to_representation
+
+    def values(self, queryset, *extra_columns):
+        """
+        ``queryset`` (filtered, ordered, sliced as it is) as the values() rows render()
+        takes; ``extra_columns`` are read too, e.g. for pagination cursors.
+        """
+        columns = self.columns + [column for column in extra_columns if column not in self.columns]
+        return queryset.prefetch_related(None).values(*columns)
+
+    @staticmethod
+    def children_queryset(model, fk, child, parent_ids):
+        # In primary key order, as the serializer's prefetch (querysets.QueryPlan) returns them
+        return model._default_manager.filter(**{f'{fk}__in': parent_ids}).order_by('pk').values(*child.columns, fk)
+
+    def render(self, rows):
+        """The serializer's ``data`` for values() rows, with one query per nested list."""
+        rows = list(rows)
+        now = timezone.now()
+        ids = [row[self.model._meta.pk.attname] for row in rows]
+        nested = {
+            name: child.group(self.children_queryset(model, fk, child, ids), fk, now)
+            for name, model, fk, child in self.children
+        }
+        return [self.render_row(row, nested, now) for row in rows]
+
+    async def arender(self, rows):
+        """render() with the async ORM."""
+        now = timezone.now()
+        ids = [row[self.model._meta.pk.attname] for row in rows]
+        nested = {}
+        for name, model, fk, child in self.children:
+            child_rows = [row async for row in self.children_queryset(model, fk, child, ids)]
+            nested[name] = child.group(child_rows, fk, now)
+        return [self.render_row(row, nested, now) for row in rows]
+
+    def group(self, rows, fk, now):
+        """{parent id: [rendered row]} in one pass over ``rows``."""
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row[fk], []).append(self.render_row(row, {}, now))
+        return grouped
+
+    def render_row(self, row, nested, now):
+        data = {}
+        for name, column, convert, to_representation in self.plan:
+            if column is None:
+                if convert is None:
+                    value = nested[name].get(row[self.model._meta.pk.attname], [])
+                else:
+                    value = convert(row, now)
+            else:
+                value = row[column]
+                if convert is not None and value is not None:
+                    value = convert(value)
+            data[name] = None if value is None else to_representation(value)
+        return data
+
+
+class ValuesListMixin:
+    """
+    ViewSet mixin rendering ``list`` with get_list_representation() (a
+    ValuesRepresentation) instead of the serializer. Other actions are untouched.
+    """
+
+    def get_list_representation(self):
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        representation = self.get_list_representation()
+        queryset = self.filter_queryset(self.get_queryset())
+        # The cursor is encoded from the sort column, rendered or not
+        rows = representation.values(queryset, *getattr(self.pagination_class, 'ordering_fields', ()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(representation.render(page))
+        return Response(representation.render(rows))
+
+
+def item_total_section_cost(row, now):
+    return row['actual_amount'] * row['unit_cost']
+
+
+def work_average_score(row, now):
+    return average_score(row['quality_score'], row['time_score'], row['cost_score'])
+
+
+def work_days_in_work(row, now):
+    return days_in_work(row['start_date'], row['end_date'], now)
+
+
+WORK_ITEM_COMPUTED = {'total_section_cost': item_total_section_cost}
+WORK_COMPUTED = {'average_score': work_average_score, 'days_in_work': work_days_in_work}
+
+
+@lru_cache(maxsize=None)
+def work_list_representation(fields=None):
+    """WorkSerializer's list output, with the nested items; ``fields`` as from fieldsets.requested_fields()."""
+    return ValuesRepresentation(WorkSerializer, computed=WORK_COMPUTED, fields=fields, children={
+        'items': ValuesRepresentation(NestedWorkItemSerializer, computed=WORK_ITEM_COMPUTED),
+    })
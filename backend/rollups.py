@@ -0,0 +1,218 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, Sum, F, Q
+from django.utils import timezone
+
+from .models import Work, WorkItem, WorkCostRollup
+from .scorecards import refresh_scorecards
+
+# Statuses the cost report treats as "active" and "paid". APPROVED is not a
+# Work.STATUS_CHOICES value any more but older rows may still carry it.
+ACTIVE_STATUSES = ['APPROVED', 'IN_PROGRESS']
+PAID_STATUSES = ['PAID']
+
+ROLLUP_TOTALS = ('contract_total', 'actual_total', 'overrun_total', 'free_budget')
+COST_REPORT_KEYS = ('budget', 'amount_paid', 'budget_exception', 'free_budget')
+
+TOTAL_COST_FIELD = DecimalField(max_digits=18, decimal_places=4)
+
+# Grouping dimensions accepted by cost_report(group_by=...)
+GROUP_BY_FIELDS = {
+    'facility': ('facility_id', 'facility__name'),
+    'contractor': ('contractor_id', 'contractor__username'),
+}
+
+
+def item_totals(items):
+    """
+    Per-work item totals for an item queryset, as {work_id: {name: value}} with
+    the ROLLUP_TOTALS and the Work.ITEM_TOTAL_FIELDS, from one grouped query.
+    """
+    status_counts = {f'status_{code}': Count('pk', filter=Q(status=code)) for code, _ in WorkItem.STATUS_CHOICES}
+    rows = items.values('work_id').annotate(
+        contract_total=Sum('contract_amount'),
+        actual_total=Sum('actual_amount'),
+        overrun_total=Sum(F('actual_amount') - F('contract_amount'),
+                          filter=Q(actual_amount__gt=F('contract_amount'))),
+        free_budget=Sum(F('contract_amount') - F('actual_amount'),
+                        filter=Q(actual_amount__lt=F('contract_amount'))),
+        total_cost=Sum(F('actual_amount') * F('unit_cost'), output_field=TOTAL_COST_FIELD),
+        item_count=Count('pk'),
+        **status_counts,
+    ).order_by()
+    totals = {}
+    for row in rows:
+        work_totals = {name: row[name] or Decimal('0') for name in (*ROLLUP_TOTALS, 'total_cost')}
+        work_totals['item_count'] = row['item_count']
+        work_totals['item_status_counts'] = {
+            code: row[f'status_{code}'] for code, _ in WorkItem.STATUS_CHOICES if row[f'status_{code}']
+        }
+        totals[row['work_id']] = work_totals
+    return totals
+
+
+def empty_totals():
+    return {**dict.fromkeys((*ROLLUP_TOTALS, 'total_cost'), Decimal('0')), 'item_count': 0, 'item_status_counts': {}}
+
+
+def build_rollups(works, totals=None):
+    """Unsaved WorkCostRollup rows for a Work queryset, computed from the live items."""
+    works = list(works.values('pk', 'status', 'facility_id', 'contractor_id'))
+    if totals is None:
+        totals = item_totals(WorkItem.objects.filter(work_id__in=[work['pk'] for work in works]))
+    now = timezone.now()
+    return [
+        WorkCostRollup(
+            work_id=work['pk'], status=work['status'], facility_id=work['facility_id'],
+            contractor_id=work['contractor_id'], updated_at=now,
+            **{name: totals.get(work['pk'], empty_totals())[name] for name in ROLLUP_TOTALS},
+        )
+        for work in works
+    ]
+
+
+def stale_work_totals(works, totals):
+    """Works in ``works`` whose item total columns differ from ``totals``, with the new values set."""
+    stale = []
+    for work in works.only('pk', 'contractor_id', *Work.ITEM_TOTAL_FIELDS):
+        expected = totals.get(work.pk, empty_totals())
+        if any(getattr(work, name) != expected[name] for name in Work.ITEM_TOTAL_FIELDS):
+            for name in Work.ITEM_TOTAL_FIELDS:
+                setattr(work, name, expected[name])
+            stale.append(work)
+    return stale
+
+
+def refresh_work_rollups(work_ids):
+    """
+    Recompute the rollup rows and the Work item totals of the given works, in one
+    transaction. Works whose totals changed get a new updated_at, so conditional
+    GETs and the sync endpoint see the change, and their contractors' scorecards
+    are refreshed for the overrun ratio.
+    """
+    work_ids = list(work_ids)
+    with transaction.atomic():
+        works = Work.objects.filter(pk__in=work_ids)
+        totals = item_totals(WorkItem.objects.filter(work_id__in=work_ids))
+        rollups = build_rollups(works, totals)
+        WorkCostRollup.objects.bulk_create(
+            rollups,
+            update_conflicts=True,
+            unique_fields=['work'],
+            update_fields=['status', 'facility', 'contractor', *ROLLUP_TOTALS, 'updated_at'],
+        )
+        stale = stale_work_totals(works, totals)
+        now = timezone.now()
+        for work in stale:
+            work.updated_at = now
+        Work.objects.bulk_update(stale, [*Work.ITEM_TOTAL_FIELDS, 'updated_at'])
+        refresh_scorecards({work.contractor_id for work in stale})
+    return len(rollups)
+
+
+def sync_work_status(work):
+    """Copy the columns the rollup mirrors from ``work``; creates the row if missing."""
+    updated = WorkCostRollup.objects.filter(work_id=work.pk).update(
+        status=work.status, facility_id=work.facility_id, contractor_id=work.contractor_id,
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        refresh_work_rollups([work.pk])
+
+
+def cost_report_query(queryset, group_by=None):
+    """The rollup queryset behind cost_report(): aggregate it, or iterate it when grouped."""
+    rollups = WorkCostRollup.objects.filter(work__in=queryset.values('pk'))
+    aggregates = {
+        'budget': Sum('contract_total', filter=Q(status__in=ACTIVE_STATUSES)),
+        'amount_paid': Sum('actual_total', filter=Q(status__in=PAID_STATUSES)),
+        'budget_exception': Sum('overrun_total', filter=Q(status__in=ACTIVE_STATUSES)),
+        'free_budget': Sum('free_budget', filter=Q(status__in=ACTIVE_STATUSES)),
+    }
+    if group_by is None:
+        return rollups, aggregates
+    key_field, label_field = GROUP_BY_FIELDS[group_by]
+    return rollups.values(key_field, label_field).annotate(**aggregates).order_by(label_field), None
+
+
+def cost_report_row(result, group_by=None):
+    totals = {key: result[key] or 0 for key in COST_REPORT_KEYS}
+    if group_by is None:
+        return totals
+    key_field, label_field = GROUP_BY_FIELDS[group_by]
+    return {group_by: result[key_field], 'name': result[label_field], **totals}
+
+
+def cost_report(queryset, group_by=None):
+    """
+    The ``reports?type=cost`` figures for a Work queryset, read from the rollup
+    table in a single aggregate query.
+    """
+    rollups, aggregates = cost_report_query(queryset, group_by)
+    if group_by is None:
+        return cost_report_row(rollups.aggregate(**aggregates))
+    return [cost_report_row(row, group_by) for row in rollups]
+
+
+async def acost_report(queryset, group_by=None):
+    """cost_report() with the async ORM."""
+    rollups, aggregates = cost_report_query(queryset, group_by)
+    if group_by is None:
+        return cost_report_row(await rollups.aaggregate(**aggregates))
+    return [cost_report_row(row, group_by) async for row in rollups]
+
+
+def live_cost_report(queryset):
+    """The cost report aggregated straight from the items; used to verify the rollups."""
+    active_works = queryset.filter(status__in=ACTIVE_STATUSES)
+    paid_works = queryset.filter(status__in=PAID_STATUSES)
+
+    budget = active_works.aggregate(Sum('items__contract_amount'))['items__contract_amount__sum'] or 0
+    amount_paid = paid_works.aggregate(Sum('items__actual_amount'))['items__actual_amount__sum'] or 0
+
+    budget_exception = queryset.filter(
+        Q(items__actual_amount__gt=F('items__contract_amount')) & Q(status__in=ACTIVE_STATUSES)
+    ).aggregate(
+        exception=Sum(F('items__actual_amount') - F('items__contract_amount'))
+    )['exception'] or 0
+
+    free_budget = active_works.annotate(
+        free_item_budget=Sum(
+            F('items__contract_amount') - F('items__actual_amount'),
+            filter=Q(items__actual_amount__lt=F('items__contract_amount'))
+        )
+    ).aggregate(total_free_budget=Sum('free_item_budget'))['total_free_budget'] or 0
+    return {
+        'budget': budget,
+        'amount_paid': amount_paid,
+        'budget_exception': budget_exception,
+        'free_budget': free_budget,
+    }
+
+
+def find_drift(works):
+    """
+    Works in ``works`` whose stored rollup or Work item totals differ from the
+    live items, as {work_id: reason}.
+    """
+    totals = item_totals(WorkItem.objects.filter(work__in=works.values('pk')))
+    expected = {rollup.work_id: rollup for rollup in build_rollups(works, totals)}
+    stored = {rollup.work_id: rollup for rollup in WorkCostRollup.objects.filter(work_id__in=list(expected))}
+    drift = {}
+    for work_id, rollup in expected.items():
+        current = stored.get(work_id)
+        if current is None:
+            drift[work_id] = 'missing'
+            continue
+        for name in ('status', 'facility_id', 'contractor_id', *ROLLUP_TOTALS):
+            if getattr(current, name) != getattr(rollup, name):
+                drift[work_id] = f'{name}: stored {getattr(current, name)}, live {getattr(rollup, name)}'
+                break
+
+    for work in works.only('pk', *Work.ITEM_TOTAL_FIELDS):
+        live = totals.get(work.pk, empty_totals())
+        for name in Work.ITEM_TOTAL_FIELDS:
+            if work.pk not in drift and getattr(work, name) != live[name]:
+                drift[work.pk] = f'work.{name}: stored {getattr(work, name)}, live {live[name]}'
+    return drift
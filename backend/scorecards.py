@@ -0,0 +1,170 @@
+import functools
+import operator
+from bisect import bisect_left
+
+from django.db import transaction
+from django.db.models import Avg, Case, Count, F, FloatField, IntegerField, Q, Value, When, Window
+from django.db.models.functions import Cast, Coalesce, NullIf, RowNumber
+from django.utils import timezone
+
+from .models import Work, ContractorScorecard, ContractorScorecardSnapshot
+
+SCORE_FIELDS = ('quality_score', 'time_score', 'cost_score')
+SCORED = functools.reduce(operator.or_, (Q(**{f'{field}__isnull': False}) for field in SCORE_FIELDS))
+FINISHED = Q(end_date__isnull=False)
+
+# Scored works the rolling average covers, most recent first
+ROLLING_WINDOW = 10
+
+STAT_FIELDS = (
+    'work_count', 'scored_count', 'avg_quality', 'avg_time', 'avg_cost', 'overall_avg', 'rolling_avg',
+    'finished_count', 'on_time_ratio', 'overrun_ratio',
+)
+SNAPSHOT_FIELDS = ('work_count', 'overall_avg', 'rolling_avg', 'on_time_ratio', 'overrun_ratio', 'percentile_rank')
+
+
+def work_score_expression():
+    """
+    Work.average_score in SQL: the mean of the scores the work has, NULL when it
+    has none. Unrounded, so averages over many works don't compound the rounding.
+    """
+    total = functools.reduce(operator.add, (Coalesce(F(field), Value(0)) for field in SCORE_FIELDS))
+    present = functools.reduce(operator.add, (
+        Case(When(**{f'{field}__isnull': False}, then=Value(1)), default=Value(0), output_field=IntegerField())
+        for field in SCORE_FIELDS
+    ))
+    return Cast(total, FloatField()) / NullIf(present, Value(0))
+
+
+def ratio(part, whole):
+    return part / whole if whole else None
+
+
+def scorecard_stats(works):
+    """{contractor_id: {stat: value}} for a Work queryset, from one grouped query."""
+    rows = works.values('contractor_id').annotate(
+        work_count=Count('pk'),
+        scored_count=Count('pk', filter=SCORED),
+        avg_quality=Avg('quality_score'),
+        avg_time=Avg('time_score'),
+        avg_cost=Avg('cost_score'),
+        overall_avg=Avg(work_score_expression()),
+        finished_count=Count('pk', filter=FINISHED),
+        on_time_count=Count('pk', filter=FINISHED & Q(end_date__lte=F('due_end_date'))),
+        costed_count=Count('pk', filter=Q(item_count__gt=0)),
+        overrun_count=Count('pk', filter=Q(item_count__gt=0, actual_total__gt=F('contract_total'))),
+    ).order_by()
+    stats = {}
+    for row in rows:
+        stats[row['contractor_id']] = {
+            **{name: row[name] for name in STAT_FIELDS if name in row},
+            'on_time_ratio': ratio(row['on_time_count'], row['finished_count']),
+            'overrun_ratio': ratio(row['overrun_count'], row['costed_count']),
+        }
+    return stats
+
+
+def rolling_averages(contractor_ids):
+    """{contractor_id: mean score of their ROLLING_WINDOW most recently finished (or started) scored works}."""
+    recent = Work.objects.filter(SCORED, contractor_id__in=contractor_ids).annotate(
+        score=work_score_expression(),
+        position=Window(RowNumber(), partition_by=F('contractor_id'),
+                        order_by=[Coalesce('end_date', 'start_date').desc(), F('pk').desc()]),
+    ).filter(position__lte=ROLLING_WINDOW).values_list('contractor_id', 'score')
+    scores = {}
+    for contractor_id, score in recent:
+        scores.setdefault(contractor_id, []).append(score)
+    return {contractor_id: sum(values) / len(values) for contractor_id, values in scores.items()}
+
+
+def update_percentile_ranks():
+    """
+    Re-rank every scorecard by overall_avg (a refresh of one contractor can move
+    everyone's rank) and return {contractor_id: percentile_rank}.
+    """
+    cards = list(ContractorScorecard.objects.only('pk', 'overall_avg', 'percentile_rank'))
+    averages = sorted(card.overall_avg for card in cards if card.overall_avg is not None)
+    changed = []
+    for card in cards:
+        rank = None
+        if card.overall_avg is not None:
+            rank = round(100 * bisect_left(averages, card.overall_avg) / len(averages), 1)
+        if rank != card.percentile_rank:
+            card.percentile_rank = rank
+            changed.append(card)
+    ContractorScorecard.objects.bulk_update(changed, ['percentile_rank'])
+    return {card.pk: card.percentile_rank for card in cards}
+
+
+def refresh_scorecards(contractor_ids, rerank=False):
+    """
+    Recompute the scorecards of the given contractors from their works, and
+    save and snapshot (today's row) those that changed. Contractors left without
+    works lose their scorecard. Ranks only depend on overall_avg, so all
+    scorecards are re-ranked only when one of those changed, a scorecard came or
+    went, or ``rerank`` is set. Returns the number of scorecards saved.
+    """
+    contractor_ids = {pk for pk in contractor_ids if pk is not None}
+    if not contractor_ids:
+        return 0
+    with transaction.atomic():
+        stats = scorecard_stats(Work.objects.filter(contractor_id__in=contractor_ids))
+        rolling = rolling_averages(list(stats))
+        stored = {card.pk: card for card in ContractorScorecard.objects.filter(pk__in=contractor_ids)}
+        removed, _ = ContractorScorecard.objects.filter(pk__in=contractor_ids - set(stats)).delete()
+        rerank = rerank or bool(removed)
+
+        now = timezone.now()
+        cards = []
+        for contractor_id, values in stats.items():
+            card = ContractorScorecard(contractor_id=contractor_id, rolling_avg=rolling.get(contractor_id),
+                                       updated_at=now, **values)
+            old = stored.get(contractor_id)
+            if old is not None and all(same_value(getattr(old, name), getattr(card, name)) for name in STAT_FIELDS):
+                continue
+            if old is None or not same_value(old.overall_avg, card.overall_avg):
+                rerank = True
+            card.percentile_rank = old.percentile_rank if old is not None else None
+            cards.append(card)
+        ContractorScorecard.objects.bulk_create(
+            cards, update_conflicts=True, unique_fields=['contractor'], update_fields=[*STAT_FIELDS, 'updated_at'],
+        )
+
+        if rerank:
+            ranks = update_percentile_ranks()
+            for card in cards:
+                card.percentile_rank = ranks.get(card.contractor_id)
+        today = timezone.localdate()
+        ContractorScorecardSnapshot.objects.bulk_create(
+            [ContractorScorecardSnapshot(contractor_id=card.contractor_id, date=today,
+                                         **{name: getattr(card, name) for name in SNAPSHOT_FIELDS})
+             for card in cards],
+            update_conflicts=True, unique_fields=['contractor', 'date'], update_fields=SNAPSHOT_FIELDS,
+        )
+    return len(cards)
+
+
+def find_drift():
+    """Scorecards that differ from the live works (or are missing / orphaned), as {contractor_id: reason}."""
+    live = scorecard_stats(Work.objects.all())
+    rolling = rolling_averages(list(live))
+    stored = {card.pk: card for card in ContractorScorecard.objects.all()}
+    drift = {pk: 'orphaned' for pk in set(stored) - set(live)}
+    for contractor_id, values in live.items():
+        card = stored.get(contractor_id)
+        if card is None:
+            drift[contractor_id] = 'missing'
+            continue
+        values = {**values, 'rolling_avg': rolling.get(contractor_id)}
+        for name in STAT_FIELDS:
+            if not same_value(getattr(card, name), values[name]):
+                drift[contractor_id] = f'{name}: stored {getattr(card, name)}, live {values[name]}'
+                break
+    return drift
+
+
+def same_value(stored, live):
+    # Float averages may differ in the last bits with the order rows were summed in
+    if isinstance(stored, float) and isinstance(live, float):
+        return abs(stored - live) < 1e-9
+    return stored == live
@@ -0,0 +1,146 @@
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .models import User, Work, WorkItem, Facility, Payment, Comment
+from .rollups import refresh_work_rollups
+from .scorecards import refresh_scorecards
+
+# Seeded rows are recognisable (and removable) by these prefixes.
+EMAIL_DOMAIN = 'seed.example.com'
+WORK_PREFIX = 'S-'
+FACILITY_NUMBER_BASE = 900000
+
+SEED_PASSWORD = 'seed-password'
+BASE_DATE = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class Scale:
+    """How many rows of each kind to generate."""
+
+    def __init__(self, works=1000, items_per_work=5, payments_per_work=1, comments_per_work=2,
+                 contractors=50, managers=20, facilities=30):
+        self.works = works
+        self.items_per_work = items_per_work
+        self.payments_per_work = payments_per_work
+        self.comments_per_work = comments_per_work
+        self.contractors = contractors
+        self.managers = managers
+        self.facilities = facilities
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def clear_seed_data():
+    """Delete everything a previous seed() created; works cascade from their users."""
+    User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').delete()
+    Facility.objects.filter(facility_number__gte=FACILITY_NUMBER_BASE).delete()
+
+
+def _chunks(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def seed(scale, seed=0, batch_size=2000):
+    """
+    Insert a deterministic synthetic dataset: the same ``scale`` and ``seed``
+    always produce the same rows. Returns the created users by role.
+    """
+    rng = random.Random(seed)
+    # Hashing is deliberately slow; every seeded user shares one hash.
+    password = make_password(SEED_PASSWORD, salt='seeddata')
+
+    def user(role, index, idNum=None):
+        name = f'seed-{role.lower()}-{index:04d}'
+        return User(email=f'{name}@{EMAIL_DOMAIN}', username=name, password=password, role=role,
+                    first_name=role.title(), last_name=f'{index:04d}', phone_number=f'050{index:07d}',
+                    idNum=idNum or f'{rng.randrange(10 ** 8, 10 ** 9)}')
+
+    with transaction.atomic():
+        contractors = [user('CONTRACTOR', index) for index in range(scale.contractors)]
+        viewers = [user('CONTRACTOR_VIEWER', index, contractor.idNum) for index, contractor in enumerate(contractors)]
+        managers = [user('MANAGER', index) for index in range(scale.managers)]
+        staff = [user(role, 0) for role in ('GENERAL_ENGINEER', 'PAYMENT_ADMIN', 'SUPER_ADMIN')]
+        User.objects.bulk_create(contractors + viewers + managers + staff, batch_size=batch_size)
+
+        facilities = Facility.objects.bulk_create([
+            Facility(name=f'Facility {index}', description=f'Synthetic facility {index}',
+                     facility_number=FACILITY_NUMBER_BASE + index)
+            for index in range(scale.facilities)
+        ], batch_size=batch_size)
+
+        classifications = [code for code, _ in Work.CLASSIFICATION_CHOICES]
+        statuses = [code for code, _ in Work.STATUS_CHOICES]
+        item_statuses = [code for code, _ in WorkItem.STATUS_CHOICES]
+
+        works = []
+        for index in range(scale.works):
+            start = BASE_DATE + timedelta(days=rng.randrange(0, 720), hours=rng.randrange(0, 24))
+            due = start + timedelta(days=rng.randrange(7, 180))
+            status = rng.choice(statuses)
+            finished = status in ('WAITING_PAYMENT', 'PAID')
+            scored = finished and rng.random() < 0.8
+            works.append(Work(
+                work_number=f'{WORK_PREFIX}{index:07d}',
+                project=f'Project {rng.randrange(1, 200)}',
+                classification=rng.choice(classifications),
+                start_date=start,
+                due_end_date=due,
+                end_date=due + timedelta(days=rng.randrange(-20, 40)) if finished else None,
+                status=status,
+                contractor=rng.choice(contractors),
+                manager=rng.choice(managers),
+                facility=rng.choice(facilities),
+                location_name=f'Building {rng.randrange(1, 50)}',
+                remarks='',
+                quality_score=rng.randrange(1, 11) if scored else None,
+                time_score=rng.randrange(1, 11) if scored else None,
+                cost_score=rng.randrange(1, 11) if scored and rng.random() < 0.9 else None,
+                completion_percentage=100 if finished else rng.randrange(0, 100),
+            ))
+        Work.objects.bulk_create(works, batch_size=batch_size)
+
+        items, payments, comments = [], [], []
+        commenters = managers + staff
+        for work in works:
+            for section in range(1, scale.items_per_work + 1):
+                contract = Decimal(rng.randrange(100, 100000)) / 100
+                actual = (contract * Decimal(rng.uniform(0.6, 1.3))).quantize(Decimal('0.01'))
+                items.append(WorkItem(
+                    work=work, section=section, description=f'Section {section}',
+                    contract_amount=contract, actual_amount=actual,
+                    unit_cost=Decimal(rng.randrange(100, 5000)) / 100,
+                    status=rng.choice(item_statuses), work_type=rng.choice(('Electric', 'Plumbing', 'Civil')),
+                ))
+            for number in range(scale.payments_per_work):
+                payments.append(Payment(
+                    work=work, invoice_number=f'{work.work_number}-{number}',
+                    payment_date=(work.start_date + timedelta(days=rng.randrange(0, 200))).date(),
+                    amount_paid=Decimal(rng.randrange(1000, 1000000)) / 100,
+                    payment_manager=staff[1], approval_manager=work.manager,
+                ))
+            for number in range(scale.comments_per_work):
+                comments.append(Comment(work=work, user=rng.choice(commenters), text=f'Comment {number}'))
+
+        for model, rows in ((WorkItem, items), (Payment, payments), (Comment, comments)):
+            for chunk in _chunks(rows, batch_size):
+                model.objects.bulk_create(chunk)
+
+        # bulk_create bypasses the signals that keep the derived tables current
+        for chunk in _chunks([work.pk for work in works], batch_size):
+            refresh_work_rollups(chunk)
+        refresh_scorecards({work.contractor_id for work in works})
+
+    return {
+        'CONTRACTOR': contractors,
+        'CONTRACTOR_VIEWER': viewers,
+        'MANAGER': managers,
+        'GENERAL_ENGINEER': [staff[0]],
+        'PAYMENT_ADMIN': [staff[1]],
+        'SUPER_ADMIN': [staff[2]],
+    }
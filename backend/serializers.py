@@ -1,9 +1,17 @@
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 # from .models import User, Work, WorkItem, Facility, ContractorRating
-from .models import User, Work, WorkItem, Facility, Payment, Comment
+from .models import (
+    User, Work, WorkItem, Facility, Payment, Comment, Job, ContractorScorecard, ContractorScorecardSnapshot,
+)
 from django.contrib.auth import get_user_model
 from dj_rest_auth.registration.serializers import RegisterSerializer
 from dj_rest_auth.serializers import UserDetailsSerializer
+from .fieldsets import DynamicFieldsMixin
+from .policies import WORK_ITEMS
+from .rollups import refresh_work_rollups
+from .signals import deferred_refresh, schedule
 
 User = get_user_model()
 
@@ -68,6 +76,7 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 class NestedWorkItemSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)  # Writable so WorkSerializer.update can match existing items
     total_section_cost = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
 
@@ -75,9 +84,11 @@ class NestedWorkItemSerializer(serializers.ModelSerializer):
         model = WorkItem
         fields = ['id', 'section', 'description', 'contract_amount', 'actual_amount', 'unit_cost', 'status',
                   'work_type', 'total_section_cost', 'status_display']
+        # Columns read by computed fields, used by querysets.optimize_queryset
+        source_fields = {'total_section_cost': ('actual_amount', 'unit_cost')}
 
 
-class WorkItemSerializer(serializers.ModelSerializer):
+class WorkItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     total_section_cost = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     work = serializers.PrimaryKeyRelatedField(queryset=Work.objects.all())  # This is the key change
     status_display = serializers.CharField(source='get_status_display', read_only=True)
@@ -88,9 +99,18 @@ class WorkItemSerializer(serializers.ModelSerializer):
         model = WorkItem
         fields = ['id', 'section', 'description', 'contract_amount', 'actual_amount', 'unit_cost', 'status',
                   'work_type', 'total_section_cost', 'work', 'status_display']
+        source_fields = {'total_section_cost': ('actual_amount', 'unit_cost')}
 
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is not None:
+            # Items may only be added to, or moved into, works the user may change
+            fields['work'].queryset = WORK_ITEMS.compile(request.user, prefix='').writable(Work.objects.all())
+        return fields
 
-class WorkSerializer(serializers.ModelSerializer):
+
+class WorkSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     items = NestedWorkItemSerializer(many=True, required=False)
     # items = WorkItemSerializer(many=True, required=False)  # Remove `read_only=True`
     average_score = serializers.FloatField(read_only=True)
@@ -106,46 +126,72 @@ class WorkSerializer(serializers.ModelSerializer):
     class Meta:
         model = Work
         fields = '__all__'
+        source_fields = {
+            'average_score': ('quality_score', 'time_score', 'cost_score'),
+            'days_in_work': ('start_date', 'end_date'),
+        }
 
     def create(self, validated_data):
         items_data = validated_data.pop('items', [])
-        work = Work.objects.create(**validated_data)
-        for item_data in items_data:
-            WorkItem.objects.create(work=work, **item_data)
+        with transaction.atomic(), deferred_refresh():
+            work = Work.objects.create(**validated_data)
+            WorkItem.objects.bulk_create([WorkItem(work=work, **self._item_fields(item)) for item in items_data])
+            # bulk_create sends no post_save, so refresh the work's rollup explicitly
+            schedule(refresh_work_rollups, work.pk)
         return work
 
     def update(self, instance, validated_data):
-        # Handle nested items
-        items_data = validated_data.pop('items', [])
+        # Items are only replaced when the payload carries them (a PATCH of other fields keeps them)
+        items_data = validated_data.pop('items', None)
 
-        # Update the work instance fields
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+        with transaction.atomic(), deferred_refresh():
+            # Update the work instance fields
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
 
-        # Get existing items to track what should be deleted
-        existing_items = {item.id: item for item in instance.items.all()}
+            if items_data is not None:
+                self._write_items(instance, items_data)
+                schedule(refresh_work_rollups, instance.pk)
+
+        return instance
 
-        # Update or create items
-        updated_items = []
+    @staticmethod
+    def _item_fields(item_data):
+        return {attr: value for attr, value in item_data.items() if attr != 'id'}
+
+    def _write_items(self, instance, items_data):
+        """
+        Diff the submitted items against the stored ones with a fixed number of
+        queries: one read of the submitted columns, one bulk insert, one bulk
+        update of the changed columns and one delete.
+        """
+        fields = sorted({attr for item_data in items_data for attr in item_data if attr != 'id'})
+        submitted_ids = [item_data['id'] for item_data in items_data if item_data.get('id')]
+        existing_items = {
+            row['id']: row
+            for row in instance.items.filter(id__in=submitted_ids).values('id', *fields)
+        }
+
+        now = timezone.now()
+        new_items, changed_items, changed_fields = [], [], set()
         for item_data in items_data:
-            item_id = item_data.get('id')
-            if item_id and item_id in existing_items:
-                # Update existing item
-                item = existing_items.pop(item_id)
-                for attr, value in item_data.items():
-                    setattr(item, attr, value)
-                item.save()
-            else:
-                # Create new item
-                item = WorkItem.objects.create(work=instance, **item_data)
-            updated_items.append(item)
+            current = existing_items.get(item_data.get('id'))
+            if current is None:
+                new_items.append(WorkItem(work=instance, **self._item_fields(item_data)))
+                continue
+            changes = {attr: value for attr, value in self._item_fields(item_data).items() if current[attr] != value}
+            if changes:
+                values = {attr: current[attr] for attr in fields}
+                values.update(changes)
+                changed_items.append(WorkItem(id=current['id'], work=instance, updated_at=now, **values))
+                changed_fields.update(changes)
 
         # Delete items that weren't included in the update
-        for item in existing_items.values():
-            item.delete()
-
-        return instance
+        instance.items.exclude(id__in=list(existing_items)).delete()
+        WorkItem.objects.bulk_create(new_items)
+        if changed_items:
+            WorkItem.objects.bulk_update(changed_items, sorted(changed_fields) + ['updated_at'])
 
 
 class FacilitySerializer(serializers.ModelSerializer):
@@ -177,6 +223,43 @@ class CommentSerializer(serializers.ModelSerializer):
         model = Comment
         fields = ['id', 'work', 'user', 'user_name', 'text', 'created_at']
         read_only_fields = ['user', 'created_at','work']
+        source_fields = {'user_name': ('user__first_name', 'user__last_name', 'user__username')}
 
     def get_user_name(self, obj):
         return obj.user.get_full_name() or obj.user.username
+
+
+class JobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'params', 'status', 'cached', 'error', 'created_at', 'started_at', 'finished_at',
+                  'download_url']
+        read_only_fields = ['status', 'cached', 'error', 'created_at', 'started_at', 'finished_at']
+
+    def get_download_url(self, obj):
+        if obj.status != 'DONE':
+            return None
+        request = self.context.get('request')
+        path = f'/jobs/{obj.pk}/download/'
+        return request.build_absolute_uri(path) if request else path
+
+
+class ContractorScorecardSerializer(serializers.ModelSerializer):
+    contractor_name = serializers.CharField(source='contractor.username', read_only=True)
+    first_name = serializers.CharField(source='contractor.first_name', read_only=True)
+    last_name = serializers.CharField(source='contractor.last_name', read_only=True)
+
+    class Meta:
+        model = ContractorScorecard
+        fields = ['contractor', 'contractor_name', 'first_name', 'last_name', 'work_count', 'scored_count',
+                  'avg_quality', 'avg_time', 'avg_cost', 'overall_avg', 'rolling_avg', 'finished_count',
+                  'on_time_ratio', 'overrun_ratio', 'percentile_rank', 'updated_at']
+
+
+class ContractorScorecardSnapshotSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ContractorScorecardSnapshot
+        fields = ['date', 'work_count', 'overall_avg', 'rolling_avg', 'on_time_ratio', 'overrun_ratio',
+                  'percentile_rank']
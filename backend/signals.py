@@ -0,0 +1,165 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .authentication import AUTH_USER_FIELDS, forget_user
+from .caching import USERS, DROPDOWN_USER_FIELDS, bump_version
+from .models import User, Work, WorkItem, Payment, Comment, DeletedRecord
+from .rollups import refresh_work_rollups, sync_work_status
+from .scorecards import refresh_scorecards
+
+_local = threading.local()
+
+
+@contextmanager
+def deferred_refresh():
+    """
+    Collect the refreshes triggered by signals inside the block and run each
+    refresh function once, with every key, on exit. Use it around bulk writes so
+    a hundred item deletes cost one rollup refresh instead of a hundred.
+    """
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+    _local.pending = {}
+    try:
+        yield
+        pending = _local.pending
+    finally:
+        _local.pending = None
+    for func, keys in pending.items():
+        func(keys)
+
+
+def schedule(func, *keys):
+    """Run ``func(keys)`` now, or at the end of the enclosing deferred_refresh()."""
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        func(set(keys))
+    else:
+        pending.setdefault(func, set()).update(keys)
+
+
+@receiver(pre_delete, sender=Work)
+@receiver(pre_delete, sender=User)
+def deletion_started(sender, instance, origin=None, **kwargs):
+    # pre_delete is sent for every row a delete collects before any of them is
+    # deleted: note the works and users going, on the delete's origin, for the
+    # post_delete receivers below
+    if origin is not None:
+        if not hasattr(origin, '_deleting'):
+            origin._deleting = {}
+        origin._deleting.setdefault(sender, set()).add(instance.pk)
+
+
+def deleting(origin, model, pk):
+    """True when the delete started from ``origin`` takes the ``model`` row ``pk`` too."""
+    return pk in getattr(origin, '_deleting', {}).get(model, ())
+
+
+@receiver(post_save, sender=WorkItem)
+def work_item_saved(sender, instance, **kwargs):
+    previous = getattr(instance, '_loaded_work_id', None)
+    schedule(refresh_work_rollups, *{instance.work_id, previous} - {None})
+    instance._loaded_work_id = instance.work_id
+
+
+@receiver(post_delete, sender=WorkItem)
+def work_item_deleted(sender, instance, origin=None, **kwargs):
+    # Not for the items of a work being deleted: it has no totals left to refresh
+    if deleting(origin, Work, instance.work_id):
+        return
+    schedule(refresh_work_rollups, instance.work_id)
+
+
+@receiver(post_save, sender=Work)
+def work_saved(sender, instance, created, **kwargs):
+    if created:
+        schedule(refresh_work_rollups, instance.pk)
+    else:
+        sync_work_status(instance)
+
+    loaded = getattr(instance, '_loaded_scorecard_values', None)
+    current = {name: getattr(instance, name) for name in Work.SCORECARD_FIELDS}
+    if loaded != current:
+        previous = (loaded or {}).get('contractor_id')
+        schedule(refresh_scorecards, *{instance.contractor_id, previous} - {None})
+        instance._loaded_scorecard_values = current
+
+
+def record_deletions(records):
+    """Write tombstones for (kind, object_id, work_id, contractor_id, manager_id) tuples."""
+    missing = {work_id for _, _, work_id, contractor_id, _ in records if contractor_id is None}
+    owners = {}
+    if missing:
+        owners = {pk: (contractor_id, manager_id) for pk, contractor_id, manager_id in
+                  Work.objects.filter(pk__in=missing).values_list('pk', 'contractor_id', 'manager_id')}
+    tombstones = []
+    for kind, object_id, work_id, contractor_id, manager_id in records:
+        if contractor_id is None:
+            contractor_id, manager_id = owners.get(work_id, (None, None))
+        tombstones.append(DeletedRecord(kind=kind, object_id=object_id, work_id=work_id,
+                                        contractor_id=contractor_id, manager_id=manager_id))
+    DeletedRecord.objects.bulk_create(tombstones)
+
+
+@receiver(post_delete, sender=Work)
+def work_deleted(sender, instance, origin=None, **kwargs):
+    if not deleting(origin, User, instance.contractor_id):
+        schedule(refresh_scorecards, instance.contractor_id)
+    schedule(record_deletions, ('work', instance.pk, instance.pk, instance.contractor_id, instance.manager_id))
+
+
+@receiver(post_delete, sender=WorkItem)
+@receiver(post_delete, sender=Payment)
+@receiver(post_delete, sender=Comment)
+def child_deleted(sender, instance, origin=None, **kwargs):
+    # Rows deleted with their work are covered by the work's tombstone
+    if deleting(origin, Work, instance.work_id):
+        return
+    kind = 'item' if sender is WorkItem else sender._meta.model_name
+    schedule(record_deletions, (kind, instance.pk, instance.work_id, None, None))
+
+
+@receiver(pre_save, sender=User)
+def user_changing(sender, instance, update_fields=None, **kwargs):
+    # Note whether the save changes anything the user dropdowns show or the auth cache holds
+    if instance._state.adding:
+        instance._dropdown_changed = instance._auth_changed = True
+    elif update_fields is not None and not set(update_fields) & {*DROPDOWN_USER_FIELDS, *AUTH_USER_FIELDS}:
+        instance._dropdown_changed = instance._auth_changed = False  # e.g. the last_login update on every login
+    else:
+        old = User.objects.filter(pk=instance.pk).values(*DROPDOWN_USER_FIELDS, *AUTH_USER_FIELDS).first() or {}
+
+        def changed(fields):
+            return any(old.get(field) != getattr(instance, field) for field in fields)
+        instance._dropdown_changed = changed(DROPDOWN_USER_FIELDS)
+        instance._auth_changed = changed(AUTH_USER_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    if getattr(instance, '_auth_changed', True):
+        # Now, and again after commit in case a request re-cached the old row meanwhile
+        forget_user(instance.pk)
+        transaction.on_commit(lambda: forget_user(instance.pk))
+    if getattr(instance, '_dropdown_changed', True):
+        # After commit, so a request racing the save can't cache the old rows under the new version
+        transaction.on_commit(lambda: bump_version(USERS))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    forget_user(instance.pk)
+    transaction.on_commit(lambda: bump_version(USERS))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def token_blacklisted(sender, instance, created, **kwargs):
+    # Logout: the user's next request reads their row again
+    if created and instance.token.user_id is not None:
+        forget_user(instance.token.user_id)
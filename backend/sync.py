@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Work, WorkItem, Payment, Comment, DeletedRecord
+from .permissions import scope_works
+from .querysets import optimize_queryset
+from .serializers import WorkSerializer, WorkItemSerializer, PaymentSerializer, CommentSerializer
+
+TOKEN_SALT = 'backend.sync'
+# The next token starts this far before the sync began, so rows saved by
+# transactions still in flight are picked up next time (clients upsert by id).
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+class SyncError(ValueError):
+    pass
+
+
+def tombstone_retention():
+    return timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 90))
+
+
+def parse_since(params, user):
+    """The timestamp to sync from (?token= or ?since=), or None for a full sync."""
+    token = params.get('token')
+    if token:
+        try:
+            data = signing.loads(token, salt=TOKEN_SALT)
+        except signing.BadSignature:
+            raise SyncError('Invalid sync token.')
+        if data.get('user') != user.pk:
+            raise SyncError('This sync token was issued to another user.')
+        return parse_datetime(data['since'])
+
+    since = params.get('since')
+    if since:
+        value = parse_datetime(since)
+        if value is None:
+            raise SyncError('Invalid since; use an ISO 8601 timestamp.')
+        return timezone.make_aware(value) if timezone.is_naive(value) else value
+    return None
+
+
+def make_token(user, started):
+    return signing.dumps({'user': user.pk, 'since': (started - SYNC_OVERLAP).isoformat()}, salt=TOKEN_SALT)
+
+
+def changes_since(request, since):
+    """
+    The works, items, payments and comments ``request.user`` may see that were
+    created or changed after ``since``, and tombstones for the ones deleted
+    since then. Without ``since``, or when it is older than the tombstone
+    retention, everything in scope is returned and ``full`` is true.
+
+    Works carry their items nested, so ``items`` only lists changed items of
+    works that did not change themselves. Tombstones are scoped by the work's
+    owners at delete time; a work reassigned away from a user is not reported
+    as deleted to them.
+    """
+    user = request.user
+    started = timezone.now()
+    full = since is None or since < started - tombstone_retention()
+    context = {'request': request}
+
+    with transaction.atomic():
+        works = scope_works(user, optimize_queryset(Work.objects.all(), WorkSerializer))
+        work_ids = works.values('pk')
+
+        changed_works = works if full else works.filter(updated_at__gt=since)
+        payments = optimize_queryset(Payment.objects.filter(work__in=work_ids), PaymentSerializer)
+        comments = optimize_queryset(Comment.objects.filter(work__in=work_ids), CommentSerializer)
+        deleted = {kind: [] for kind, _ in DeletedRecord.KIND_CHOICES}
+
+        if full:
+            items = WorkItem.objects.none()
+        else:
+            items = optimize_queryset(WorkItem.objects.filter(work__in=work_ids), WorkItemSerializer).filter(
+                updated_at__gt=since).exclude(work__in=changed_works.values('pk'))
+            payments = payments.filter(updated_at__gt=since)
+            comments = comments.filter(updated_at__gt=since)
+            tombstones = scope_works(user, DeletedRecord.objects.filter(deleted_at__gt=since))
+            for kind, object_id in tombstones.order_by('deleted_at').values_list('kind', 'object_id'):
+                deleted[kind].append(object_id)
+
+        return {
+            'token': make_token(user, started),
+            'full': full,
+            'works': WorkSerializer(changed_works.order_by('pk'), many=True, context=context).data,
+            'items': WorkItemSerializer(items.order_by('pk'), many=True, context=context).data,
+            'payments': PaymentSerializer(payments.order_by('pk'), many=True, context=context).data,
+            'comments': CommentSerializer(comments.order_by('pk'), many=True, context=context).data,
+            'deleted': deleted,
+        }
@@ -1,3 +1,1496 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import tempfile
+from datetime import timedelta
+from unittest import mock, skipUnless
+from decimal import Decimal
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command, CommandError
+from django.db import OperationalError, connection, transaction
+from django.db.models import Sum
+from django.test import AsyncClient, Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import analytics
+from .authentication import user_cache
+from .caching import get_cache
+from .db import write_with_retry
+from .importers import WorkImporter
+from .metrics import registry
+from .management.commands.benchmark_api import endpoints
+from .pagination import WorkItemPagination, WorkPagination
+from .models import (
+    User, Work, WorkItem, Facility, Payment, Comment, WorkCostRollup, DeletedRecord, ContractorScorecard,
+    ContractorScorecardSnapshot,
+)
+from .rollups import cost_report, find_drift, live_cost_report
+from .scorecards import find_drift as find_scorecard_drift, update_percentile_ranks
+from .querysets import work_queryset
+from .seeding import EMAIL_DOMAIN, Scale, clear_seed_data, seed
+from .serializers import WorkSerializer
+
+
+class QueryCountMixin:
+    """Assertions for catching N+1 queries on list endpoints."""
+
+    def count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(ctx.captured_queries)
+
+    def assertQueryCountConstant(self, client, url, add_rows, sizes=(1, 5)):
+        """
+        Fail if the number of queries for ``url`` grows with the number of rows.
+
+        ``add_rows(n)`` must add ``n`` more rows that ``url`` will return.
+        """
+        counts = []
+        for size in sizes:
+            add_rows(size)
+            counts.append(self.count_queries(client, url))
+        if len(set(counts)) > 1:
+            self.fail(f'Query count for {url} grows with row count: '
+                      f'{dict(zip(sizes, counts))} (rows added per step -> queries)')
+
+
+class WorkFixturesMixin:
+    def create_user(self, role, name=None, idNum=None):
+        name = name or role.lower()
+        return User.objects.create_user(
+            email=f'{name}@example.com', username=name, password='secret', role=role,
+            first_name=name, last_name='user', phone_number='050', idNum=idNum or name,
+        )
+
+    def create_work(self, contractor, manager, facility=None, items=0, **kwargs):
+        if facility is None:
+            facility, _ = Facility.objects.get_or_create(
+                facility_number=1, defaults={'name': 'Main', 'description': 'Main facility'})
+        now = timezone.now()
+        fields = {
+            'work_number': f'W-{Work.objects.count() + 1}',
+            'project': 'P',
+            'classification': 'FAULT',
+            'start_date': now - timedelta(days=10),
+            'due_end_date': now + timedelta(days=10),
+            'status': 'IN_PROGRESS',
+            'location_name': 'Site',
+        }
+        fields.update(kwargs)
+        work = Work.objects.create(contractor=contractor, manager=manager, facility=facility, **fields)
+        for section in range(items):
+            WorkItem.objects.create(
+                work=work, section=section, description='d', contract_amount=Decimal('10.00'),
+                actual_amount=Decimal('8.00'), unit_cost=Decimal('2.50'), status='PENDING', work_type='t')
+        return work
+
+
+class ListQueryCountTests(QueryCountMixin, WorkFixturesMixin, TestCase):
+    def setUp(self):
+        self.admin = self.create_user('SUPER_ADMIN')
+        self.manager = self.create_user('MANAGER')
+        self.contractor = self.create_user('CONTRACTOR')
+        self.client = APIClient()
+
+    def add_works(self, count):
+        for _ in range(count):
+            self.create_work(self.contractor, self.manager, items=2)
+
+    def test_work_list(self):
+        for user in (self.admin, self.manager, self.contractor):
+            self.client.force_authenticate(user)
+            self.assertQueryCountConstant(self.client, '/works/', self.add_works)
+
+    def test_work_item_list(self):
+        self.client.force_authenticate(self.contractor)
+        self.assertQueryCountConstant(self.client, '/work-items/', self.add_works)
+
+    def test_comment_list(self):
+        work = self.create_work(self.contractor, self.manager)
+
+        def add_comments(count):
+            for index in range(count):
+                author = self.create_user('MANAGER', name=f'commenter{Comment.objects.count()}')
+                Comment.objects.create(work=work, user=author, text=str(index))
+
+        self.client.force_authenticate(self.manager)
+        self.assertQueryCountConstant(self.client, f'/works/{work.pk}/comments/', add_comments)
+
+
+class KeysetPaginationTests(WorkFixturesMixin, TestCase):
+    def setUp(self):
+        self.manager = self.create_user('MANAGER')
+        contractor = self.create_user('CONTRACTOR')
+        self.works = [self.create_work(contractor, self.manager) for _ in range(5)]
+        # Newest first, the default ordering
+        self.ids = [work.pk for work in reversed(self.works)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def test_next_and_previous_links_walk_the_same_pages(self):
+        first = self.client.get('/works/', {'page_size': 2}).data
+        self.assertEqual(([work['id'] for work in first['results']], first['count']), (self.ids[:2], 5))
+        self.assertIsNone(first['previous'])
+
+        second = self.client.get(first['next']).data
+        self.assertEqual([work['id'] for work in second['results']], self.ids[2:4])
+        back = self.client.get(second['previous']).data
+        self.assertEqual([work['id'] for work in back['results']], self.ids[:2])
+        self.assertIsNone(back['previous'])
+        self.assertEqual(back['next'], first['next'])
+
+        last = self.client.get(second['next']).data
+        self.assertEqual(([work['id'] for work in last['results']], last['next']), (self.ids[4:], None))
+
+    def test_count_can_be_switched_off(self):
+        with CaptureQueriesContext(connection) as counted:
+            self.client.get('/works/', {'page_size': 2})
+        with CaptureQueriesContext(connection) as uncounted:
+            data = self.client.get('/works/', {'page_size': 2, 'count': 'false'}).data
+        self.assertIsNone(data['count'])
+        self.assertEqual(len(uncounted), len(counted) - 1)
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(WorkPagination, 'max_page_size', 3):
+            data = self.client.get('/works/', {'page_size': 10_000}).data
+        self.assertEqual([work['id'] for work in data['results']], self.ids[:3])
+        self.assertEqual(parse_qs(urlparse(data['next']).query)['page_size'], ['3'])
+        # Unusable sizes fall back to the default
+        self.assertEqual(len(self.client.get('/works/', {'page_size': 'abc'}).data['results']), 5)
+
+    def test_plain_lists_stop_at_the_limit_with_a_link_to_the_rest(self):
+        with override_settings(KEYSET_UNPAGINATED_LIMIT=3):
+            response = self.client.get('/works/')
+            self.assertEqual([work['id'] for work in response.data], self.ids[:3])
+            next_url = response['Link'].split(';')[0].strip('<>')
+            rest = self.client.get(next_url).data
+            self.assertEqual([work['id'] for work in rest['results']], self.ids[3:])
+
+            comments = self.client.get(f'/works/{self.works[0].pk}/comments/')
+            self.assertEqual(comments.data, [])
+            self.assertFalse(comments.has_header('Link'))
+
+    def test_invalid_cursors_are_rejected(self):
+        cursor = parse_qs(urlparse(self.client.get('/works/', {'page_size': 2}).data['next']).query)['cursor'][0]
+        for bad in ('not-base64!', 'e30=', cursor):
+            params = {'cursor': bad, 'ordering': 'start_date'} if bad == cursor else {'cursor': bad}
+            response = self.client.get('/works/', params)
+            self.assertEqual(response.status_code, 404, bad)
+            self.assertEqual(response.data['detail'], 'Invalid cursor')
+
+    @skipUnless(connection.vendor == 'sqlite', 'reads the SQLite query plan')
+    def test_item_orderings_walk_an_index(self):
+        for field in WorkItemPagination.ordering_fields:
+            sql, params = WorkItem.objects.order_by(f'-{field}', '-id')[:51].query.sql_with_params()
+            with connection.cursor() as cursor:
+                plan = ' '.join(row[-1] for row in cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall())
+            self.assertIn(f'workitem_{field}_idx', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+
+class CostRollupTests(WorkFixturesMixin, TestCase):
+    def setUp(self):
+        self.manager = self.create_user('MANAGER')
+        self.contractor = self.create_user('CONTRACTOR')
+
+    def assertRollupsMatchLive(self):
+        works = Work.objects.all()
+        self.assertEqual(cost_report(works), live_cost_report(works))
+
+    def test_rollups_follow_item_and_status_changes(self):
+        active = self.create_work(self.contractor, self.manager, items=3)
+        paid = self.create_work(self.contractor, self.manager, items=2, status='PAID')
+        self.assertRollupsMatchLive()
+
+        item = active.items.first()
+        item.actual_amount = Decimal('25.00')
+        item.save()
+        paid.items.first().delete()
+        self.assertRollupsMatchLive()
+
+        active.status = 'PAID'
+        active.save()
+        self.assertRollupsMatchLive()
+        self.assertEqual(WorkCostRollup.objects.get(work=active).status, 'PAID')
+
+        paid.delete()
+        self.assertFalse(WorkCostRollup.objects.filter(work_id=paid.pk).exists())
+        self.assertRollupsMatchLive()
+
+    def test_moving_an_item_refreshes_both_works(self):
+        source = self.create_work(self.contractor, self.manager, items=2)
+        target = self.create_work(self.contractor, self.manager, items=1)
+        client = APIClient()
+        client.force_authenticate(self.manager)
+        item = source.items.first()
+        response = client.patch(f'/work-items/{item.pk}/', {'work': target.pk})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(WorkCostRollup.objects.get(work=source).contract_total, Decimal('10.00'))
+        self.assertEqual(WorkCostRollup.objects.get(work=target).contract_total, Decimal('20.00'))
+        self.assertRollupsMatchLive()
+
+    def test_rebuild_command_repairs_drift(self):
+        work = self.create_work(self.contractor, self.manager, items=2)
+        WorkCostRollup.objects.filter(work=work).update(contract_total=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_cost_rollups', '--verify-only', stdout=io.StringIO())
+        call_command('rebuild_cost_rollups', stdout=io.StringIO())
+        self.assertRollupsMatchLive()
+
+
+class CascadeDeleteTests(WorkFixturesMixin, TestCase):
+    def setUp(self):
+        self.admin = self.create_user('SUPER_ADMIN')
+        self.manager = self.create_user('MANAGER')
+        self.contractor = self.create_user('CONTRACTOR')
+        other = self.create_user('CONTRACTOR', name='other')
+        self.facility = Facility.objects.create(facility_number=2, name='Annex', description='d')
+        self.work = self.create_work(self.contractor, self.manager, facility=self.facility, items=2)
+        self.kept = self.create_work(other, self.manager, items=1)
+        for work in (self.work, self.kept):
+            Payment.objects.create(work=work, payment_date=timezone.now().date(), amount_paid=Decimal('5.00'))
+            Comment.objects.create(work=work, user=self.manager, text='c')
+        # Goes with its author, on a work that stays
+        self.comment = Comment.objects.create(work=self.kept, user=self.contractor, text='c')
+        DeletedRecord.objects.all().delete()
+
+    def assertDeletedCleanly(self, tombstones):
+        connection.check_constraints()
+        self.assertFalse(Work.objects.filter(pk=self.work.pk).exists())
+        self.assertFalse(WorkCostRollup.objects.filter(work_id=self.work.pk).exists())
+        self.assertEqual(find_drift(Work.objects.all()), {})
+        self.assertEqual(find_scorecard_drift(), {})
+        self.assertEqual(set(DeletedRecord.objects.values_list('kind', 'object_id')), tombstones)
+
+    def test_facility_delete(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        self.assertEqual(client.delete(f'/facilities/{self.facility.pk}/').status_code, 204)
+        self.assertDeletedCleanly({('work', self.work.pk)})
+        self.assertEqual(self.contractor.scorecard_history.count(), 1)
+
+    def test_contractor_delete(self):
+        self.contractor.delete()
+        self.assertDeletedCleanly({('work', self.work.pk), ('comment', self.comment.pk)})
+        self.assertFalse(ContractorScorecardSnapshot.objects.filter(contractor_id=self.contractor.pk).exists())
+
+    def test_manager_delete(self):
+        self.manager.delete()
+        connection.check_constraints()
+        self.assertFalse(Work.objects.exists())
+        self.assertFalse(ContractorScorecard.objects.exists())
+
+
+class BatchReportTests(WorkFixturesMixin, TestCase):
+    def setUp(self):
+        self.admin = self.create_user('SUPER_ADMIN')
+        self.manager = self.create_user('MANAGER')
+        self.contractor = self.create_user('CONTRACTOR')
+        self.create_work(self.contractor, self.manager, items=2, quality_score=8, time_score=7, cost_score=9)
+        self.create_work(self.contractor, self.manager, items=1, status='PAID')
+        self.create_work(self.admin, self.manager, classification='UPGRADE', due_end_date=timezone.now())
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_batch_matches_single_reports(self):
+        types = ['cost', 'time', 'facility_faults', 'contractors', 'contractorsWorst', 'works']
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/works/reports/batch/', {'types': ','.join(types)})
+        self.assertEqual(response.status_code, 200)
+        # Best and worst contractors are one indexed scorecard query each
+        self.assertLessEqual(len(ctx.captured_queries), 6)
+        for report_type in types:
+            single = self.client.get('/works/reports/', {'type': report_type})
+            self.assertEqual(response.data[report_type], single.data, report_type)
+
+    def test_batch_rejects_unknown_types(self):
+        response = self.client.get('/works/reports/batch/', {'types': 'cost,nope'})
+        self.assertEqual(response.status_code, 400)
+
+
+class RequestMetricsTests(WorkFixturesMixin, TestCase):
+    def setUp(self):
+        registry.reset()
+        self.admin = self.create_user('SUPER_ADMIN')
+        self.manager = self.create_user('MANAGER')
+        self.create_work(self.admin, self.manager, items=1)
+        self.client = APIClient()
+
+    def test_metrics_are_recorded_per_route(self):
+        self.client.force_authenticate(self.manager)
+        self.client.get('/works/')
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{route="work-list",method="GET"} 1', body)
+        self.assertIn('http_request_queries_bucket{route="work-list",method="GET",le="+Inf"} 1', body)
+        self.assertIn('http_responses_total{route="metrics",method="GET",status="4xx"} 1', body)
+
+
+class NestedItemWriteTests(WorkFixturesMixin, TestCase):
+    def setUp(self):
+        self.manager = self.create_user('MANAGER')
+        self.contractor = self.create_user('CONTRACTOR')
+
+    def item_payload(self, section, **overrides):
+        payload = {'section': section, 'description': 'd', 'contract_amount': '10.00', 'actual_amount': '8.00',
+                   'unit_cost': '2.50', 'status': 'PENDING', 'work_type': 't'}
+        payload.update(overrides)
+        return payload
+
+    def update_items(self, work):
+        """Edit half the items, drop the rest and add as many new ones."""
+        items = list(work.items.order_by('pk'))
+        keep = items[:len(items) // 2]
+        payload = [self.item_payload(item.section, id=item.pk, actual_amount='9.00') for item in keep]
+        payload += [self.item_payload(100 + index) for index in range(len(items) - len(keep))]
+        serializer = WorkSerializer(work, data={'items': payload}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        with CaptureQueriesContext(connection) as ctx:
+            serializer.save()
+        return len(ctx.captured_queries), keep
+
+    def test_update_query_count_is_constant(self):
+        counts = []
+        for size in (4, 40):
+            work = self.create_work(self.contractor, self.manager, items=size)
+            count, kept = self.update_items(work)
+            counts.append(count)
+            self.assertEqual(work.items.count(), size)
+            self.assertEqual(work.items.filter(pk__in=[item.pk for item in kept], actual_amount='9.00').count(),
+                             len(kept))
+            self.assertEqual(WorkCostRollup.objects.get(work=work).actual_total, work.items.aggregate(
+                total=Sum('actual_amount'))['total'])
+        self.assertEqual(counts[0], counts[1])
+
+    def test_create_query_count_is_constant(self):
+        # The contractor has a scorecard already, so both creates update it alike
+        self.create_work(self.contractor, self.manager)
+        counts = []
+        for size in (4, 40):
+            data = {
+                'work_number': f'N-{size}', 'project': 'P', 'classification': 'FAULT', 'status': 'PENDING',
+                'start_date': timezone.now(), 'due_end_date': timezone.now(), 'location_name': 'L',
+                'contractor': self.contractor.pk, 'manager': self.manager.pk,
+                'facility': Facility.objects.get_or_create(
+                    facility_number=1, defaults={'name': 'Main', 'description': 'd'})[0].pk,
+                'items': [self.item_payload(section) for section in range(size)],
+            }
+            serializer = WorkSerializer(data=data)
+            serializer.is_valid(raise_exception=True)
+            with CaptureQueriesContext(connection) as ctx:
+                work = serializer.save()
+            counts.append(len(ctx.captured_queries))
+            self.assertEqual(work.items.count(), size)
+        self.assertEqual(counts[0], counts[1])
+
+    def test_patch_without_items_keeps_them(self):
+        work = self.create_work(self.contractor, self.manager, items=3)
+        serializer = WorkSerializer(work, data={'remarks': 'x'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assertEqual(work.items.count(), 3)
+
+
+class WorkImportTests(WorkFixturesMixin, TestCase):
+    HEADER = ('work_number,project,classification,start_date,due_end_date,status,facility_number,'
+              'contractor_idNum,location_name,section,description,contract_amount,actual_amount,unit_cost,'
+              'item_status,work_type\n')
+
+    def setUp(self):
+        self.manager = self.create_user('MANAGER')
+        self.contractor = self.create_user('CONTRACTOR', idNum='123')
+        Facility.objects.create(facility_number=7, name='F7', description='d')
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def upload(self, body, **data):
+        upload = SimpleUploadedFile('works.csv', (self.HEADER + body).encode(), content_type='text/csv')
+        return self.client.post('/works/import/', {'file': upload, **data}, format='multipart')
+
+    def test_import_reports_bad_rows_and_keeps_the_rest(self):
+        response = self.upload(
+            'A-1,P,FAULT,2024-01-01,2024-02-01,PENDING,7,123,Site,1,Wall,10,8,2.5,PENDING,Civil\n'
+            'A-1,,,,,,,,,2,Roof,20,25,1,בביצוע,Civil\n'
+            'A-2,P,FAULT,2024-01-01,2024-02-01,PENDING,99,123,Site,1,Wall,10,8,2.5,PENDING,Civil\n'
+            'A-2,,,,,,,,,2,Roof,20,25,1,PENDING,Civil\n'
+            'A-3,P,NOPE,not-a-date,2024-02-01,PENDING,7,123,Site,1,Wall,10,8,2.5,PENDING,Civil\n'
+            'A-1,,,,,,,,,3,Floor,abc,1,1,PENDING,Civil\n'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created_works'], 1)
+        self.assertEqual(response.data['created_items'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [4, 5, 6, 7])
+        self.assertIn('facility_number', response.data['errors'][0]['errors'])
+        self.assertEqual(set(response.data['errors'][2]['errors']), {'classification', 'start_date'})
+
+        work = Work.objects.get(work_number='A-1')
+        self.assertEqual(work.manager, self.manager)
+        self.assertEqual(work.items.get(section=2).status, 'IN_PROGRESS')
+        self.assertEqual(WorkCostRollup.objects.get(work=work).actual_total, Decimal('33.00'))
+
+    def test_out_of_range_facility_number_is_a_row_error(self):
+        response = self.upload('E-1,P,FAULT,2024-01-01,2024-02-01,PENDING,inf,123,Site,1,W,1,1,1,PENDING,C\n'
+                               'E-2,P,FAULT,2024-01-01,2024-02-01,PENDING,1e999,123,Site,1,W,1,1,1,PENDING,C\n')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([set(error['errors']) for error in response.data['errors']],
+                         [{'facility_number'}, {'facility_number'}])
+
+    def test_works_created_meanwhile_are_reported_per_row(self):
+        save = WorkImporter.save
+
+        def save_after_a_concurrent_import(importer, new_works, items):
+            if not Work.objects.filter(work_number='F-2').exists():
+                self.create_work(self.contractor, self.manager, work_number='F-2')
+            return save(importer, new_works, items)
+
+        with mock.patch.object(WorkImporter, 'save', save_after_a_concurrent_import):
+            response = self.upload(
+                'F-1,P,FAULT,2024-01-01,2024-02-01,PENDING,7,123,Site,1,W,1,1,1,PENDING,C\n'
+                'F-2,P,FAULT,2024-01-01,2024-02-01,PENDING,7,123,Site,1,W,1,1,1,PENDING,C\n'
+                'F-2,,,,,,,,,2,Roof,20,25,1,PENDING,Civil\n'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created_works'], response.data['created_items']), (1, 1))
+        self.assertEqual(response.data['errors'], [
+            {'row': 3, 'errors': {'work_number': ['Work F-2 already exists.']}},
+            {'row': 4, 'errors': {'work_number': ['Work F-2 already exists.']}},
+        ])
+        self.assertFalse(Work.objects.get(work_number='F-2').items.exists())
+
+    def test_dry_run_writes_nothing(self):
+        response = self.upload('B-1,P,FAULT,2024-01-01,2024-02-01,PENDING,7,123,Site,1,W,1,1,1,PENDING,C\n',
+                               dry_run='true')
+        self.assertEqual(response.data['created_works'], 1)
+        self.assertFalse(Work.objects.exists())
+
+
+class ExportTests(WorkFixturesMixin, TestCase):
+    def setUp(self):
+        self.manager = self.create_user('MANAGER')
+        self.other_manager = self.create_user('MANAGER', name='other')
+        self.contractor = self.create_user('CONTRACTOR')
+        self.work = self.create_work(self.contractor, self.manager, items=2, quality_score=8, time_score=6)
+        self.create_work(self.contractor, self.manager)
+        self.hidden = self.create_work(self.contractor, self.other_manager, items=1)
+        Payment.objects.create(work=self.work, payment_date=timezone.now().date(), amount_paid=Decimal('5.00'))
+        Payment.objects.create(work=self.hidden, payment_date=timezone.now().date(), amount_paid=Decimal('7.00'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def test_works_csv_is_role_scoped_with_computed_columns(self):
+        response = self.client.get('/works/export/')
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 3)  # two item rows and one row for the work without items
+        self.assertEqual({row['work_number'] for row in rows}, {self.work.work_number, 'W-2'})
+        first = rows[0]
+        self.assertEqual(first['total_section_cost'], str(Decimal('8.00') * Decimal('2.50')))
+        self.assertEqual(float(first['average_score']), self.work.average_score)
+        self.assertEqual(int(first['days_in_work']), self.work.days_in_work)
+
+    def test_payments_ndjson(self):
+        response = self.client.get('/payments/export/', {'file_format': 'ndjson'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['work_number'] for line in lines], [self.work.work_number])
+
+
+class ConditionalGetTests(WorkFixturesMixin, TestCase):
+    def setUp(self):
+        self.manager = self.create_user('MANAGER')
+        self.contractor = self.create_user('CONTRACTOR')
+        # Half a day off the current time of day, so days_in_work doesn't roll over between requests
+        self.work = self.create_work(self.contractor, self.manager, items=2,
+                                     start_date=timezone.now() - timedelta(days=10, hours=12))
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def test_unchanged_list_is_not_modified(self):
+        response = self.client.get('/works/')
+        etag = response['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/works/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertLessEqual(len(queries), 2)  # the two aggregates, nothing serialized
+
+    def test_item_changes_and_deletes_change_the_etag(self):
+        etag = self.client.get('/works/')['ETag']
+        item = self.work.items.first()
+        item.description = 'changed'
+        item.save()
+        response = self.client.get('/works/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        WorkItem.objects.filter(pk=item.pk).delete()
+        self.assertNotEqual(self.client.get('/works/', HTTP_IF_NONE_MATCH=etag)['ETag'], etag)
+
+    def test_detail_if_modified_since(self):
+        url = f'/works/{self.work.pk}/'
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        other = self.create_user('MANAGER', name='other')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 404)
+
+    def test_days_in_work_rollover_changes_the_validators(self):
+        url = f'/works/{self.work.pk}/'
+        start = timezone.now().replace(microsecond=0) - timedelta(days=5)
+        Work.objects.filter(pk=self.work.pk).update(start_date=start, updated_at=start)
+        WorkItem.objects.update(updated_at=start)
+        Facility.objects.update(updated_at=start)
+
+        def get(at, **headers):
+            with mock.patch('django.utils.timezone.now', return_value=at):
+                return self.client.get(url, **headers)
+
+        before = get(start + timedelta(days=3, seconds=-10))
+        after = get(start + timedelta(days=3, seconds=10))
+        self.assertEqual((before.data['days_in_work'], after.data['days_in_work']), (3, 4))
+        self.assertNotEqual(before['ETag'], after['ETag'])
+        self.assertEqual(get(start + timedelta(days=3, hours=5), HTTP_IF_NONE_MATCH=after['ETag']).status_code, 304)
+
+        # If-Modified-Since alone: the row hasn't changed since, but its day count has
+        response = get(start + timedelta(days=3, seconds=10), HTTP_IF_MODIFIED_SINCE=before['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Last-Modified'], http_date((start + timedelta(days=3, seconds=1)).timestamp()))
+
+    def test_facility_rename_changes_the_work_etag(self):
+        etag = self.client.get('/works/')['ETag']
+        self.work.facility.name = 'Renamed'
+        self.work.facility.save()
+        response = self.client.get('/works/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['facility_name'], 'Renamed')
+
+    def test_facility_list(self):
+        response = self.client.get('/facilities/')
+        self.assertEqual(self.client.get('/facilities/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        Facility.objects.create(name='new', description='', facility_number=12345)
+        self.assertEqual(self.client.get('/facilities/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+
+class DropdownCacheTests(WorkFixturesMixin, TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.manager = self.create_user('MANAGER')
+        self.contractor = self.create_user('CONTRACTOR')
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def get_contractors(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/user-roles/contractors_for_dropdown/')
+        return [row['username'] for row in response.data], len(queries)
+
+    def test_served_from_cache_until_a_role_changes(self):
+        self.assertEqual(self.get_contractors(), (['contractor'], 1))
+        self.assertEqual(self.get_contractors(), (['contractor'], 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contractor.role = 'CONTRACTOR_VIEWER'
+            self.contractor.save()
+        self.assertEqual(self.get_contractors(), ([], 1))
+
+    def test_unrelated_saves_keep_the_cache(self):
+        self.get_contractors()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.contractor.last_login = timezone.now()
+            self.contractor.save(update_fields=['last_login'])
+            self.contractor.phone_number = '052'
+            self.contractor.save()
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.get_contractors()[1], 0)
+
+    def test_status_choices_are_cached_per_role(self):
+        manager_statuses = self.client.get('/works/work_statuses/').data
+        self.client.force_authenticate(self.create_user('PAYMENT_ADMIN'))
+        payment_statuses = self.client.get('/works/work_statuses/').data
+        self.assertEqual([s['code'] for s in manager_statuses if s['chosable']], ['PENDING', 'IN_PROGRESS'])
+        self.assertEqual([s['code'] for s in payment_statuses if s['chosable']], ['WAITING_PAYMENT', 'PAID'])
+
+
+class SyncTests(WorkFixturesMixin, TestCase):
+    def setUp(self):
+        self.manager = self.create_user('MANAGER')
+        self.other_manager = self.create_user('MANAGER', name='other')
+        self.contractor = self.create_user('CONTRACTOR')
+        self.work = self.create_work(self.contractor, self.manager, items=3)
+        self.hidden = self.create_work(self.contractor, self.other_manager, items=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def sync(self, **params):
+        response = self.client.get('/works/sync/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def test_full_then_delta(self):
+        first = self.sync()
+        self.assertTrue(first['full'])
+        self.assertEqual([work['id'] for work in first['works']], [self.work.pk])
+
+        since = timezone.now().isoformat()
+        self.assertEqual(self.sync(since=since)['works'], [])
+
+        item = self.work.items.first()
+        item.description = 'changed'
+        item.save()
+        delta = self.sync(since=since)
+        self.assertFalse(delta['full'])
+        self.assertEqual(delta['works'], [])
+        self.assertEqual([row['id'] for row in delta['items']], [item.pk])
+
+    def test_deletes_are_reported_as_tombstones_in_scope(self):
+        token = self.sync()['token']
+        removed = list(self.work.items.values_list('pk', flat=True)[:2])
+        response = self.client.patch(f'/works/{self.work.pk}/', {'items': [
+            {'id': pk, 'section': 0, 'description': 'd', 'contract_amount': '10.00', 'actual_amount': '8.00',
+             'unit_cost': '2.50', 'status': 'PENDING', 'work_type': 't'}
+            for pk in self.work.items.exclude(pk__in=removed).values_list('pk', flat=True)
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.hidden.delete()
+
+        delta = self.sync(token=token)
+        self.assertEqual(sorted(delta['deleted']['item']), sorted(removed))
+        self.assertEqual(delta['deleted']['work'], [])  # the other manager's work
+
+        work_id = self.work.pk
+        self.client.delete(f'/works/{work_id}/')
+        delta = self.sync(token=token)
+        self.assertEqual(delta['deleted']['work'], [work_id])
+        self.assertEqual(DeletedRecord.objects.filter(work_id=work_id, kind='item').count(), 2)
+
+    def test_bad_token(self):
+        self.assertEqual(self.client.get('/works/sync/', {'token': 'nope'}).status_code, 400)
+        self.client.force_authenticate(self.other_manager)
+        token = self.sync()['token']
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.client.get('/works/sync/', {'token': token}).status_code, 400)
+
+
+class AsyncViewTests(WorkFixturesMixin, TransactionTestCase):
+    """The async (ASGI) endpoints return the same payloads as the DRF views."""
+
+    def setUp(self):
+        self.manager = self.create_user('MANAGER')
+        self.contractor = self.create_user('CONTRACTOR')
+        self.work = self.create_work(self.contractor, self.manager, items=3, quality_score=7)
+        self.create_work(self.contractor, self.create_user('MANAGER', name='other'), items=1)
+        Comment.objects.create(work=self.work, user=self.manager, text='hello')
+
+    def assertSamePayloads(self, user, paths):
+        sync_client = Client()
+        sync_client.force_login(user)
+        async_client = AsyncClient()
+        async_client.force_login(user)
+        for path in paths:
+            expected = sync_client.get(path)
+            actual = async_to_sync(async_client.get)(f'/async{path}')
+            self.assertEqual(actual.status_code, expected.status_code, path)
+            self.assertEqual(json.loads(actual.content), json.loads(expected.content), path)
+
+    def test_payloads_match_the_sync_views(self):
+        self.assertSamePayloads(self.manager, [
+            '/works/',
+            '/works/?page_size=1',
+            f'/works/{self.work.pk}/',
+            f'/works/{self.work.pk}/comments/',
+            '/works/reports/?type=cost',
+            '/works/reports/?type=contractors',
+            '/works/reports/?type=nope',
+        ])
+        self.assertSamePayloads(self.contractor, ['/works/', '/works/reports/?type=time'])
+
+    def test_requires_authentication(self):
+        response = async_to_sync(AsyncClient().get)('/async/works/')
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class JobTests(WorkFixturesMixin, TestCase):
+    def setUp(self):
+        self.engineer = self.create_user('GENERAL_ENGINEER')
+        self.manager = self.create_user('MANAGER')
+        self.contractor = self.create_user('CONTRACTOR')
+        self.create_work(self.contractor, self.manager, items=2, status='IN_PROGRESS')
+        self.create_work(self.contractor, self.create_user('MANAGER', name='other'), items=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.engineer)
+
+    def run_worker(self):
+        call_command('run_jobs', inline=True, once=True, stdout=io.StringIO())
+
+    def download(self, job_id):
+        response = self.client.get(f'/jobs/{job_id}/download/')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_report_job_matches_the_report_endpoint(self):
+        response = self.client.post('/jobs/', {'kind': 'report', 'params': {'types': 'cost,time'}}, format='json')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.data['id']
+        self.assertEqual(self.client.get(f'/jobs/{job_id}/download/').status_code, 409)
+
+        self.run_worker()
+        job = self.client.get(f'/jobs/{job_id}/').data
+        self.assertEqual(job['status'], 'DONE')
+        expected = self.client.get('/works/reports/batch/', {'types': 'cost,time'})
+        self.assertEqual(json.loads(self.download(job_id)), json.loads(expected.content))
+
+    def test_identical_requests_reuse_the_result_within_scope(self):
+        payload = {'kind': 'export_works', 'params': {'file_format': 'csv'}}
+        first = self.client.post('/jobs/', payload, format='json').data
+        self.run_worker()
+
+        self.client.force_authenticate(self.create_user('SUPER_ADMIN'))
+        response = self.client.post('/jobs/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['cached'])
+        self.assertEqual(response.data['status'], 'DONE')
+        rows = list(csv.DictReader(io.StringIO(self.download(response.data['id']).decode())))
+        self.assertEqual(len(rows), 3)
+
+        # A manager sees other works, so the result is not shared
+        self.client.force_authenticate(self.manager)
+        response = self.client.post('/jobs/', payload, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertNotEqual(response.data['id'], first['id'])
+
+    def test_invalid_requests_are_rejected_at_submit(self):
+        for payload in ({'kind': 'nope'}, {'kind': 'report', 'params': {'type': 'nope'}},
+                        {'kind': 'export_works', 'params': {'file_format': 'xml'}}):
+            self.assertEqual(self.client.post('/jobs/', payload, format='json').status_code, 400, payload)
+
+
+class WorkTotalsTests(WorkFixturesMixin, TestCase):
+    def setUp(self):
+        self.manager = self.create_user('MANAGER')
+        self.contractor = self.create_user('CONTRACTOR')
+        self.work = self.create_work(self.contractor, self.manager, items=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def assertTotals(self, work, **expected):
+        work = Work.objects.get(pk=work.pk)
+        self.assertEqual({name: getattr(work, name) for name in expected}, expected)
+
+    def test_item_endpoint_changes_update_the_totals(self):
+        self.assertTotals(self.work, contract_total=Decimal('20.00'), total_cost=Decimal('40.0000'), item_count=2,
+                          item_status_counts={'PENDING': 2})
+        item = self.work.items.first()
+        response = self.client.patch(f'/work-items/{item.pk}/', {'status': 'COMPLETED', 'actual_amount': '10.00'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTotals(self.work, actual_total=Decimal('18.00'), total_cost=Decimal('45.0000'),
+                          item_status_counts={'PENDING': 1, 'COMPLETED': 1})
+
+        self.client.delete(f'/work-items/{item.pk}/')
+        self.assertTotals(self.work, contract_total=Decimal('10.00'), item_count=1)
+
+    def test_saving_a_stale_instance_keeps_the_totals(self):
+        stale = Work.objects.get(pk=self.work.pk)
+        WorkItem.objects.filter(work=self.work).first().delete()
+        stale.remarks = 'edited'
+        stale.save()
+        self.assertTotals(self.work, item_count=1, remarks='edited')
+
+    def test_moving_an_item_updates_both_works(self):
+        target = self.create_work(self.contractor, self.manager, items=1)
+        item = self.work.items.first()
+        response = self.client.patch(f'/work-items/{item.pk}/', {'work': target.pk})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTotals(self.work, contract_total=Decimal('10.00'), item_count=1)
+        self.assertTotals(target, contract_total=Decimal('20.00'), item_count=2)
+        self.assertEqual(find_drift(Work.objects.all()), {})
+
+    def test_filter_and_sort_by_budget(self):
+        big = self.create_work(self.contractor, self.manager, items=5)
+        response = self.client.get('/works/', {'budget_min': '30'})
+        self.assertEqual([work['id'] for work in response.data], [big.pk])
+        response = self.client.get('/works/', {'ordering': 'contract_total', 'page_size': 1})
+        self.assertEqual(response.data['results'][0]['id'], self.work.pk)
+        self.assertEqual(self.client.get(response.data['next']).data['results'][0]['id'], big.pk)
+
+    def test_rebuild_repairs_drift(self):
+        Work.objects.filter(pk=self.work.pk).update(item_count=7)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_cost_rollups', verify_only=True, stdout=io.StringIO())
+        call_command('rebuild_cost_rollups', stdout=io.StringIO())
+        self.assertTotals(self.work, item_count=2)
+
+
+class ScorecardTests(WorkFixturesMixin, TestCase):
+    def setUp(self):
+        self.admin = self.create_user('SUPER_ADMIN')
+        self.manager = self.create_user('MANAGER')
+        self.good = self.create_user('CONTRACTOR', 'good')
+        self.partial = self.create_user('CONTRACTOR', 'partial')
+        self.unscored = self.create_user('CONTRACTOR', 'unscored')
+        now = timezone.now()
+        self.create_work(self.good, self.manager, quality_score=9, time_score=9, cost_score=9,
+                         end_date=now, due_end_date=now + timedelta(days=1))
+        # A missing score is skipped, as in Work.average_score: this work scores 4, not NULL
+        self.create_work(self.partial, self.manager, quality_score=4, time_score=None, cost_score=None,
+                         end_date=now, due_end_date=now - timedelta(days=1))
+        self.create_work(self.unscored, self.manager, items=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def scorecard(self, contractor):
+        return ContractorScorecard.objects.get(pk=contractor.pk)
+
+    def test_missing_scores_follow_average_score(self):
+        card = self.scorecard(self.partial)
+        self.assertEqual((card.overall_avg, card.avg_time, card.scored_count), (4.0, None, 1))
+        self.assertEqual(card.on_time_ratio, 0.0)
+        self.assertIsNone(self.scorecard(self.unscored).overall_avg)
+        self.assertEqual(self.scorecard(self.good).on_time_ratio, 1.0)
+
+        response = self.client.get('/works/reports/', {'type': 'contractorsWorst'})
+        # Contractors without scores come last in both lists
+        self.assertEqual([row['contractor__username'] for row in response.data], ['partial', 'good', 'unscored'])
+
+    def test_refreshed_on_score_and_contractor_changes(self):
+        work = Work.objects.get(contractor=self.partial)
+        work.time_score = 8
+        work.save()
+        self.assertEqual(self.scorecard(self.partial).overall_avg, 6.0)
+        self.assertEqual(self.scorecard(self.good).percentile_rank, 50.0)
+
+        work.contractor = self.good
+        work.save()
+        self.assertFalse(ContractorScorecard.objects.filter(pk=self.partial.pk).exists())
+        self.assertEqual((self.scorecard(self.good).work_count, self.scorecard(self.good).overall_avg), (2, 7.5))
+        self.assertEqual(self.good.scorecard_history.get().overall_avg, 7.5)
+
+    def test_overrun_follows_item_totals(self):
+        item = WorkItem.objects.get(work__contractor=self.unscored)
+        self.assertEqual(self.scorecard(self.unscored).overrun_ratio, 0.0)
+        item.actual_amount = Decimal('12.00')
+        item.save()
+        self.assertEqual(self.scorecard(self.unscored).overrun_ratio, 1.0)
+
+    def test_item_edits_write_only_changed_scorecards(self):
+        item = WorkItem.objects.get(work__contractor=self.unscored)
+        with mock.patch('backend.scorecards.update_percentile_ranks', wraps=update_percentile_ranks) as rerank, \
+                CaptureQueriesContext(connection) as ctx:
+            item.description = 'no total changes'
+            item.save()
+            item.actual_amount = Decimal('12.00')  # moves the overrun ratio, not the averages ranks come from
+            item.save()
+        rerank.assert_not_called()
+        writes = [query['sql'] for query in ctx.captured_queries
+                  if 'backend_contractorscorecard' in query['sql'] and not query['sql'].startswith('SELECT')]
+        self.assertEqual(len(writes), 2)  # the unscored contractor's scorecard and snapshot, by the second save
+        self.assertEqual(self.unscored.scorecard_history.get().overrun_ratio, 1.0)
+
+        work = Work.objects.get(contractor=self.partial)
+        work.time_score = 8
+        with mock.patch('backend.scorecards.update_percentile_ranks', wraps=update_percentile_ranks) as rerank:
+            work.save()
+        rerank.assert_called_once()
+
+    def test_reports_match_the_live_aggregation(self):
+        params = {'types': 'contractors,contractorsWorst'}
+        from_scorecards = self.client.get('/works/reports/batch/', params).data
+        # A filter the scorecards don't cover falls back to aggregating the works
+        live = self.client.get('/works/reports/batch/', {**params, 'classification': 'FAULT'}).data
+        self.assertEqual(from_scorecards, live)
+
+    def test_contractors_see_their_own_scorecard(self):
+        self.client.force_authenticate(self.good)
+        response = self.client.get('/scorecards/')
+        self.assertEqual([row['contractor'] for row in response.data], [self.good.pk])
+        self.assertEqual(self.client.get(f'/scorecards/{self.partial.pk}/history/').status_code, 404)
+        response = self.client.get(f'/scorecards/{self.good.pk}/history/')
+        self.assertEqual(len(response.data), 1)
+
+    def test_rebuild_repairs_drift(self):
+        ContractorScorecard.objects.filter(pk=self.good.pk).update(overall_avg=1)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_scorecards', verify_only=True, stdout=io.StringIO())
+        call_command('rebuild_scorecards', stdout=io.StringIO())
+        self.assertEqual(self.scorecard(self.good).overall_avg, 9.0)
+
+
+@skipUnless(analytics.np is not None, 'numpy is not installed')
+class ForecastReportTests(WorkFixturesMixin, TestCase):
+    def setUp(self):
+        self.admin = self.create_user('SUPER_ADMIN')
+        self.manager = self.create_user('MANAGER')
+        self.contractor = self.create_user('CONTRACTOR')
+        now = timezone.now()
+        # Finished in 21 days against 11 planned, 2 items of 10 contracted / 8 actual
+        self.finished = self.create_work(
+            self.contractor, self.manager, items=2, start_date=now - timedelta(days=30),
+            due_end_date=now - timedelta(days=20), end_date=now - timedelta(days=10), completion_percentage=100)
+        # Half done after 10 days with 8 spent: ends in 10 days at 16
+        self.running = self.create_work(
+            self.contractor, self.manager, items=1, classification='UPGRADE', completion_percentage=50,
+            start_date=now - timedelta(days=10), due_end_date=now + timedelta(days=5))
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_forecast_figures(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/works/reports/', {'type': 'forecast'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([query for query in ctx.captured_queries if 'backend_work' in query['sql']]), 1)
+        data = response.data
+
+        self.assertEqual(data['duration']['finished_works'], 1)
+        self.assertEqual(data['duration']['mean_days'], self.finished.days_in_work)
+        self.assertEqual(data['duration']['late_share'], 1.0)
+        self.assertEqual(data['cost_overrun']['p50'], -0.2)
+        self.assertEqual(data['cost_overrun']['histogram'][2]['works'], 2)  # -0.2 to -0.1
+
+        portfolio = data['portfolio']
+        self.assertEqual((portfolio['works'], portfolio['open_works']), (2, 1))
+        self.assertEqual(portfolio['projected_final_cost'], 32.0)
+        self.assertEqual(portfolio['projected_overrun'], 2.0)
+        self.assertEqual(portfolio['projected_late_works'], 1)
+
+        upgrade = next(row for row in data['by_classification'] if row['classification'] == 'UPGRADE')
+        self.assertEqual((upgrade['works'], upgrade['mean_burn_rate']), (1, 5.0))
+        self.assertEqual(upgrade['latest_projected_end'], timezone.localdate(timezone.now() + timedelta(days=10)))
+
+    def test_forecast_honours_report_filters(self):
+        response = self.client.get('/works/reports/', {'type': 'forecast', 'classification': 'FAULT'})
+        self.assertEqual(response.data['portfolio']['works'], 1)
+        self.assertEqual(response.data['by_classification'][0]['classification'], 'FAULT')
+
+
+class WorkListRepresentationTests(WorkFixturesMixin, TestCase):
+    def setUp(self):
+        self.admin = self.create_user('SUPER_ADMIN')
+        self.manager = self.create_user('MANAGER')
+        self.contractor = self.create_user('CONTRACTOR')
+        self.create_work(self.contractor, self.manager, items=3, quality_score=7, time_score=None, cost_score=4,
+                         end_date=timezone.now(), remarks='שלום')
+        work = self.create_work(self.contractor, self.manager, items=2, classification='UPGRADE', status='PAID')
+        WorkItem.objects.filter(work=work).update(status='QUALITY_CONTROL', actual_amount=Decimal('1234.56'))
+        self.create_work(self.contractor, self.manager)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def serialized(self, works):
+        return JSONRenderer().render(WorkSerializer(works, many=True).data)
+
+    def test_list_matches_the_serializer_byte_for_byte(self):
+        response = self.client.get('/works/')
+        # Plain lists come in the pagination's default order too
+        works = work_queryset(self.admin, {}, WorkSerializer).order_by('-updated_at', '-pk')
+        self.assertEqual(response.content, self.serialized(works))
+
+    def test_pages_match_the_serializer(self):
+        url, ids = '/works/?page_size=2&ordering=start_date', []
+        while url:
+            data = self.client.get(url).data
+            works = {work.pk: work for work in Work.objects.filter(pk__in=[row['id'] for row in data['results']])}
+            expected = self.serialized([works[row['id']] for row in data['results']])
+            self.assertEqual(JSONRenderer().render(data['results']), expected)
+            ids += [row['id'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(sorted(ids), sorted(Work.objects.values_list('pk', flat=True)))
+
+
+class SparseFieldsTests(WorkFixturesMixin, TestCase):
+    def setUp(self):
+        self.manager = self.create_user('MANAGER')
+        self.contractor = self.create_user('CONTRACTOR')
+        self.work = self.create_work(self.contractor, self.manager, items=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def test_fields_narrow_the_list_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/works/', {'fields': 'id,work_number,status_display,contractor_name'})
+        self.assertEqual(list(response.data[0]), ['id', 'status_display', 'contractor_name', 'work_number'])
+        self.assertEqual(response.data[0]['status_display'], self.work.get_status_display())
+        self.assertFalse([query for query in ctx.captured_queries if 'backend_workitem' in query['sql']])
+        list_query = ctx.captured_queries[-1]['sql']
+        self.assertNotIn('"remarks"', list_query)
+        self.assertNotIn('"backend_facility"', list_query)
+
+    def test_omit_and_expand_items(self):
+        response = self.client.get('/works/', {'omit': 'items'})
+        self.assertNotIn('items', response.data[0])
+        self.assertIn('remarks', response.data[0])
+        response = self.client.get('/works/', {'fields': 'id', 'expand': 'items'})
+        self.assertEqual(list(response.data[0]), ['id', 'items'])
+        self.assertEqual(len(response.data[0]['items']), 2)
+
+    def test_matches_the_serializer_with_the_same_fields(self):
+        fields = ('id', 'items', 'average_score', 'facility_name', 'start_date', 'contract_total', 'contractor')
+        response = self.client.get('/works/', {'fields': ','.join(fields)})
+        expected = WorkSerializer(work_queryset(self.manager, {}, WorkSerializer), many=True, fields=fields).data
+        self.assertEqual(response.content, JSONRenderer().render(expected))
+
+    def test_detail_and_work_items(self):
+        response = self.client.get(f'/works/{self.work.pk}/', {'fields': 'id,days_in_work'})
+        self.assertEqual(response.data, {'id': self.work.pk, 'days_in_work': float(self.work.days_in_work)})
+        response = self.client.get('/work-items/', {'omit': 'description,work'})
+        self.assertNotIn('description', response.data[0])
+        self.assertIn('total_section_cost', response.data[0])
+
+    def test_unknown_fields_are_rejected(self):
+        self.assertEqual(self.client.get('/works/', {'fields': 'id,nope'}).status_code, 400)
+        self.assertEqual(self.client.get('/work-items/', {'expand': 'items'}).status_code, 400)
+
+
+class FilterTests(WorkFixturesMixin, TestCase):
+    def setUp(self):
+        self.admin = self.create_user('SUPER_ADMIN')
+        self.manager = self.create_user('MANAGER')
+        self.contractor = self.create_user('CONTRACTOR')
+        self.other = self.create_user('CONTRACTOR', 'other')
+        north = Facility.objects.create(name='North', description='n', facility_number=2)
+        now = timezone.now()
+        self.overdue = self.create_work(self.contractor, self.manager, items=2, project='Roof repair',
+                                        due_end_date=now - timedelta(days=1))
+        self.upgrade = self.create_work(self.other, self.manager, facility=north, classification='UPGRADE',
+                                        location_name='North gate', start_date=now - timedelta(days=40))
+        WorkItem.objects.filter(work=self.overdue).update(status='COMPLETED')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def ids(self, url, params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return sorted(row['id'] for row in response.data)
+
+    def test_work_filters(self):
+        overdue, upgrade = [self.overdue.pk], [self.upgrade.pk]
+        self.assertEqual(self.ids('/works/', {'facility': self.upgrade.facility_id}), upgrade)
+        self.assertEqual(self.ids('/works/', {'contractor': self.contractor.pk}), overdue)
+        self.assertEqual(self.ids('/works/', {'classification': 'UPGRADE'}), upgrade)
+        self.assertEqual(self.ids('/works/', {'overdue': 'true'}), overdue)
+        self.assertEqual(self.ids('/works/', {'overdue': 'false'}), upgrade)
+        self.assertEqual(self.ids('/works/', {'search': 'roof'}), overdue)
+        self.assertEqual(self.ids('/works/', {'search': 'GATE'}), upgrade)
+        start = (timezone.now() - timedelta(days=50)).date().isoformat()
+        end = (timezone.now() - timedelta(days=30)).date().isoformat()
+        self.assertEqual(self.ids('/works/', {'start_date_after': start, 'start_date_before': end}), upgrade)
+
+    def test_item_status_uses_exists(self):
+        with CaptureQueriesContext(connection) as ctx:
+            ids = self.ids('/works/', {'item_status': 'COMPLETED'})
+        self.assertEqual(ids, [self.overdue.pk])
+        list_query = ctx.captured_queries[-2]['sql']  # before the items query
+        self.assertIn('EXISTS', list_query)
+        self.assertNotIn('DISTINCT', list_query)
+
+    def test_ordering_and_invalid_values(self):
+        response = self.client.get('/works/', {'ordering': '-start_date'})
+        self.assertEqual([row['id'] for row in response.data], [self.overdue.pk, self.upgrade.pk])
+        self.assertEqual(self.client.get('/works/', {'ordering': 'remarks'}).status_code, 400)
+        self.assertEqual(self.client.get('/works/', {'budget_min': 'lots'}).status_code, 400)
+
+    def test_async_list_applies_the_same_filters(self):
+        response = async_to_sync(AsyncClient().get)('/async/works/', {'classification': 'UPGRADE'},
+                                                    headers={'Authorization': f'Bearer {self.token()}'})
+        self.assertEqual([row['id'] for row in json.loads(response.content)], [self.upgrade.pk])
+
+    def token(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        return str(AccessToken.for_user(self.admin))
+
+    def test_item_and_payment_filters(self):
+        items = self.ids('/work-items/', {'status': 'COMPLETED', 'contractor': self.contractor.pk})
+        self.assertEqual(items, sorted(self.overdue.items.values_list('pk', flat=True)))
+        today = timezone.now().date()
+        kept = Payment.objects.create(work=self.overdue, payment_date=today, amount_paid=Decimal('50.00'),
+                                      invoice_number='INV-7')
+        Payment.objects.create(work=self.upgrade, payment_date=today - timedelta(days=90), amount_paid=Decimal('5'))
+        self.assertEqual(self.ids('/payments/', {'amount_min': '10'}), [kept.pk])
+        self.assertEqual(self.ids('/payments/', {'payment_date_after': today.isoformat()}), [kept.pk])
+        self.assertEqual(self.ids('/payments/', {'search': 'inv-7'}), [kept.pk])
+
+
+class PolicyTests(WorkFixturesMixin, TestCase):
+    def setUp(self):
+        self.manager = self.create_user('MANAGER')
+        self.contractor = self.create_user('CONTRACTOR', idNum='c1')
+        # Same company (idNum): sees the contractor's works, may change only its own
+        self.partner = self.create_user('CONTRACTOR', 'partner', idNum='c1')
+        self.viewer = self.create_user('CONTRACTOR_VIEWER', idNum='c1')
+        self.payment_admin = self.create_user('PAYMENT_ADMIN')
+        self.work = self.create_work(self.contractor, self.manager, items=1)
+        self.partner_work = self.create_work(self.partner, self.manager, items=1)
+        self.item = self.work.items.get()
+        self.partner_item = self.partner_work.items.get()
+        self.payment = Payment.objects.create(work=self.work, payment_date=timezone.now().date(),
+                                              amount_paid=Decimal('5.00'))
+        self.client = APIClient()
+
+    def call(self, user, method, url, data=None, obj=None):
+        """(status code, number of fetches of ``obj``) for a request as ``user``."""
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, data, format='json')
+        fetches = 0
+        if obj is not None:
+            table = obj._meta.db_table
+            fetches = sum(query['sql'].startswith(f'SELECT "{table}"."id"') and
+                          f'"{table}"."id" = {obj.pk}' in query['sql'] for query in ctx.captured_queries)
+        # Permission checks never load users (contractors) on their own
+        self.assertFalse([query for query in ctx.captured_queries if query['sql'].startswith('SELECT "backend_user"')])
+        return response.status_code, fetches
+
+    def test_work_writes_fetch_the_work_once(self):
+        work, partner_work = f'/works/{self.work.pk}/', f'/works/{self.partner_work.pk}/'
+        cases = [
+            (self.contractor, 'patch', work, {'project': 'X'}, 200),
+            (self.contractor, 'patch', partner_work, {'project': 'X'}, 403),
+            (self.contractor, 'delete', work, None, 403),
+            (self.viewer, 'patch', work, {'project': 'X'}, 403),
+            (self.payment_admin, 'patch', work, {'status': 'PAID'}, 200),
+            (self.payment_admin, 'patch', work, {'project': 'Y'}, 403),
+            (self.manager, 'patch', work, {'project': 'Z'}, 200),
+            (self.contractor, 'post', f'{work}complete_work/', None, 200),
+            (self.partner, 'post', f'{work}complete_work/', None, 403),
+            (self.manager, 'post', f'{work}approve_work/', None, 200),
+        ]
+        for user, method, url, data, expected in cases:
+            with self.subTest(role=user.username, method=method, url=url):
+                obj = self.partner_work if url.startswith(partner_work) else self.work
+                self.assertEqual(self.call(user, method, url, data, obj), (expected, 1))
+        self.work.refresh_from_db()
+        self.assertEqual(self.work.project, 'Z')  # PAYMENT_ADMIN's edit was refused, not dropped silently
+
+        self.assertEqual(self.call(self.contractor, 'post', '/works/', {}), (403, 0))
+        self.assertEqual(self.call(self.viewer, 'get', partner_work, obj=self.partner_work)[0], 200)
+        self.assertEqual(self.call(self.manager, 'delete', work, obj=self.work), (204, 1))
+
+    def test_item_and_payment_writes_fetch_once(self):
+        item, partner_item = f'/work-items/{self.item.pk}/', f'/work-items/{self.partner_item.pk}/'
+        cases = [
+            (self.contractor, 'patch', item, self.item, 200),
+            (self.contractor, 'patch', partner_item, self.partner_item, 403),
+            (self.viewer, 'patch', item, self.item, 403),
+            (self.manager, 'patch', item, self.item, 200),
+            (self.contractor, 'patch', f'/payments/{self.payment.pk}/', self.payment, 403),
+            (self.manager, 'patch', f'/payments/{self.payment.pk}/', self.payment, 200),
+            (self.contractor, 'delete', item, self.item, 204),
+        ]
+        for user, method, url, obj, expected in cases:
+            with self.subTest(role=user.username, method=method, url=url):
+                data = {'description': 'x'} if 'work-items' in url else {'invoice_number': 'I-1'}
+                self.assertEqual(self.call(user, method, url, data, obj), (expected, 1))
+        self.assertEqual(self.call(self.contractor, 'post', '/work-items/', {})[0], 403)
+        self.assertEqual(self.call(self.viewer, 'post', '/payments/', {})[0], 403)
+
+    def test_updates_set_only_the_roles_statuses(self):
+        work, item = f'/works/{self.work.pk}/', f'/work-items/{self.item.pk}/'
+        for user, url, data, expected in (
+            (self.contractor, work, {'status': 'PAID'}, 403),
+            (self.manager, work, {'status': 'WAITING_PAYMENT'}, 403),
+            (self.contractor, item, {'status': 'COMPLETED'}, 403),
+            (self.contractor, work, {'status': 'IN_PROGRESS'}, 200),
+            (self.contractor, item, {'status': 'COMPLETED_BY_CONTRACTOR'}, 200),
+        ):
+            with self.subTest(role=user.username, url=url, status=data['status']):
+                self.assertEqual(self.call(user, 'patch', url, data)[0], expected)
+        self.work.refresh_from_db()
+        self.assertEqual(self.work.status, 'IN_PROGRESS')
+        # The bulk endpoint refuses the same change
+        self.client.force_authenticate(self.contractor)
+        response = self.client.post('/works/bulk_status/', {'ids': [self.work.pk], 'status': 'PAID'}, format='json')
+        self.assertEqual(response.status_code, 403)
+        # Sending the status a row already has is not a change
+        self.work.status = 'PAID'
+        self.work.save()
+        self.assertEqual(self.call(self.contractor, 'patch', work, {'status': 'PAID', 'project': 'Q'})[0], 200)
+
+    def test_items_only_go_to_writable_works(self):
+        other = self.create_work(self.create_user('CONTRACTOR', 'other'), self.create_user('MANAGER', 'm2'))
+        item = f'/work-items/{self.item.pk}/'
+        new_item = {'section': 2, 'description': 'd', 'contract_amount': '1.00', 'actual_amount': '1.00',
+                    'unit_cost': '1.00', 'status': 'PENDING', 'work_type': 't'}
+        for user, method, url, data, expected in (
+            # The partner's work is readable, not writable
+            (self.contractor, 'patch', item, {'work': self.partner_work.pk}, 400),
+            (self.manager, 'patch', item, {'work': other.pk}, 400),
+            (self.manager, 'post', '/work-items/', {**new_item, 'work': other.pk}, 400),
+            (self.manager, 'post', '/work-items/', {**new_item, 'work': self.partner_work.pk}, 201),
+            (self.manager, 'patch', item, {'work': self.partner_work.pk}, 200),
+        ):
+            with self.subTest(role=user.username, method=method, work=data['work']):
+                self.client.force_authenticate(user)
+                response = getattr(self.client, method)(url, data, format='json')
+                self.assertEqual(response.status_code, expected, response.content)
+        self.assertEqual(other.items.count(), 0)
+        self.assertEqual(self.partner_work.items.count(), 3)
+
+    def test_read_scopes(self):
+        other = self.create_work(self.create_user('CONTRACTOR', 'other'), self.create_user('MANAGER', 'm2'))
+        Payment.objects.create(work=other, payment_date=timezone.now().date(), amount_paid=Decimal('1.00'))
+        for user, works in ((self.viewer, {self.work.pk, self.partner_work.pk}),
+                            (self.manager, {self.work.pk, self.partner_work.pk}),
+                            (self.payment_admin, {self.work.pk, self.partner_work.pk, other.pk})):
+            self.client.force_authenticate(user)
+            self.assertEqual({row['id'] for row in self.client.get('/works/').data}, works)
+            self.assertEqual({row['work'] for row in self.client.get('/payments/').data},
+                             works & {self.work.pk, other.pk})
+
+
+class CachedAuthenticationTests(WorkFixturesMixin, TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = self.create_user('MANAGER')
+        self.create_work(self.create_user('CONTRACTOR'), self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def user_queries(self, url='/works/classifications/'):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        queries = [query['sql'] for query in ctx.captured_queries if query['sql'].startswith('SELECT "backend_user"')]
+        return response.status_code, len(queries)
+
+    def test_user_is_read_once_per_ttl(self):
+        self.assertEqual(self.user_queries(), (200, 1))
+        self.assertEqual(self.user_queries(), (200, 0))
+        self.assertEqual(self.user_queries('/works/'), (200, 0))  # role and idNum scoping from the cache
+        with override_settings(BACKEND_AUTH_CACHE_TTL=-1):
+            user_cache.forget(self.user.pk)
+            self.assertEqual(self.user_queries(), (200, 1))
+            self.assertEqual(self.user_queries(), (200, 1))
+
+    def test_other_fields_load_on_access(self):
+        self.user_queries()
+        self.assertEqual(self.user_queries('/auth/user/'), (200, 1))  # all the other fields at once
+        response = self.client.get('/auth/user/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['username'], response.data['idNum']), ('manager', 'manager'))
+
+    def test_saves_and_blacklisting_invalidate(self):
+        self.user_queries()
+        self.user.role = 'CONTRACTOR_VIEWER'
+        self.user.save()
+        self.assertEqual(len(self.client.get('/works/').data), 0)  # no longer the manager's works
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/works/').status_code, 401)
+
+        self.user.is_active = True
+        self.user.save()
+        self.user_queries()
+        self.assertIsNotNone(user_cache.get(str(self.user.pk)))
+        RefreshToken.for_user(self.user).blacklist()
+        self.assertIsNone(user_cache.get(str(self.user.pk)))
+
+
+class BulkStatusTests(WorkFixturesMixin, TestCase):
+    def setUp(self):
+        self.manager = self.create_user('MANAGER')
+        self.contractor = self.create_user('CONTRACTOR', idNum='c1')
+        self.partner = self.create_user('CONTRACTOR', 'partner', idNum='c1')
+        self.client = APIClient()
+
+    def post(self, user, url, ids, target):
+        self.client.force_authenticate(user)
+        return self.client.post(url, {'ids': ids, 'status': target}, format='json')
+
+    def test_works_are_marked_paid_with_their_items(self):
+        waiting = self.create_work(self.contractor, self.manager, items=2, status='WAITING_PAYMENT')
+        WorkItem.objects.filter(pk=waiting.items.order_by('pk')[0].pk).update(status='WAITING_PAYMENT')
+        running = self.create_work(self.contractor, self.manager, status='IN_PROGRESS')
+        paid = self.create_work(self.contractor, self.manager, status='PAID')
+        before = Work.objects.get(pk=waiting.pk).updated_at
+
+        response = self.post(self.create_user('PAYMENT_ADMIN'), '/works/bulk_status/',
+                             [waiting.pk, running.pk, paid.pk, 9999], 'PAID')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['results'], [
+            {'id': waiting.pk, 'outcome': 'updated'},
+            {'id': running.pk, 'outcome': 'invalid_transition', 'status': 'IN_PROGRESS'},
+            {'id': paid.pk, 'outcome': 'unchanged'},
+            {'id': 9999, 'outcome': 'not_found'},
+        ])
+        self.assertEqual((response.data['updated'], response.data['items_updated']), (1, 1))
+
+        waiting.refresh_from_db()
+        self.assertEqual(waiting.status, 'PAID')
+        self.assertGreater(waiting.updated_at, before)
+        self.assertEqual(waiting.item_status_counts, {'PAID': 1, 'PENDING': 1})
+        self.assertEqual(WorkCostRollup.objects.get(work=waiting).status, 'PAID')
+
+    def test_one_update_whatever_the_batch_size(self):
+        counts = []
+        for size in (2, 20):
+            works = [self.create_work(self.contractor, self.manager, items=1, status='PENDING') for _ in range(size)]
+            self.client.force_authenticate(self.manager)
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post('/works/bulk_status/', {
+                    'ids': [work.pk for work in works], 'status': 'IN_PROGRESS'}, format='json')
+            self.assertEqual(response.data['updated'], size)
+            counts.append(len(ctx.captured_queries))
+            self.assertEqual(sum(query['sql'].startswith('UPDATE "backend_work" SET "status"')
+                                 for query in ctx.captured_queries), 1)
+        self.assertEqual(counts[0], counts[1])
+
+    def test_items_follow_the_write_scope_and_role_statuses(self):
+        own = self.create_work(self.contractor, self.manager, items=1).items.get()
+        partner = self.create_work(self.partner, self.manager, items=1).items.get()
+        WorkItem.objects.update(status='IN_PROGRESS')
+
+        response = self.post(self.contractor, '/work-items/bulk_status/', [own.pk, partner.pk],
+                             'COMPLETED_BY_CONTRACTOR')
+        self.assertEqual(response.data['results'], [{'id': own.pk, 'outcome': 'updated'},
+                                                    {'id': partner.pk, 'outcome': 'forbidden'}])
+        self.assertEqual(Work.objects.get(pk=own.work_id).item_status_counts, {'COMPLETED_BY_CONTRACTOR': 1})
+        self.assertEqual(self.post(self.contractor, '/work-items/bulk_status/', [own.pk], 'PAID').status_code, 403)
+        self.assertEqual(self.post(self.manager, '/work-items/bulk_status/', 'all', 'PENDING').status_code, 400)
+        self.assertEqual(self.post(self.manager, '/works/bulk_status/', [own.work_id], 'DONE').status_code, 400)
+
+
+@override_settings(BACKEND_WRITE_RETRY_DELAY=0)
+class SeedingBenchmarkTests(TestCase):
+    SCALE = Scale(works=6, items_per_work=2, payments_per_work=1, comments_per_work=1, contractors=3, managers=2,
+                  facilities=2)
+
+    @staticmethod
+    def seeded_rows():
+        """The seeded rows by natural key, leaving out ids and timestamps."""
+        return {
+            'users': list(User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').order_by('email').values_list(
+                'email', 'role', 'idNum', 'password')),
+            'works': list(Work.objects.order_by('work_number').values_list(
+                'work_number', 'project', 'classification', 'start_date', 'due_end_date', 'end_date', 'status',
+                'contractor__email', 'manager__email', 'facility__facility_number', 'quality_score', 'time_score',
+                'cost_score', 'completion_percentage', 'contract_total', 'actual_total')),
+            'items': list(WorkItem.objects.order_by('work__work_number', 'section').values_list(
+                'work__work_number', 'section', 'contract_amount', 'actual_amount', 'unit_cost', 'status',
+                'work_type')),
+            'payments': list(Payment.objects.order_by('invoice_number').values_list(
+                'invoice_number', 'payment_date', 'amount_paid', 'approval_manager__email')),
+            'comments': list(Comment.objects.order_by('work__work_number', 'text').values_list(
+                'work__work_number', 'user__email', 'text')),
+        }
+
+    def test_same_seed_gives_the_same_rows(self):
+        seed(self.SCALE, seed=7)
+        first = self.seeded_rows()
+        clear_seed_data()
+        self.assertEqual(Work.objects.count(), 0)
+
+        call_command('seed_data', '--seed', '7', '--works', '6', '--items-per-work', '2', '--payments-per-work', '1',
+                     '--comments-per-work', '1', '--contractors', '3', '--managers', '2', '--facilities', '2',
+                     stdout=io.StringIO())
+        self.assertEqual(self.seeded_rows(), first)
+        self.assertEqual(len(first['items']), 12)
+
+        clear_seed_data()
+        seed(self.SCALE, seed=8)
+        self.assertNotEqual(self.seeded_rows(), first)
+
+    def test_benchmark_api_writes_every_endpoint(self):
+        seed(self.SCALE)
+        with tempfile.NamedTemporaryFile(suffix='.json') as output, \
+                mock.patch('backend.benchmarks.setup_test_environment'), \
+                mock.patch('backend.benchmarks.teardown_test_environment'):  # already set up by the test runner
+            call_command('benchmark_api', '--use-current-db', '--repeat', '2', '--output', output.name,
+                         stdout=io.StringIO(), stderr=io.StringIO())
+            results = json.load(output)
+
+        names = [name for name, _, _ in endpoints(Work.objects.order_by('pk').first())]
+        self.assertEqual(sorted(results['endpoints']), sorted(names))
+        for name, result in results['endpoints'].items():
+            self.assertEqual(result['status'], 200, name)
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'], name)
+            self.assertEqual(result['runs'], 2, name)
+            self.assertIsInstance(result['queries'], int, name)
+            self.assertGreater(result['bytes'], 0, name)
+        self.assertEqual(results['environment']['database'], connection.vendor)
+
+
+class SQLiteWriteTests(WorkFixturesMixin, TransactionTestCase):
+    def test_connections_get_the_pragmas(self):
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)  # NORMAL
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 5000)
+            self.assertEqual(cursor.execute('PRAGMA cache_size').fetchone()[0], -20000)
+
+    def test_locked_writes_are_retried_a_bounded_number_of_times(self):
+        calls = []
+
+        def locked_twice():
+            calls.append(connection.in_atomic_block)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'done'
+
+        self.assertEqual(write_with_retry(locked_twice), 'done')
+        self.assertEqual(calls, [True, True, True])
+
+        calls.clear()
+        with self.assertRaises(OperationalError):
+            write_with_retry(locked_twice, retries=1)
+        self.assertEqual(len(calls), 2)
+
+        calls.clear()
+        with self.assertRaises(OperationalError), transaction.atomic():
+            write_with_retry(locked_twice)
+        self.assertEqual(len(calls), 1)  # the enclosing transaction can't be re-run
+
+    def test_api_writes_begin_immediate(self):
+        manager = self.create_user('MANAGER')
+        work = self.create_work(self.create_user('CONTRACTOR'), manager)
+        client = APIClient()
+        client.force_authenticate(manager)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.patch(f'/works/{work.pk}/', {'remarks': 'checked'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        statements = [query['sql'] for query in ctx.captured_queries]
+        self.assertEqual(statements.count('BEGIN IMMEDIATE'), 1)
+        # The lookup and validation run before the write lock is taken, the save after
+        first_update = next(i for i, sql in enumerate(statements) if sql.startswith('UPDATE'))
+        self.assertLess(statements.index('BEGIN IMMEDIATE'), first_update)
+        self.assertTrue(statements[0].startswith('SELECT'))
+        self.assertEqual(Work.objects.get(pk=work.pk).remarks, 'checked')
+
+        with CaptureQueriesContext(connection) as ctx:
+            client.get(f'/works/{work.pk}/')
+        self.assertNotIn('BEGIN IMMEDIATE', [query['sql'] for query in ctx.captured_queries])
+
+    def test_async_routes_still_reject_writes(self):
+        manager = self.create_user('MANAGER')
+        client = Client()
+        client.force_login(manager)
+        self.assertEqual(client.post('/async/works/', {}).status_code, 405)
+        async_client = AsyncClient()
+        async_client.force_login(manager)
+        self.assertEqual(async_to_sync(async_client.post)('/async/works/', {}).status_code, 405)
+
+    def test_import_batches_commit_separately(self):
+        manager = self.create_user('MANAGER')
+        self.create_user('CONTRACTOR', idNum='123')
+        Facility.objects.create(facility_number=7, name='F7', description='d')
+        body = ''.join(f'C-{n},P,FAULT,2024-01-01,2024-02-01,PENDING,7,123,Site,1,W,1,1,1,PENDING,C\n'
+                       for n in range(3))
+        upload = SimpleUploadedFile('works.csv', (WorkImportTests.HEADER + body).encode(), content_type='text/csv')
+
+        # The third batch fails; the first two stay committed
+        with mock.patch('backend.importers.refresh_scorecards', side_effect=[None, None, RuntimeError]), \
+                CaptureQueriesContext(connection) as ctx, self.assertRaises(RuntimeError):
+            WorkImporter(manager=manager, batch_size=1).import_file(upload, upload.name)
+        self.assertEqual([query['sql'] for query in ctx.captured_queries].count('BEGIN IMMEDIATE'), 3)
+        self.assertEqual(sorted(Work.objects.values_list('work_number', flat=True)), ['C-0', 'C-1'])
@@ -0,0 +1,105 @@
+"""
+Status changes for many works or items at once (the bulk_status actions). The
+statuses a role may set come from its policy (policies.py); the statuses each one
+may be reached from are below. A batch is a single guarded
+UPDATE ... WHERE id IN (...) AND status IN (allowed from) AND <write scope>, so
+rows the user may not change, or that moved on meanwhile, are left alone and
+reported per id. Works moving to a payment status take their items along.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Work, WorkItem
+from .rollups import refresh_work_rollups
+
+MAX_BULK_IDS = 500
+
+# {target status: the statuses it may be set from}
+WORK_TRANSITIONS = {
+    'PENDING': ('IN_PROGRESS',),
+    'IN_PROGRESS': ('PENDING', 'WAITING_PAYMENT'),
+    'WAITING_PAYMENT': ('IN_PROGRESS',),
+    'PAID': ('WAITING_PAYMENT',),
+}
+ITEM_TRANSITIONS = {
+    'PENDING': ('IN_PROGRESS',),
+    'IN_PROGRESS': ('PENDING', 'COMPLETED_BY_CONTRACTOR', 'QUALITY_CONTROL'),
+    'COMPLETED_BY_CONTRACTOR': ('IN_PROGRESS',),
+    'QUALITY_CONTROL': ('COMPLETED_BY_CONTRACTOR',),
+    'COMPLETED': ('QUALITY_CONTROL',),
+    'WAITING_PAYMENT': ('COMPLETED',),
+    'PAID': ('WAITING_PAYMENT',),
+}
+TRANSITIONS = {Work: WORK_TRANSITIONS, WorkItem: ITEM_TRANSITIONS}
+# Work statuses whose works' items follow them (those items that may move there)
+CASCADE_TO_ITEMS = ('WAITING_PAYMENT', 'PAID')
+
+
+class TransitionError(Exception):
+    pass
+
+
+def parse_bulk_request(data, model):
+    """(ids, status) from {"ids": [...], "status": ...}; raises TransitionError."""
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not ids:
+        raise TransitionError('Pass the ids to update as a list in "ids".')
+    if len(ids) > MAX_BULK_IDS:
+        raise TransitionError(f'At most {MAX_BULK_IDS} ids per request.')
+    if any(isinstance(pk, bool) or not isinstance(pk, (int, str)) for pk in ids):
+        raise TransitionError('"ids" must be a list of integers.')
+    try:
+        ids = list(dict.fromkeys(int(pk) for pk in ids))
+    except ValueError:
+        raise TransitionError('"ids" must be a list of integers.')
+    target = data.get('status')
+    if target not in dict(model.STATUS_CHOICES):
+        raise TransitionError(f'Unknown status: {target}')
+    return ids, target
+
+
+def outcome(obj, pk, target, stamp, policy):
+    if obj is None:
+        return {'id': pk, 'outcome': 'not_found'}
+    if not policy.can_write(obj):
+        return {'id': pk, 'outcome': 'forbidden'}
+    if obj.status == target:
+        return {'id': pk, 'outcome': 'updated' if obj.updated_at == stamp else 'unchanged'}
+    return {'id': pk, 'outcome': 'invalid_transition', 'status': obj.status}
+
+
+def bulk_transition(policy, model, ids, target):
+    """
+    Set ``target`` on the ``model`` rows ``ids`` that ``policy`` lets the user
+    change and that are in a status ``target`` may follow, in one transaction.
+    Returns the number of rows updated, the items that followed their works and
+    an outcome per id: updated, unchanged (already there), invalid_transition
+    (with the current status), forbidden or not_found (not visible to the user).
+    """
+    stamp = timezone.now()
+    rows = policy.scope(model.objects.filter(pk__in=ids))
+    columns = ['status', 'updated_at'] + (['work_id'] if model is WorkItem else [])
+    with transaction.atomic():
+        updated = rows.filter(policy.write, status__in=TRANSITIONS[model].get(target, ())).update(
+            status=target, updated_at=stamp)  # update() leaves auto_now alone
+
+        found = {obj.pk: obj for obj in policy.annotate_writable(rows).only(*columns)}
+        results = [outcome(found.get(pk), pk, target, stamp, policy) for pk in ids]
+        changed = [found[result['id']] for result in results if result['outcome'] == 'updated']
+
+        items_updated = 0
+        if model is Work:
+            work_ids = {work.pk for work in changed}
+            if work_ids and target in CASCADE_TO_ITEMS:
+                items_updated = WorkItem.objects.filter(
+                    work_id__in=work_ids, status__in=ITEM_TRANSITIONS[target]).update(status=target, updated_at=stamp)
+        else:
+            work_ids = {item.work_id for item in changed}
+        if work_ids:
+            # No save signals on update(): the rollups' status and item status counts, once for the batch
+            refresh_work_rollups(work_ids)
+
+    response = {'status': target, 'updated': updated, 'results': results}
+    if model is Work:
+        response['items_updated'] = items_updated
+    return response
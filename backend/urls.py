@@ -2,8 +2,13 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_nested import routers
 
+from . import async_views
+
 # from .views import WorkViewSet, WorkItemViewSet, FacilityViewSet, ContractorRatingViewSet, UserRoleListViewSet
-from .views import WorkViewSet, WorkItemViewSet, FacilityViewSet, UserRoleListViewSet, PaymentViewSet, CommentViewSet
+from .views import (
+    WorkViewSet, WorkItemViewSet, FacilityViewSet, UserRoleListViewSet, PaymentViewSet, CommentViewSet, JobViewSet,
+    ContractorScorecardViewSet, MetricsView,
+)
 
 # router = DefaultRouter()
 # router.register(r'works', WorkViewSet, basename='work')
@@ -28,6 +33,8 @@ router.register(r'work-items', WorkItemViewSet, basename='workitem')
 router.register(r'facilities', FacilityViewSet, basename='facility')
 router.register(r'user-roles', UserRoleListViewSet, basename='user-roles')
 router.register(r'payments', PaymentViewSet, basename='payment')
+router.register(r'jobs', JobViewSet, basename='job')
+router.register(r'scorecards', ContractorScorecardViewSet, basename='scorecard')
 
 # Add nested router for comments
 works_router = routers.NestedSimpleRouter(router, r'works', lookup='work')
@@ -36,6 +43,12 @@ works_router.register(r'comments', CommentViewSet, basename='work-comments')
 urlpatterns = [
     path('', include(router.urls)),
     path('', include(works_router.urls)),  # Add this line
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    # Async (ASGI) read path for the hot endpoints, see async_views.py
+    path('async/works/', async_views.work_list, name='async-work-list'),
+    path('async/works/reports/', async_views.work_reports, name='async-work-reports'),
+    path('async/works/<int:pk>/', async_views.work_detail, name='async-work-detail'),
+    path('async/works/<int:work_pk>/comments/', async_views.work_comments, name='async-work-comments'),
     path('auth/', include('dj_rest_auth.urls')),
     path('auth/registration/', include('dj_rest_auth.registration.urls')),
     path('api-auth/', include('rest_framework.urls')),
@@ -1,25 +1,65 @@
-from django.shortcuts import get_object_or_404
+import os
+
+from django.db.models import F
+from django.http import FileResponse, Http404, HttpResponse
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied
+from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Sum, Count, Q, F, Avg
-from django.utils import timezone
-from datetime import datetime
-from .permissions import ContractorPermission
+from rest_framework.views import APIView
+from .caching import CHOICES, USERS, cached, role_key
+from .conditional import ConditionalGetMixin
+from .db import SerializedWriteMixin, save_serializer, write_with_retry
+from .pagination import WorkPagination, WorkItemPagination, PaymentPagination, CommentPagination
+from .exports import EXPORT_FORMATS, work_export_rows, payment_export_rows, payment_export_works, export_response
+from .fieldsets import SparseFieldsMixin
+from .filters import WorkFilter, WorkItemFilter, PaymentFilter
+from .importers import WorkImporter, ImportFormatError
+from .jobs import submit_job
+from .metrics import registry
+from .permissions import IsSuperAdmin, PolicyPermission, scope_works
+from .policies import WORKS, WORK_ITEMS, PAYMENTS, SCORECARDS, PolicyMixin
+from .querysets import optimize_queryset, visible_works
+from .representations import ValuesListMixin, work_list_representation
+from .reports import (
+    ReportError, filter_report_queryset, compute_report, compute_reports, parse_report_types, use_scorecards,
+)
 # from .models import User, Work, WorkItem, Facility, ContractorRating
-from .models import User, Work, WorkItem, Facility, Payment, Comment
+from .models import User, Work, WorkItem, Facility, Payment, Comment, Job, ContractorScorecard
+from .sync import SyncError, parse_since, changes_since
+from .transitions import TransitionError, bulk_transition, parse_bulk_request
 from .serializers import (
     UserSerializer, WorkSerializer, WorkItemSerializer,
-    FacilitySerializer, NestedWorkItemSerializer, UserRoleSerializer, PaymentSerializer, CommentSerializer
+    FacilitySerializer, NestedWorkItemSerializer, UserRoleSerializer, PaymentSerializer, CommentSerializer,
+    JobSerializer, ContractorScorecardSerializer, ContractorScorecardSnapshotSerializer,
     # FacilitySerializer, ContractorRatingSerializer, NestedWorkItemSerializer, UserRoleSerializer
 )
 
 
-class WorkViewSet(viewsets.ModelViewSet):
+def bulk_status_response(policy, data, model):
+    """The bulk_status actions of works and items: see transitions.bulk_transition()."""
+    try:
+        ids, target = parse_bulk_request(data, model)
+    except TransitionError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if not policy.writes or not policy.may_set_status(target):
+        return Response({'error': f'You are not authorized to set the status {target}.'}, status=403)
+    return Response(write_with_retry(bulk_transition, policy, model, ids, target))
+
+
+class WorkViewSet(PolicyMixin, SerializedWriteMixin, ConditionalGetMixin, SparseFieldsMixin, ValuesListMixin,
+                  viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = WorkSerializer
+    resource = WORKS
+    pagination_class = WorkPagination
+    conditional_related = ('items',)
+    conditional_joined = ('facility',)  # facility_name
+    days_since = ('start_date', 'end_date')  # days_in_work
+    expandable_fields = ('items',)
+    filterset_class = WorkFilter
 
     def get_queryset(self):
         user = self.request.user
@@ -36,34 +76,20 @@ class WorkViewSet(viewsets.ModelViewSet):
         #     queryset = queryset.filter(items__status=item_status).distinct()
         #
 
-        queryset = Work.objects.prefetch_related('items').all()
-
-        # Get filter parameters
-        work_status = self.request.query_params.get('work_status', '')
-        item_status = self.request.query_params.get('item_status', '')
+        # The ?work_status= etc. filters are applied by filter_queryset() (filterset_class)
+        return visible_works(user, self.get_serializer_class(), fields=self.get_requested_fields())
 
-        # Apply status filters only if the  y are not empty strings
-        if work_status and work_status != '':
-            queryset = queryset.filter(status=work_status)
+    def get_list_representation(self):
+        # Lists are built from values() rows; same JSON as WorkSerializer, see representations.py
+        return work_list_representation(self.get_requested_fields())
 
-        if item_status and item_status != '':
-            queryset = queryset.filter(items__status=item_status).distinct()
-
-        # Filter based on user role
-        if user.role in ['CONTRACTOR', 'CONTRACTOR_VIEWER']:
-            return queryset.filter(contractor__idNum=user.idNum)
-        elif user.role in ['GENERAL_ENGINEER', 'SUPER_ADMIN']:
-            return queryset  # Full access
-        elif user.role == 'MANAGER':
-            return queryset.filter(manager=user)
-        elif user.role == 'PAYMENT_ADMIN':
-            return queryset  # Read-only, for filtering later in permissions
-
-        return queryset.none()
+    def get_conditional_related(self):
+        fields = self.get_requested_fields()
+        return [name for name in self.conditional_related if fields is None or name in fields]
 
     def create(self, request, *args, **kwargs):
-        """Allow only MANAGER, GENERAL_ENGINEER, SUPER_ADMIN to create works."""
-        if request.user.role not in ['MANAGER', 'GENERAL_ENGINEER', 'SUPER_ADMIN']:
+        """Allow only the roles whose policy may create works (MANAGER, GENERAL_ENGINEER, SUPER_ADMIN)."""
+        if not self.policy.create:
             return Response(
                 {"error": "You are not authorized to create new works."},
                 status=403
@@ -72,44 +98,37 @@ class WorkViewSet(viewsets.ModelViewSet):
 
     def perform_update(self, serializer):
         """Restrict updating permissions for specific roles."""
-        work = self.get_object()
-        user = self.request.user
+        work = self.get_object()  # The instance being updated, fetched once with its write check
 
-        if user.role == 'CONTRACTOR' and work.contractor != user:
-            raise PermissionDenied("You can only edit your own works.")
-        if user.role == 'PAYMENT_ADMIN':
-            if set(serializer.validated_data.keys()) != {'status'} or serializer.validated_data['status'] != 'PAID':
-                return Response(
-                    {"error": "PAYMENT_ADMIN can only update status to 'PAID'."},
-                    status=403
-                )
-        if user.role in ['CONTRACTOR_VIEWER']:
+        if not self.policy.writes:
             raise PermissionDenied("You do not have permission to update works.")
-        # Allow other roles to update
-        serializer.save()
+        if not self.policy.can_write(work):
+            raise PermissionDenied("You can only edit your own works.")
+        # The role's statuses (PAYMENT_ADMIN: status to PAID only)
+        self.policy.check_fields(serializer.validated_data, self.request.user.role, serializer.instance)
+        save_serializer(serializer)
 
     def perform_destroy(self, instance):
         """Restrict deletion permissions."""
-        user = self.request.user
-
-        if user.role not in ['MANAGER', 'GENERAL_ENGINEER', 'SUPER_ADMIN']:
+        if not self.policy.delete:
             raise PermissionDenied("You do not have permission to delete works.")
 
-        instance.delete()
+        write_with_retry(instance.delete)
 
     @action(detail=False, methods=['get'])
     def classifications(self, request):  # Create new action for classifications
-        classifications = {choice[0]: choice[1] for choice in Work.CLASSIFICATION_CHOICES}
-        return Response(classifications)
+        return Response(cached(CHOICES, 'classifications', self.build_classifications))
+
+    @staticmethod
+    def build_classifications():
+        return {choice[0]: choice[1] for choice in Work.CLASSIFICATION_CHOICES}
 
     @action(detail=True, methods=['patch'])
     def change_payment_status(self, request, pk=None):
         """Allow Payment Admins to change payment-related fields."""
-        work = self.get_object()
-        user = self.request.user
-
-        if user.role != 'PAYMENT_ADMIN':
+        if 'change_payment_status' not in self.policy.actions:
             return Response({'error': 'Unauthorized'}, status=403)
+        work = self.get_object()
 
         status = request.data.get('status')
         if status not in ['WAITING_PAYMENT', 'PAID']:
@@ -119,143 +138,94 @@ class WorkViewSet(viewsets.ModelViewSet):
             )
 
         work.status = status
-        work.save()
+        write_with_retry(work.save)
         return Response({'status': f'Work status changed to {status}.'})
 
     @action(detail=True, methods=['post'])
     def approve_work(self, request, pk=None):
         work = self.get_object()
-        if request.user.role in ['GENERAL_ENGINEER', 'MANAGER']:
+        if 'approve_work' in self.policy.actions:
             work.status = 'APPROVED' if work.status == 'PENDING_APPROVAL' else 'FINISHED'
-            work.save()
+            write_with_retry(work.save)
             return Response({'status': 'work approved'})
         return Response({'error': 'Unauthorized'}, status=403)
 
     @action(detail=True, methods=['post'])
     def complete_work(self, request, pk=None):
         work = self.get_object()
-        if request.user == work.contractor:
+        if 'complete_work' in self.policy.actions and self.policy.can_write(work):
             work.status = 'WAITING_MANAGER_APPROVAL'
-            work.save()
+            write_with_retry(work.save)
             return Response({'status': 'work completed'})
         return Response({'error': 'Unauthorized'}, status=403)
 
+    @action(detail=False, methods=['post'])
+    def bulk_status(self, request):
+        """Move the works in {"ids": [...]} to {"status": ...}, with their items where they follow; per-id outcomes."""
+        return bulk_status_response(self.policy, request.data, Work)
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser, FormParser])
+    def import_works(self, request):
+        """Import works and their items from an uploaded CSV/XLSX file; bad rows are reported, not fatal."""
+        if not self.policy.create:
+            return Response({"error": "You are not authorized to import works."}, status=403)
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Upload the spreadsheet in the "file" field.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        importer = WorkImporter(manager=request.user, work_scope=self.get_queryset(), dry_run=dry_run)
+        try:
+            result = importer.import_file(upload, upload.name)
+        except ImportFormatError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result.as_dict())
+
     @action(detail=False, methods=['get'])
-    def reports(self, request):
-        queryset = self.get_queryset()
-        report_type = request.query_params.get('type')
-        contractor_id = request.query_params.get('contractor_id')  # Changed to contractor_id
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-        facility_name = request.query_params.get('facility_name')
-        classification = request.query_params.get('classification')
-
-        # Apply filters
-        if contractor_id:
-            try:
-                contractor = get_object_or_404(User, id=contractor_id)
-                print(contractor)
-                print('before', len(queryset))
-                queryset = queryset.filter(contractor=contractor)  # Filter the queryset
-                print('after', len(queryset))
-
-            except (ValueError, TypeError):
-                return Response({'error': 'Invalid contractor ID'}, status=400)
-
-        if start_date and end_date:
-            try:
-                start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-                end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-                queryset = queryset.filter(start_date__range=(start_date, end_date))
-            except ValueError:
-                print(ValueError)
-                return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if facility_name:
-            queryset = queryset.filter(facility__name=facility_name)
-
-        if classification:
-            queryset = queryset.filter(classification=classification)
-
-        if report_type == 'cost':
-            active_works = queryset.filter(status__in=['APPROVED', 'IN_PROGRESS'])
-            paid_works = queryset.filter(status='PAID')
-
-            budget = active_works.aggregate(Sum('items__contract_amount'))['items__contract_amount__sum'] or 0
-            amount_paid = paid_works.aggregate(Sum('items__actual_amount'))['items__actual_amount__sum'] or 0
-
-            budget_exception = queryset.filter(
-                Q(items__actual_amount__gt=F('items__contract_amount')) & Q(status__in=['APPROVED', 'IN_PROGRESS'])
-            ).aggregate(
-                exception=Sum(F('items__actual_amount') - F('items__contract_amount'))
-            )['exception'] or 0
-
-            # Calculate free budget
-            free_budget = active_works.annotate(
-                free_item_budget=Sum(
-                    F('items__contract_amount') - F('items__actual_amount'),
-                    filter=Q(items__actual_amount__lt=F('items__contract_amount'))
-                )
-            ).aggregate(total_free_budget=Sum('free_item_budget'))['total_free_budget'] or 0
-            return Response({
-                'budget': budget,
-                'amount_paid': amount_paid,
-                'budget_exception': budget_exception,
-                'free_budget': free_budget,
-            })
-
-        elif report_type == 'facility_faults':
-            return Response(
-                queryset.filter(classification='FAULT').values('facility__name').annotate(  # Changed to facility__name
-                    fault_count=Count('id')
-                )
-            )
+    def export(self, request):
+        """Stream the works and their items as CSV or NDJSON (?file_format=), with the reports' filters."""
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return Response({'error': 'Invalid file_format. Use csv or ndjson'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            works = filter_report_queryset(self.filter_queryset(self.get_queryset()), request.query_params)
+        except ReportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        header, rows = work_export_rows(works)
+        return export_response(header, rows, file_format, 'works')
+
+    @action(detail=False, methods=['get'])
+    def sync(self, request):
+        """Works, items, payments and comments changed since ?since= or ?token=, plus deletions."""
+        try:
+            since = parse_since(request.query_params, request.user)
+        except SyncError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(changes_since(request, since))
 
-        elif report_type == 'time':
-            now = timezone.now()
-            return Response({
-                'delayed': queryset.filter(due_end_date__lt=now, status__in=['IN_PROGRESS', 'PENDING']).count(),
-                'in_time': queryset.filter(due_end_date__gte=now, status__in=['IN_PROGRESS', 'PENDING']).count(),
-            })
-
-        elif report_type == 'contractors':
-            top_contractors = queryset.values('contractor__username', 'contractor__first_name',
-                                              'contractor__last_name').annotate(
-                avg_quality=Avg('quality_score'),
-                avg_time=Avg('time_score'),
-                avg_cost=Avg('cost_score'),
-                overall_avg=Avg(
-                    (
-                            F('quality_score') + F('time_score') + F('cost_score')
-                    ) / 3.0
-                )
-            ).order_by('-overall_avg')[:10]
-            return Response(top_contractors)
-
-        elif report_type == 'contractorsWorst':
-            worst_contractors = queryset.values('contractor__username', 'contractor__first_name',
-                                                'contractor__last_name').annotate(
-                avg_quality=Avg('quality_score'),
-                avg_time=Avg('time_score'),
-                avg_cost=Avg('cost_score'),
-                overall_avg=Avg(
-                    (
-                            F('quality_score') + F('time_score') + F('cost_score')
-                    ) / 3.0
-                )
-            ).order_by('overall_avg')[:10]  # Order by ascending (worst first)
-            return Response(worst_contractors)
-
-        elif report_type == 'works':
-            finished_statuses = ['FINISHED', 'PAID', 'WAITING_PAYMENT']
-            active_works_count = Work.objects.exclude(status__in=finished_statuses).count()
-            finished_works_count = Work.objects.filter(status__in=finished_statuses).count()
-
-            return Response({
-                'active_works': active_works_count,
-                'finished_works': finished_works_count,
-            })
-        return Response({'error': 'Invalid report type'}, status=status.HTTP_400_BAD_REQUEST)
+    @action(detail=False, methods=['get'])
+    def reports(self, request):
+        try:
+            queryset = filter_report_queryset(self.filter_queryset(self.get_queryset()), request.query_params)
+            return Response(compute_report(request.query_params.get('type'), queryset, request.query_params,
+                                           scorecards=use_scorecards(request.user, request.query_params)))
+        except ReportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['get'], url_path='reports/batch')
+    def batch_reports(self, request):
+        """Several report types (?types=cost,time,...) over one filter set, in one response."""
+        report_types = parse_report_types(request.query_params)
+        if not report_types:
+            return Response({'error': 'Pass the report types to compute in ?types='},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            queryset = filter_report_queryset(self.filter_queryset(self.get_queryset()), request.query_params)
+            return Response(compute_reports(report_types, queryset, request.query_params,
+                                            scorecards=use_scorecards(request.user, request.query_params)))
+        except ReportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     # @action(detail=False, methods=['get'])
     # def work_statuses(self, request):
@@ -264,31 +234,18 @@ class WorkViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def work_statuses(self, request):
         user = request.user
-        role = user.role  # Or however you access the user's role
-
-        statuses = []
-
-        for code, label in Work.STATUS_CHOICES:
-            status_data = {'code': code, 'label': label, 'chosable': False}  # Default: not chosable
+        return Response(cached(CHOICES, f'work_statuses:{role_key(user)}', lambda: self.build_work_statuses(user)))
 
-            if user.is_superuser or user.role == 'GENERAL_ENGINEER':
-                status_data['chosable'] = True
-            elif role == 'CONTRACTOR':  # Example roles - adjust as needed
-                if code in ['PENDING', 'IN_PROGRESS']:  # Example: Contractor can change these
-                    status_data['chosable'] = True
-            elif role == 'MANAGER':
-                if code not in ['PAID', 'WAITING_PAYMENT']:  # Example: Manager can change all except PAID
-                    status_data['chosable'] = True
-            elif role == 'PAYMENT_ADMIN':
-                if code in ['WAITING_PAYMENT', 'PAID']:  # Example: Payment Admin can change these
-                    status_data['chosable'] = True
+    @staticmethod
+    def build_work_statuses(user):
+        # The statuses the role may set (policies.WORKS), which the bulk_status action accepts too
+        policy = WORKS.compile(user)
+        return [{'code': code, 'label': label, 'chosable': policy.may_set_status(code)}
+                for code, label in Work.STATUS_CHOICES]
 
-            statuses.append(status_data)
 
-        return Response(statuses)
-
-
-class WorkItemViewSet(viewsets.ModelViewSet):
+class WorkItemViewSet(PolicyMixin, SerializedWriteMixin, ConditionalGetMixin, SparseFieldsMixin,
+                      viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             if hasattr(self, 'parent_object'):
@@ -298,19 +255,26 @@ class WorkItemViewSet(viewsets.ModelViewSet):
         return WorkItemSerializer
 
     # serializer_class = WorkItemSerializer
-    permission_classes = [IsAuthenticated, ContractorPermission]
+    permission_classes = [IsAuthenticated, PolicyPermission]
+    pagination_class = WorkItemPagination
+    filterset_class = WorkItemFilter
+    resource = WORK_ITEMS
 
     def get_queryset(self):
-        user = self.request.user
-        if user.is_authenticated:
-            if user.role in ['GENERAL_ENGINEER', 'SUPER_ADMIN',
-                             'PAYMENT_ADMIN']:  # Updated to match uppercase role names
-                return WorkItem.objects.all()
-            elif user.role == 'MANAGER':
-                return WorkItem.objects.filter(work__manager=user)
-            elif user.role in ['CONTRACTOR', 'CONTRACTOR_VIEWER']:
-                return WorkItem.objects.filter(work__contractor__idNum=user.idNum)
-        return WorkItem.objects.none()
+        queryset = optimize_queryset(WorkItem.objects.all(), self.get_serializer_class(),
+                                     fields=self.get_requested_fields())
+        return self.policy.scope(queryset)
+
+    # Saved through SerializedWriteMixin: the item and its work's totals (refresh_work_rollups,
+    # via signals) commit together
+    def perform_update(self, serializer):
+        self.policy.check_fields(serializer.validated_data, self.request.user.role, serializer.instance)
+        save_serializer(serializer)
+
+    @action(detail=False, methods=['post'])
+    def bulk_status(self, request):
+        """Move the items in {"ids": [...]} to {"status": ...}; per-id outcomes."""
+        return bulk_status_response(self.policy, request.data, WorkItem)
 
     # @action(detail=False, methods=['get'])
     # def work_item_statuses(self, request):
@@ -320,34 +284,17 @@ class WorkItemViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def work_item_statuses(self, request):
         user = request.user
-        role = user.role
-        statuses = []
-
-        for code, label in WorkItem.STATUS_CHOICES:
-            status_data = {'code': code, 'label': label, 'chosable': False}  # Default: not chosable
-
-            if user.is_superuser:
-                status_data['chosable'] = True
-            elif role == 'CONTRACTOR':
-                if code in ['IN_PROGRESS', 'COMPLETED_BY_CONTRACTOR']:
-                    status_data['chosable'] = True
-            elif role == 'CONTRACTOR_VIEWER':
-                pass  # Default is false, so no need to change
-            elif role == 'MANAGER':
-                if code not in ['WAITING_PAYMENT', 'PAID']:
-                    status_data['chosable'] = True
-            elif role == 'GENERAL_ENGINEER':
-                status_data['chosable'] = True  # Default is true, so no need to change
-            elif role == 'PAYMENT_ADMIN':
-                if code in ['WAITING_PAYMENT', 'PAID']:
-                    status_data['chosable'] = True
-
-            statuses.append(status_data)
-
-        return Response(statuses)
-
-
-class FacilityViewSet(viewsets.ModelViewSet):
+        return Response(cached(CHOICES, f'work_item_statuses:{role_key(user)}',
+                               lambda: self.build_work_item_statuses(user)))
+
+    @staticmethod
+    def build_work_item_statuses(user):
+        policy = WORK_ITEMS.compile(user)
+        return [{'code': code, 'label': label, 'chosable': policy.may_set_status(code)}
+                for code, label in WorkItem.STATUS_CHOICES]
+
+
+class FacilityViewSet(SerializedWriteMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     queryset = Facility.objects.all()
     serializer_class = FacilitySerializer
@@ -363,7 +310,7 @@ class FacilityViewSet(viewsets.ModelViewSet):
 #         return ContractorRating.objects.all()
 
 
-class UserRoleListViewSet(viewsets.ModelViewSet):
+class UserRoleListViewSet(SerializedWriteMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = UserRoleSerializer
 
@@ -376,46 +323,65 @@ class UserRoleListViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def managers_and_superadmins_for_dropdown(self, request):
-        queryset = User.objects.filter(role__in=['MANAGER', 'SUPER_ADMIN']).values('id', 'username', 'first_name',
-                                                                                   'last_name', 'idNum', 'role')
-        serializer = UserRoleSerializer(queryset, many=True)
-        return Response(serializer.data)
+        return Response(cached(USERS, 'managers_and_superadmins', lambda: self.dropdown(['MANAGER', 'SUPER_ADMIN'])))
 
     @action(detail=False, methods=['get'])
     def contractors_for_dropdown(self, request):
-        queryset = User.objects.filter(role='CONTRACTOR').values('id', 'username', 'first_name', 'last_name', 'idNum',
-                                                                 'role')
-        serializer = UserRoleSerializer(queryset, many=True)
-        return Response(serializer.data)
+        return Response(cached(USERS, 'contractors', lambda: self.dropdown(['CONTRACTOR'])))
+
+    @staticmethod
+    def dropdown(roles):
+        # Cached by the actions above; the version is bumped by the User signals in signals.py
+        queryset = User.objects.filter(role__in=roles).values('id', 'username', 'first_name', 'last_name', 'idNum',
+                                                              'role')
+        return UserRoleSerializer(queryset, many=True).data
 
 
-class PaymentViewSet(viewsets.ModelViewSet):
-    queryset = Payment.objects.all()
+class PaymentViewSet(PolicyMixin, SerializedWriteMixin, viewsets.ModelViewSet):
     serializer_class = PaymentSerializer
-    permission_classes = [IsAuthenticated]  # Or more specific permissions
+    permission_classes = [IsAuthenticated, PolicyPermission]
+    pagination_class = PaymentPagination
+    filterset_class = PaymentFilter
+    resource = PAYMENTS
+
+    def get_queryset(self):
+        return self.policy.scope(Payment.objects.all())
 
     def create(self, request, *args, **kwargs):
         work_id = request.data.get('work')  # Get work ID from request data
         try:
-            work = Work.objects.get(pk=work_id)  # Get the work instance
-        except Work.DoesNotExist:
+            work = scope_works(request.user, Work.objects.all()).get(pk=work_id)  # Get the work instance
+        except (Work.DoesNotExist, ValueError):
             return Response({'error': 'Work not found'}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(work=work)  # Save the payment with the work instance
+            save_serializer(serializer, work=work)  # Save the payment with the work instance
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    def update(self, request, pk=None):
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream the payments of the works the user may see, as CSV or NDJSON (?file_format=)."""
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return Response({'error': 'Invalid file_format. Use csv or ndjson'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            works = payment_export_works(request.user, request.query_params)
+        except ReportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        header, rows = payment_export_rows(works)
+        return export_response(header, rows, file_format, 'payments')
+
+    def update(self, request, *args, **kwargs):
         try:
-            payment = Payment.objects.get(pk=pk)
-        except Payment.DoesNotExist:
+            payment = self.get_object()
+        except Http404:
             return Response({'error': 'Payment not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = self.get_serializer(payment, data=request.data)
+        serializer = self.get_serializer(payment, data=request.data, partial=kwargs.get('partial', False))
         if serializer.is_valid():
-            serializer.save()
+            save_serializer(serializer)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -433,17 +399,79 @@ class PaymentViewSet(viewsets.ModelViewSet):
 #             user=self.request.user,
 #             work_id=work_id  # Use work_id from URL
 #         )
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(SerializedWriteMixin, viewsets.ModelViewSet):
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CommentPagination
 
     def get_queryset(self):
-        print(f"self.kwargs: {self.kwargs}")  # Print kwargs for debugging
         work_id = self.kwargs['work_pk']
-        print(f"work_id: {work_id}")  # Print work_id for debugging
-        return Comment.objects.filter(work_id=work_id).order_by('created_at')
+        queryset = optimize_queryset(Comment.objects.all(), self.get_serializer_class())
+        return queryset.filter(work_id=work_id).order_by('created_at')
 
     def perform_create(self, serializer):
         work_id = self.kwargs['work_pk']
         print(f"work_id (in perform_create): {work_id}")  # Print in perform_create too
-        serializer.save(user=self.request.user, work_id=work_id)
+        save_serializer(serializer, user=self.request.user, work_id=work_id)
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Reports and exports computed by the run_jobs worker. POST {"kind": ..., "params": {...}}
+    with the same params as /works/reports/ or the export endpoints, poll the job, then
+    fetch /jobs/<id>/download/.
+    """
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        params = request.data.get('params') or {}
+        if not isinstance(params, dict):
+            return Response({'error': 'params must be an object'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            job, created = write_with_retry(submit_job, request.user, request.data.get('kind'), params)
+        except ReportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.get_serializer(job)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != 'DONE':
+            return Response({'error': f'Job is {job.status.lower()}.'}, status=status.HTTP_409_CONFLICT)
+        filename = job.kind + os.path.splitext(job.result.name)[1]
+        return FileResponse(job.result.open('rb'), as_attachment=True, filename=filename,
+                            content_type=job.content_type)
+
+
+class ContractorScorecardViewSet(PolicyMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Contractor scorecards, best overall average first, and each contractor's daily
+    history (/scorecards/<contractor id>/history/). Contractors see their own only.
+    """
+    serializer_class = ContractorScorecardSerializer
+    permission_classes = [IsAuthenticated]
+    resource = SCORECARDS
+
+    def get_queryset(self):
+        queryset = ContractorScorecard.objects.select_related('contractor').order_by(
+            F('overall_avg').desc(nulls_last=True), 'contractor__username')
+        return self.policy.scope(queryset)
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        scorecard = self.get_object()
+        serializer = ContractorScorecardSnapshotSerializer(scorecard.contractor.scorecard_history.all(), many=True)
+        return Response(serializer.data)
+
+
+class MetricsView(APIView):
+    """Per-route request metrics collected by RequestMetricsMiddleware, in Prometheus text format."""
+    permission_classes = [IsAuthenticated, IsSuperAdmin]
+
+    def get(self, request):
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')